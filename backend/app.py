@@ -1,36 +1,73 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
-from db_models import db, User, History, Feedback
+from db_models import db, User, History, Feedback, UserHistoryStat, latest_feedback_subquery
+from config import load_config
+from db_config import MIGRATIONS_DIR, check_schema_current
 from routes.admin import admin_bp
-import joblib
-import pandas as pd
+from model_registry import init_model_registry
+from prediction_cache import init_prediction_caches
+from shared_store import init_rate_limiters, init_shared_store
+from response_cache import strong_etag
+from response_encoding import etag_matches, init_compression, init_json_provider
+from write_behind import init_history_writer, persist_predictions
+from rollups import register_rollup_commands
+from export import register_export_commands
+from incremental_training import register_training_commands
+from pagination import encode_cursor, decode_cursor, parse_limit
+from metrics import init_metrics, span
+from password_hashing import HasherBusy, init_password_hasher
+from micro_batcher import init_micro_batcher
+from jobs import init_job_runner
+from identity import init_identity_cache, register_identity_commands, token_claims
+from sqlalchemy import and_, tuple_
+from datetime import datetime
 import numpy as np
 import os
 import traceback
-import os
 from dotenv import load_dotenv
-from flask_cors import CORS
 
 load_dotenv()
 app = Flask(__name__)
 
-CORS(app, resources={r"/*": {"origins": ["http://localhost:8080", "http://127.0.0.1:8080"]}})
+CORS(app, resources={r"/*": {"origins": ["http://localhost:8080", "http://127.0.0.1:8080"]}},
+     expose_headers=['X-Next-Cursor', 'X-Export-Watermark', 'Retry-After'])
 app.register_blueprint(admin_bp)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///site.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = 'smart-fit-super-secure-secret-key-2026-very-long'
+# 全部配置来自环境变量，见 config.py
+load_config(app, entry_point=__name__ == '__main__')
 
 db.init_app(app)
+# Flask-Migrate 会连带导入 alembic，只在 flask 命令行（flask db upgrade 等）与 python app.py 启动时注册；
+# 这两种方式自行负责升级，其余入口（uvicorn/gunicorn 导入 app）启动时检查版本
+if os.getenv('FLASK_RUN_FROM_CLI') == 'true' or __name__ == '__main__':
+    from flask_migrate import Migrate
+    Migrate(app, db, directory=MIGRATIONS_DIR, render_as_batch=True)
+elif app.config['SCHEMA_CHECK']:
+    with app.app_context():
+        check_schema_current(db.engine)
 jwt = JWTManager(app)
-
-model_path = 'models/fit_model.pkl'
-if os.path.exists(model_path):
-    model = joblib.load(model_path)
-else:
-    model = None
+init_metrics(app, jwt)
+# 共享存储先于身份缓存初始化：令牌撤销经由它通知其他进程
+shared_store = init_shared_store(app)
+identity_cache = init_identity_cache(app, jwt)
+init_json_provider(app)
+init_compression(app)
+history_writer = init_history_writer(app)
+password_hasher = init_password_hasher(app)
+job_runner = init_job_runner(app)
+register_rollup_commands(app)
+register_export_commands(app)
+register_training_commands(app)
+register_identity_commands(app)
+
+# 模型注册表：后台监视模型文件/版本目录并热加载，每个请求固定使用同一个模型版本
+model_registry = init_model_registry(app)
+# 预测结果缓存：进程内缓存未命中的行，多 worker 部署时再查共享存储中的二级缓存
+prediction_cache, shared_prediction_cache = init_prediction_caches(app, shared_store)
+rate_limiters = init_rate_limiters(app, shared_store)
+login_limiter, login_ip_limiter, login_user_limiter, predict_limiter = (
+    rate_limiters[name] for name in ('login', 'login_ip', 'login_user', 'predict'))
 
 
 # --- 辅助功能 ---
@@ -43,12 +80,15 @@ def get_category_image(category):
     }
     return images.get(category, "https://placehold.co/300x400?text=No+Image")
 
-def get_size_recommendations(size_val):
-    return {
+def get_size_recommendations(size_val, best_fit=None):
+    recommendations = {
         'slim': max(size_val - 1, 0),
         'regular': size_val,
         'relaxed': min(size_val + 1, 26)
     }
+    if best_fit is not None:
+        recommendations['best_fit'] = best_fit
+    return recommendations
 
 
 def build_explainability(waist, size_val, category, confidence_level):
@@ -80,8 +120,12 @@ def register():
     data = request.json
     if User.query.filter_by(username=data['username']).first():
         return jsonify({'msg': '用户已存在'}), 400
-    hashed_pw = generate_password_hash(data['password'])
+    try:
+        hashed_pw = password_hasher.hash(data['password'])
+    except HasherBusy:
+        return jsonify({'msg': '服务繁忙，请稍后重试'}), 503
     new_user = User(username=data['username'], password=hashed_pw)
+    # 汇总表中的 0 行由 User 的 after_insert 事件在同一事务中写入
     db.session.add(new_user)
     db.session.commit()
     return jsonify({'msg': '注册成功'}), 201
@@ -90,9 +134,26 @@ def register():
 @app.route('/login', methods=['POST'])
 def login():
     data = request.json
+    # 超限时不做密码校验，哈希进程池不被暴力尝试占满；先查（地址, 用户名），被拒的尝试不再消耗更宽松的两个桶
+    address = request.remote_addr or 'unknown'
+    for limiter, identity in ((login_limiter, f"{address}:{data['username']}"),
+                              (login_ip_limiter, address),
+                              (login_user_limiter, data['username'])):
+        allowed, retry_after = limiter.acquire(identity)
+        if not allowed:
+            return too_many_requests(retry_after)
     user = User.query.filter_by(username=data['username']).first()
-    if user and check_password_hash(user.password, data['password']):
-        token = create_access_token(identity=str(user.id))
+    try:
+        verified = user is not None and password_hasher.verify(user.username, user.password, data['password'])
+        if verified and password_hasher.needs_rehash(user.password):
+            # 哈希算法或工作因子已调整：借登录时拿到的明文透明升级存储的哈希
+            user.password = password_hasher.hash(data['password'])
+            db.session.commit()
+            password_hasher.rehashed += 1
+    except HasherBusy:
+        return jsonify({'msg': '服务繁忙，请稍后重试'}), 503
+    if verified:
+        token = create_access_token(identity=str(user.id), additional_claims=token_claims(user))
         return jsonify({
             'token': token,
             'user': {'height': user.height, 'waist': user.waist},
@@ -101,142 +162,349 @@ def login():
     return jsonify({'msg': '用户名或密码错误'}), 401
 
 
+# [架构升级] 字典硬绑定，防止模型类别索引漂移
+LABEL_MAP = {
+    0: '偏小 (Small)',
+    1: '合身 (Fit)',
+    2: '偏大 (Large)'
+}
+
+# 单次批量预测允许的最大候选数
+MAX_BATCH_CANDIDATES = 500
+# 批量预测每 BATCH_ROWS_PER_TOKEN 个候选消耗一个限流令牌
+BATCH_ROWS_PER_TOKEN = 50
+
+# fields= 参数可选的字段，移动端可只取需要的部分
+PREDICT_FIELDS = ('result', 'image_url', 'probs', 'confidence_level', 'explainability', 'size_recommendations',
+                  'model_version', 'size', 'category')
+HISTORY_FIELDS = ('id', 'category', 'size', 'result', 'confidence', 'image_url', 'date', 'body_data',
+                  'feedback', 'feedback_note')
+
+
+def parse_fields(raw, allowed):
+    """解析逗号分隔的 fields 参数，未传时返回 None（返回全部字段），含未知字段时抛出 ValueError。"""
+    if not raw:
+        return None
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown or not fields:
+        raise ValueError(f"fields 参数非法，可选 {','.join(allowed)}")
+    return fields
+
+
+def project(item, fields):
+    return item if fields is None else {name: item[name] for name in fields if name in item}
+
+
+def too_many_requests(retry_after):
+    response = jsonify({'msg': '请求过于频繁，请稍后重试'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+
+def parse_body_data(data):
+    """解析并校验身体数据，非法时抛出 ValueError(提示信息)。"""
+    h_val = float(data.get('height', 0.0))
+    w_val = float(data.get('waist', 0.0))
+    bra_val = float(data.get('bra_num', 0.0))
+    cup_val = data.get('cup_size', 'b')
+
+    if h_val < 120 or h_val > 240:
+        raise ValueError('身高范围异常，请输入 120~240cm')
+    if w_val <= 0 or w_val > 180:
+        raise ValueError('腰围范围异常，请输入 1~180cm')
+
+    raw_hips = data.get('hips')
+    if raw_hips is not None and float(raw_hips) > 0:
+        hips_val = float(raw_hips)
+    elif w_val > 0:
+        hips_val = w_val * 1.4
+    else:
+        hips_val = 0.0
+
+    return {
+        'height': h_val,
+        'waist': w_val,
+        'hips': hips_val,
+        'bra_num': bra_val,
+        'cup_size': cup_val,
+        'bmi_proxy': w_val / h_val if h_val > 0 else 0
+    }
+
+
+def parse_size(raw_size):
+    size_val = float(raw_size)
+    if size_val < 0 or size_val > 26:
+        raise ValueError('尺码范围异常，请输入 0~26')
+    return size_val
+
+
+def build_feature_row(body, size_val, cat_val):
+    return {
+        'cup_size': body['cup_size'],
+        'bra_num': body['bra_num'],
+        'hips': body['hips'],
+        'waist': body['waist'],
+        'category': cat_val,
+        'size': size_val,
+        'height_cm': body['height'],
+        'bmi_proxy': body['bmi_proxy']
+    }
+
+
+def predict_proba_rows(loaded, rows):
+    compute = loaded.predict_proba
+    if shared_prediction_cache is not None:
+        def compute(miss_rows):
+            return shared_prediction_cache.predict(miss_rows, loaded.predict_proba, version=loaded.version)
+    if prediction_cache.enabled:
+        return prediction_cache.predict(rows, compute, version=loaded.version)
+    return compute(rows)
+
+
+prediction_batcher = init_micro_batcher(app, predict_proba_rows)
+
+
+def infer_rows(loaded, rows):
+    # 开启微批时与其他并发请求合并推理，否则在当前线程直接推理
+    if prediction_batcher is not None:
+        return prediction_batcher.predict(loaded, rows)
+    return predict_proba_rows(loaded, rows)
+
+
+def resolve_fit(probs, w_val, size_val):
+    # 物理常识强制校验：
+    std_waist_for_size = size_val * 1.5 + 60.0
+    if w_val > std_waist_for_size + 10:
+        # 用户腰围比当前尺码的标准腰围大 10cm 以上，衣服绝对是偏小的！
+        return 0, 0.99
+    if w_val < std_waist_for_size - 10:
+        # 用户腰围比当前尺码小 10cm 以上，衣服绝对是偏大的！强行纠正为 偏大 (Large)
+        return 2, 0.99
+    # 正常范围内，听从 XGBoost 模型的判断
+    pred_idx = int(np.argmax(probs))
+    return pred_idx, float(probs[pred_idx])
+
+
+def best_fit_size(loaded, body, cat_val):
+    """借助预计算查表一次取出 0~26 全部尺码的概率，返回判定为合身且置信度最高的尺码；无查表或不在网格内时返回 None。"""
+    if loaded.lookup is None:
+        return None
+    with span('best_fit'):
+        curve = loaded.lookup.size_curve(build_feature_row(body, 0.0, cat_val))
+        if curve is None:
+            return None
+        curve, served = curve
+        if not served.all():
+            # 模型在个别尺码附近有跳变、无法插值时，这些尺码用模型补算
+            missing = np.flatnonzero(~served)
+            curve = curve.copy()
+            curve[missing] = loaded.predict_model([build_feature_row(body, float(s), cat_val) for s in missing])
+        best, best_prob = None, 0.0
+        for size, probs in enumerate(curve):
+            pred_idx, prob = resolve_fit(probs, body['waist'], float(size))
+            if pred_idx == 1 and prob > best_prob:
+                best, best_prob = size, prob
+        return best
+
+
+def build_prediction(probs, body, size_val, cat_val, best_fit=None):
+    """根据模型概率生成单条预测结果，返回 (响应字典, History 字段)。"""
+    with span('physics_override'):
+        pred_idx, max_prob = resolve_fit(probs, body['waist'], size_val)
+
+    # 使用 .get() 方法，即使遇到未知的索引，不会让服务器崩溃报错
+    result_str = LABEL_MAP.get(pred_idx, '未知的合身度 (Unknown)')
+    img_url = get_category_image(cat_val)
+
+    history = {
+        'category': cat_val,
+        'size_input': size_val,
+        'image_url': img_url,
+        'result': result_str,
+        'confidence': max_prob,
+        # 异步落库时以请求时刻为准，而不是写入时刻
+        'timestamp': datetime.utcnow(),
+        'height': body['height'],
+        'waist': body['waist'],
+        'hips': body['hips'],
+        'bra_size': body['bra_num'],
+        'cup_size': body['cup_size']
+    }
+
+    confidence_level = 'low' if max_prob < 0.6 else 'high'
+    payload = {
+        'result': result_str,
+        'image_url': img_url,
+        'probs': {
+            'small': round(float(probs[0]) * 100, 1),
+            'fit': round(float(probs[1]) * 100, 1),
+            'large': round(float(probs[2]) * 100, 1)
+        },
+        'confidence_level': confidence_level,
+        'explainability': build_explainability(body['waist'], size_val, cat_val, confidence_level),
+        'size_recommendations': get_size_recommendations(size_val, best_fit)
+    }
+    return payload, history
+
+
+def save_predictions(user_id, body, histories):
+    # 同一请求内的所有预测记录与身体数据更新合并为一次提交
+    if app.config['HISTORY_WRITE_MODE'] == 'sync':
+        persist_predictions(db.session, [(user_id, body, histories)])
+    else:
+        history_writer.submit(user_id, body, histories)
+
+
 @app.route('/predict', methods=['POST'])
 @jwt_required()
 def predict():
-    if not model:
+    loaded = model_registry.current
+    if loaded is None:
+        return jsonify({'msg': '后端推理引擎未就绪'}), 500
+
+    try:
+        current_user_id = int(get_jwt_identity())
+        allowed, retry_after = predict_limiter.acquire(current_user_id)
+        if not allowed:
+            return too_many_requests(retry_after)
+
+        with span('parse_request'):
+            data = request.json
+            try:
+                body = parse_body_data(data)
+                size_val = parse_size(data.get('size', 6.0))
+                fields = parse_fields(request.args.get('fields'), PREDICT_FIELDS)
+            except ValueError as e:
+                return jsonify({'msg': str(e)}), 400
+            cat_val = data.get('category', 'dresses')
+
+        with span('predict_proba'):
+            probs = infer_rows(loaded, [build_feature_row(body, size_val, cat_val)])[0]
+        payload, history = build_prediction(probs, body, size_val, cat_val, best_fit_size(loaded, body, cat_val))
+        payload['model_version'] = loaded.version
+        with span('db_write'):
+            save_predictions(current_user_id, body, [history])
+
+        with span('serialize'):
+            return jsonify(project(payload, fields))
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'msg': "预测服务内部异常"}), 500
+
+
+@app.route('/predict/batch', methods=['POST'])
+@jwt_required()
+def predict_batch():
+    loaded = model_registry.current
+    if loaded is None:
         return jsonify({'msg': '后端推理引擎未就绪'}), 500
 
     try:
         current_user_id = int(get_jwt_identity())
-        data = request.json
-
-        h_val = float(data.get('height', 0.0))
-        w_val = float(data.get('waist', 0.0))
-        bra_val = float(data.get('bra_num', 0.0))
-        size_val = float(data.get('size', 6.0))
-        cup_val = data.get('cup_size', 'b')
-        cat_val = data.get('category', 'dresses')
-
-        if h_val < 120 or h_val > 240:
-            return jsonify({'msg': '身高范围异常，请输入 120~240cm'}), 400
-        if w_val <= 0 or w_val > 180:
-            return jsonify({'msg': '腰围范围异常，请输入 1~180cm'}), 400
-        if size_val < 0 or size_val > 26:
-            return jsonify({'msg': '尺码范围异常，请输入 0~26'}), 400
-
-
-        raw_hips = data.get('hips')
-        if raw_hips is not None and float(raw_hips) > 0:
-            hips_val = float(raw_hips)
-        elif w_val > 0:
-            hips_val = w_val * 1.4
-        else:
-            hips_val = 0.0
-
-        bmi_val = w_val / h_val if h_val > 0 else 0
-
-        input_df = pd.DataFrame({
-            'cup_size': [cup_val],
-            'bra_num': [bra_val],
-            'hips': [hips_val],
-            'waist': [w_val],
-            'category': [cat_val],
-            'size': [size_val],
-            'height_cm': [h_val],
-            'bmi_proxy': [bmi_val]
-        })
-
-        probs = model.predict_proba(input_df)[0]
-        # 在 app.py 的 probs = model.predict_proba(input_df)[0] 下方添加：
-
-        # 物理常识强制校验：
-        std_waist_for_size = size_val * 1.5 + 60.0
-        if w_val > std_waist_for_size + 10:
-            # 用户腰围比当前尺码的标准腰围大 10cm 以上，衣服绝对是偏小的！
-            pred_idx = 0
-            max_prob = 0.99
-        elif w_val < std_waist_for_size - 10:
-            # 用户腰围比当前尺码小 10cm 以上，衣服绝对是偏大的！
-            pred_idx = 2  # 强行纠正为 偏大 (Large)
-            max_prob = 0.99
-        else:
-            # 正常范围内，听从 XGBoost 模型的判断
-            pred_idx = int(np.argmax(probs))
-            max_prob = float(probs[pred_idx])
-
-
-        # labels = ['偏小 (Small)', '合身 (Fit)', '偏大 (Large)']
-        # result_str = labels[pred_idx]
-            # [架构升级] 字典硬绑定，防止模型类别索引漂移
-        label_map = {
-                0: '偏小 (Small)',
-                1: '合身 (Fit)',
-                2: '偏大 (Large)'
-            }
-
-            # 使用 .get() 方法，即使遇到未知的索引，不会让服务器崩溃报错
-        result_str = label_map.get(pred_idx, '未知的合身度 (Unknown)')
-        img_url = get_category_image(cat_val)
-
-        new_history = History(
-            user_id=current_user_id,
-            category=cat_val,
-            size_input=size_val,
-            image_url=img_url,
-            result=result_str,
-            confidence=max_prob,
-            height=h_val,
-            waist=w_val,
-            hips=hips_val,
-            bra_size=bra_val,
-            cup_size=cup_val
-        )
-        db.session.add(new_history)
-
-        user = db.session.get(User, current_user_id)
-        if user:
-            user.height, user.waist, user.hips = h_val, w_val, hips_val
-            user.bra_size, user.cup_size = bra_val, cup_val
-
-        db.session.commit()
-
-        confidence_level = 'low' if max_prob < 0.6 else 'high'
-        explainability = build_explainability(w_val, size_val, cat_val, confidence_level)
-        size_recommendations = get_size_recommendations(size_val)
+        with span('parse_request'):
+            data = request.json or {}
 
+        candidates = data.get('candidates')
+        if not isinstance(candidates, list) or not candidates:
+            return jsonify({'msg': '候选列表不能为空'}), 400
+        if len(candidates) > MAX_BATCH_CANDIDATES:
+            return jsonify({'msg': f'单次最多支持 {MAX_BATCH_CANDIDATES} 个候选'}), 400
+        allowed, retry_after = predict_limiter.acquire(current_user_id, -(-len(candidates) // BATCH_ROWS_PER_TOKEN))
+        if not allowed:
+            return too_many_requests(retry_after)
 
-        return jsonify({
-            'result': result_str,
-            'image_url': img_url,
-            'probs': {
-                'small': round(float(probs[0]) * 100, 1),
-                'fit': round(float(probs[1]) * 100, 1),
-                'large': round(float(probs[2]) * 100, 1)
-            },
-            'confidence_level': confidence_level,
-            'explainability': explainability,
-            'size_recommendations': size_recommendations
-        })
+        try:
+            body = parse_body_data(data)
+            fields = parse_fields(request.args.get('fields'), PREDICT_FIELDS)
+            items = []
+            for candidate in candidates:
+                if not isinstance(candidate, dict):
+                    raise ValueError('候选项格式错误')
+                items.append((parse_size(candidate.get('size', 6.0)), candidate.get('category', 'dresses')))
+        except ValueError as e:
+            return jsonify({'msg': str(e)}), 400
+
+        rows = [build_feature_row(body, size_val, cat_val) for size_val, cat_val in items]
+        with span('predict_proba'):
+            all_probs = infer_rows(loaded, rows)
+
+        results, histories, best_fits = [], [], {}
+        for (size_val, cat_val), probs in zip(items, all_probs):
+            if cat_val not in best_fits:
+                best_fits[cat_val] = best_fit_size(loaded, body, cat_val)
+            payload, history = build_prediction(probs, body, size_val, cat_val, best_fits[cat_val])
+            payload['size'] = size_val
+            payload['category'] = cat_val
+            results.append(project(payload, fields))
+            histories.append(history)
+
+        with span('db_write'):
+            save_predictions(current_user_id, body, histories)
+
+        with span('serialize'):
+            return jsonify({'results': results, 'model_version': loaded.version})
 
     except Exception as e:
         traceback.print_exc()
         return jsonify({'msg': "预测服务内部异常"}), 500
 
 
+def history_etag(user_id):
+    # 三个校验值以标量子查询合并为一条 SQL，304 与非 304 的请求都只多一次往返
+    latest_history, latest_feedback, count = db.session.query(
+        db.session.query(db.func.max(History.timestamp)).filter(History.user_id == user_id).scalar_subquery(),
+        db.session.query(db.func.max(Feedback.created_at)).filter(Feedback.user_id == user_id).scalar_subquery(),
+        db.session.query(UserHistoryStat.history_count).filter(UserHistoryStat.user_id == user_id).scalar_subquery()
+    ).one()
+    # 序列化实现不同时响应字节也不同，一并计入
+    validator = f'{user_id}|{latest_history}|{latest_feedback}|{count}|{request.query_string.decode()}|' \
+                f'{type(app.json).__name__}'
+    return strong_etag(validator.encode('utf-8'))
+
+
 @app.route('/history', methods=['GET'])
 @jwt_required()
 def get_history():
     try:
         current_user_id = int(get_jwt_identity())
-        histories = History.query.filter_by(user_id=current_user_id) \
-            .order_by(History.timestamp.desc()).limit(50).all()
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            cursor = request.args.get('cursor')
+            after = decode_cursor(cursor) if cursor else None
+            fields = parse_fields(request.args.get('fields'), HISTORY_FIELDS)
+        except ValueError as e:
+            return jsonify({'msg': str(e)}), 400
+
+        # 强 ETag：由该用户最新的历史/反馈时间与记录数（删除时变化）加上查询参数决定，未变化时不查分页直接 304
+        etag = history_etag(current_user_id)
+        if etag_matches(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+        # 基于 (timestamp, id) 的游标分页，多取一条用于判断是否还有下一页
+        page_query = db.session.query(History.id).filter(History.user_id == current_user_id)
+        if after:
+            page_query = page_query.filter(tuple_(History.timestamp, History.id) < after)
+        page_ids = page_query.order_by(History.timestamp.desc(), History.id.desc()).limit(limit + 1)
+
+        # 单条 SQL 同时取出本页历史记录及各自最新的一条反馈
+        latest = latest_feedback_subquery(history_ids=page_ids, user_id=current_user_id)
+        rows = db.session.query(History, latest.c.fit_feedback, latest.c.note) \
+            .filter(History.id.in_(page_ids)) \
+            .outerjoin(latest, and_(latest.c.history_id == History.id, latest.c.rn == 1)) \
+            .order_by(History.timestamp.desc(), History.id.desc()) \
+            .all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
 
         result = []
-        for h in histories:
-            latest_feedback = Feedback.query.filter_by(history_id=h.id, user_id=current_user_id) \
-                .order_by(Feedback.created_at.desc()).first()
-            result.append({
+        for h, fit_feedback, feedback_note in rows:
+            result.append(project({
                 'id': h.id,
                 'category': h.category,
                 'size': h.size_input,
@@ -251,10 +519,17 @@ def get_history():
                     'bra': h.bra_size,
                     'cup': h.cup_size
                 },
-                'feedback': latest_feedback.fit_feedback if latest_feedback else None,
-                'feedback_note': latest_feedback.note if latest_feedback else None
-            })
-        return jsonify(result)
+                'feedback': fit_feedback,
+                'feedback_note': feedback_note
+            }, fields))
+
+        response = jsonify(result)
+        if has_more:
+            last = rows[-1][0]
+            response.headers['X-Next-Cursor'] = encode_cursor(last.timestamp, last.id)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     except Exception as e:
         return jsonify({'msg': str(e)}), 500
 
@@ -263,9 +538,15 @@ def get_history():
 def clear_history():
     try:
         current_user_id = int(get_jwt_identity())
-        db.session.query(History).filter(History.user_id == current_user_id).delete()
-        db.session.query(Feedback).filter(Feedback.user_id == current_user_id).delete()
-        db.session.commit()
+        # 只清理此刻已有的记录（含本进程写入队列中已提交的预测）；记录较多时交给后台任务分块删除，避免长时间占用写锁
+        job_runner.drain_writes()
+        max_id = db.session.query(db.func.max(History.id)).filter(History.user_id == current_user_id).scalar()
+        params = {'user_ids': [current_user_id], 'max_history_id': max_id}
+        stat = db.session.get(UserHistoryStat, current_user_id)
+        if stat is not None and stat.history_count > job_runner.chunk_rows:
+            job = job_runner.enqueue(db.session, 'purge_history', params, created_by=current_user_id)
+            return jsonify({'msg': '已提交清空任务', 'job_id': job.id}), 202
+        job_runner.run_inline(db.session, 'purge_history', params)
         return jsonify({'msg': '已清空'}), 200
     except Exception as e:
         db.session.rollback()
@@ -300,7 +581,14 @@ def submit_feedback(history_id):
             db.session.rollback()
             return jsonify({'msg': '保存反馈失败'}), 500
 if __name__ == '__main__':
+    # 本脚本作为主模块时带有全部初始化逻辑：声明其不随 multiprocessing 子进程重新导入，
+    # 否则密码哈希等子进程会按脚本路径把 app.py 再执行一遍（子进程只需 hash_worker）
+    from importlib.machinery import ModuleSpec
+    __spec__ = ModuleSpec('__main__', None)
+    # 表结构只通过迁移变更：启动前升级到最新版本，等同于 flask --app app db upgrade
+    from flask_migrate import upgrade
     with app.app_context():
-        db.create_all()
+        upgrade()
+    model_registry.check_for_update()
     is_debug = os.getenv('FLASK_ENV') == 'development'
     app.run(debug=is_debug, port=5000)
\ No newline at end of file
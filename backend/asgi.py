@@ -0,0 +1,127 @@
+"""ASGI 入口：uvicorn asgi:application --workers 4
+
+把现有 Flask（WSGI）路由包装为 ASGI 应用，请求在线程池中并发执行；
+/predict 的推理默认经由微批调度器（PREDICT_BATCHING）与其他并发请求合并为一次 predict_proba，
+密码哈希默认在进程池中计算（PASSWORD_HASH_WORKERS=2）。
+"""
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+os.environ.setdefault('PREDICT_BATCHING', '1')
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '2')
+
+from app import app  # noqa: E402  需在设置默认环境变量之后导入
+
+
+def build_environ(scope, body):
+    """按 PEP 3333 把 ASGI http scope 与已读完的请求体转换为 WSGI environ。"""
+    script_name = scope.get('root_path', '').encode('utf8').decode('latin1')
+    path_info = scope['path'].encode('utf8').decode('latin1')
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        # 请求体已完整读入，没有 Content-Length（分块上传）时也可读到结尾
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin1')
+        # 重复的请求头按 RFC 9110 以逗号合并
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    return environ
+
+
+class ThreadedWsgiToAsgi:
+    """最小的 ASGI -> WSGI 适配器，只用标准库。
+
+    读完请求体后用 loop.run_in_executor 把整个 WSGI 调用交给线程池，多个请求并发执行；
+    工作线程通过 run_coroutine_threadsafe 把响应交回事件循环发送，流式响应逐块发出。
+    """
+
+    def __init__(self, wsgi_application, executor):
+        self.wsgi_application = wsgi_application
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            # 模型、写入队列等均为惰性启动，生命周期事件直接确认即可
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            raise ValueError(f"不支持的 ASGI scope: {scope['type']}")
+
+        with SpooledTemporaryFile(max_size=65536) as body:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self._run_wsgi, scope, body, send, loop)
+
+    def _run_wsgi(self, scope, body, send, loop):
+        def sync_send(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        state = {'start': None, 'sent': False}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and state['sent']:
+                raise exc_info[1].with_traceback(exc_info[2])
+            state['start'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]
+            }
+
+        result = self.wsgi_application(build_environ(scope, body), start_response)
+        try:
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not state['sent']:
+                    state['sent'] = True
+                    sync_send(state['start'])
+                sync_send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not state['sent']:
+                sync_send(state['start'])
+            sync_send({'type': 'http.response.body'})
+        finally:
+            close = getattr(result, 'close', None)
+            if close is not None:
+                close()
+
+
+# 同时处理请求的线程数，即同一时刻最多有多少个请求在等待微批结果
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv('ASGI_THREADS', '64')), thread_name_prefix='asgi')
+application = ThreadedWsgiToAsgi(app, _executor)
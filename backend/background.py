@@ -0,0 +1,47 @@
+import os
+import threading
+import weakref
+
+
+class BackgroundThread:
+    """惰性启动的后台守护线程。
+
+    ensure_started() 在首次调用时启动 target；线程意外退出后下一次调用会重新拉起。
+    fork 出的子进程（gunicorn/uvicorn 多 worker）中只有调用 fork 的线程存活，且父进程的锁可能正被其他线程持有，
+    因此通过 os.register_at_fork 在子进程中丢弃线程句柄并换一把新锁，子进程下一次调用时重新启动。
+    on_start 在启动线程前（持锁）调用，用于重建线程依赖的其他资源，如执行器。
+    """
+
+    def __init__(self, target, name, on_start=None):
+        self.target = target
+        self.name = name
+        self.on_start = on_start
+        self._thread = None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            # 弱引用：回调无法注销，不能让它使对象（及其持有的 app）常驻内存
+            after_fork = weakref.WeakMethod(self._after_fork)
+            os.register_at_fork(after_in_child=lambda: after_fork() and after_fork()())
+
+    @property
+    def alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def ensure_started(self):
+        if self.alive:
+            return
+        with self._lock:
+            if self.alive:
+                return
+            if self.on_start is not None:
+                self.on_start()
+            self._thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+            self._thread.start()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _after_fork(self):
+        self._thread = None
+        self._lock = threading.Lock()
@@ -0,0 +1,142 @@
+"""端到端吞吐基准：Flask 多线程服务 vs ASGI（uvicorn + 推理微批）。
+
+两种模式各自在子进程中启动真实 HTTP 服务，客户端用若干保持连接的线程并发请求 /predict
+（关闭预测缓存，保证每个请求都走模型），统计吞吐与延迟分位数。
+用法（在 backend 目录下）：python -m benchmarks.bench_asgi --clients 32 --seconds 10
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+CASES = {
+    'flask_threaded': {'PREDICT_BATCHING': '0'},
+    'asgi_batched': {'PREDICT_BATCHING': '1'}
+}
+
+PASSWORD = 'bench-pass'
+
+
+def serve(args):
+    from benchmarks.common import bootstrap, seed_users
+
+    app_module, _ = bootstrap(workdir=args.workdir, trees=args.trees)
+    usernames, _ = seed_users(app_module, 1, PASSWORD)
+    client = app_module.app.test_client()
+    token = client.post('/login', json={'username': usernames[0], 'password': PASSWORD}).get_json()['token']
+    print('READY ' + token, flush=True)
+
+    if args.serve == 'asgi':
+        import uvicorn
+        from asgi import application
+
+        uvicorn.run(application, host='127.0.0.1', port=args.port, log_level='warning', access_log=False)
+    else:
+        from werkzeug.serving import make_server
+
+        make_server('127.0.0.1', args.port, app_module.app, threaded=True).serve_forever()
+
+
+def drive(port, token, clients, seconds):
+    from benchmarks.common import latency_summary
+
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    headers = {'Authorization': 'Bearer ' + token, 'Content-Type': 'application/json'}
+    deadline = time.perf_counter() + seconds
+
+    def worker(index):
+        rng = random.Random(index)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local, local_errors = [], 0
+        while time.perf_counter() < deadline:
+            body = json.dumps({'height': round(rng.uniform(150, 185), 2), 'waist': round(rng.uniform(58, 100), 2),
+                               'size': rng.randint(0, 26), 'category': 'dresses'})
+            started = time.perf_counter()
+            try:
+                conn.request('POST', '/predict', body=body, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status != 200:
+                    local_errors += 1
+                if resp.getheader('Connection', '').lower() == 'close':
+                    conn.close()
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            local.append((time.perf_counter() - started) * 1000.0)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    result = {'throughput_rps': round(len(latencies) / elapsed, 1), 'errors': errors[0]}
+    result.update(latency_summary(latencies))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--trees', type=int, default=300, help='合成模型的树数量（线上模型为 300）')
+    parser.add_argument('--window-ms', default='2')
+    parser.add_argument('--max-batch', default='64')
+    parser.add_argument('--serve', choices=['flask', 'asgi'], help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    from benchmarks.common import write_results
+
+    workdir = tempfile.mkdtemp(prefix='smartfit-bench-')
+    results = {}
+    for name, overrides in CASES.items():
+        env = dict(os.environ, PREDICT_CACHE_SIZE='0', METRICS_ENABLED='0', PREDICT_BATCH_WINDOW_MS=args.window_ms,
+                   PREDICT_BATCH_MAX=args.max_batch, **overrides)
+        mode = 'asgi' if name.startswith('asgi') else 'flask'
+        proc = subprocess.Popen([sys.executable, '-m', 'benchmarks.bench_asgi', '--serve', mode,
+                                 '--port', str(args.port), '--workdir', workdir, '--trees', str(args.trees)],
+                                env=env, stdout=subprocess.PIPE, text=True)
+        try:
+            line = proc.stdout.readline()
+            while line and not line.startswith('READY '):
+                line = proc.stdout.readline()
+            token = line.split(' ', 1)[1].strip()
+            time.sleep(1.0)
+            drive(args.port, token, min(args.clients, 4), 1.0)  # 预热
+            results[name] = drive(args.port, token, args.clients, args.seconds)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+        r = results[name]
+        print(f"{name:<15} rps={r['throughput_rps']:<8} p50={r['p50_ms']:<8} p95={r['p95_ms']:<8} "
+              f"p99={r['p99_ms']:<8} errors={r['errors']}")
+
+    print(json.dumps({'output': write_results({'clients': args.clients, 'trees': args.trees, 'results': results},
+                                              args.output, prefix='asgi')}))
+
+
+if __name__ == '__main__':
+    main()
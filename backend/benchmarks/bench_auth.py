@@ -0,0 +1,92 @@
+"""鉴权开销基准：JWT 身份缓存命中与每次查库两种情况下，管理员接口与 /predict 的单请求延迟及 SQL 语句数。
+
+IDENTITY_CACHE_TTL=0 时每个请求都按 user_id 查一次用户（改造前管理员接口 _get_admin_user 的开销），
+默认 TTL 下普通用户令牌的版本号命中进程内缓存，鉴权不查库；管理员令牌始终查库校验，两种情况相同。
+两种情况在同一进程内交替运行。
+用法（在 backend 目录下）：python -m benchmarks.bench_auth --requests 2000
+"""
+import argparse
+import json
+import random
+import time
+
+ROUTES = ('admin_model', 'admin_jobs', 'predict')
+
+
+def send(client, route, headers, rng):
+    if route == 'admin_model':
+        return client.get('/api/admin/model', headers=headers)
+    if route == 'admin_jobs':
+        return client.get('/api/admin/jobs?limit=1', headers=headers)
+    body = {'height': rng.uniform(150, 185), 'waist': rng.uniform(58, 100),
+            'size': rng.randint(0, 26), 'category': 'dresses'}
+    return client.post('/predict', json=body, headers=headers)
+
+
+def run_case(client, cache, counter, route, headers, ttl, n):
+    cache.ttl = ttl
+    cache.clear()
+    rng = random.Random(0)
+    # 预热：首次请求建立缓存与连接
+    for _ in range(20):
+        send(client, route, headers, rng)
+    latencies, queries = [], 0
+    for _ in range(n):
+        counter.reset()
+        started = time.perf_counter()
+        response = send(client, route, headers, rng)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        queries += counter.count
+        assert response.status_code < 400, response.get_data(as_text=True)
+    return latencies, queries / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=3, help='两种情况交替运行的轮数，取各轮合并结果')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    from benchmarks.common import QueryCounter, bootstrap, latency_summary, seed_users, write_results
+
+    # 同步落库时 /predict 的写入会混入 SQL 计数，这里保持默认的后台批量写入，并关闭预测缓存
+    app_module, _ = bootstrap(env={'PASSWORD_HASH_WORKERS': '0', 'PREDICT_CACHE_SIZE': '0'})
+    usernames, admin = seed_users(app_module, 1)
+    app = app_module.app
+    client = app.test_client()
+    cache = app.extensions['identity_cache']
+    with app.app_context():
+        counter = QueryCounter(app_module.db.engine)
+
+    def login(name):
+        token = client.post('/login', json={'username': name, 'password': 'bench-pass'}).get_json()['token']
+        return {'Authorization': 'Bearer ' + token}
+
+    admin_headers, user_headers = login(admin), login(usernames[0])
+    cases = {'db_lookup': 0.0, 'cached': 30.0}
+    results = {}
+    for route in ROUTES:
+        headers = user_headers if route == 'predict' else admin_headers
+        samples = {name: [] for name in cases}
+        queries = {}
+        for _ in range(args.rounds):
+            for name, ttl in cases.items():
+                latencies, per_request = run_case(client, cache, counter, route, headers, ttl,
+                                                  args.requests // args.rounds)
+                samples[name].extend(latencies)
+                queries[name] = per_request
+        results[route] = {name: dict(latency_summary(samples[name]), sql_per_request=round(queries[name], 2))
+                          for name in cases}
+        before, after = results[route]['db_lookup'], results[route]['cached']
+        results[route]['saved_mean_ms'] = round(before['mean_ms'] - after['mean_ms'], 3)
+        print(f"{route:<12} mean {before['mean_ms']} -> {after['mean_ms']} ms, "
+              f"p99 {before['p99_ms']} -> {after['p99_ms']} ms, "
+              f"SQL/req {before['sql_per_request']} -> {after['sql_per_request']}")
+
+    results['identity_cache'] = cache.stats()
+    print(json.dumps({'output': write_results(results, args.output, prefix='auth')}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""SQLite 并发读写基准：默认配置 vs WAL + synchronous=NORMAL + busy_timeout + 连接池。
+
+模拟 /predict 的单行写入提交与管理后台的聚合查询同时进行，统计各自吞吐与失败数。
+用法（在 backend 目录下）：python -m benchmarks.bench_db_concurrency --writers 8 --readers 4 --seconds 5
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, event, func, insert, select
+
+from db_config import apply_sqlite_pragmas, engine_options
+from db_models import db, History, User
+
+
+def run_case(name, tuned, writers, readers, seconds):
+    path = os.path.join(tempfile.mkdtemp(prefix='smartfit-bench-'), 'bench.db')
+    uri = f'sqlite:///{path}'
+    if tuned:
+        engine = create_engine(uri, **engine_options(uri))
+        event.listen(engine, 'connect', apply_sqlite_pragmas)
+    else:
+        engine = create_engine(uri)
+
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [{'username': f'u{i}', 'password': 'x'} for i in range(writers)])
+
+    counters = {'writes': 0, 'reads': 0, 'write_errors': 0, 'read_errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def bump(key):
+        with lock:
+            counters[key] += 1
+
+    def writer(user_id):
+        while time.perf_counter() < deadline:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(History.__table__).values(
+                        user_id=user_id, category='dresses', size_input=6.0, result='合身 (Fit)',
+                        confidence=0.8, timestamp=datetime.utcnow(), height=165.0, waist=70.0
+                    ))
+                bump('writes')
+            except Exception:
+                bump('write_errors')
+
+    def reader():
+        query = select(History.result, func.count(History.id)).group_by(History.result)
+        while time.perf_counter() < deadline:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(query).all()
+                bump('reads')
+            except Exception:
+                bump('read_errors')
+
+    threads = [threading.Thread(target=writer, args=(i + 1,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+
+    return {
+        'case': name,
+        'writes_per_sec': round(counters['writes'] / elapsed, 1),
+        'reads_per_sec': round(counters['reads'] / elapsed, 1),
+        'write_errors': counters['write_errors'],
+        'read_errors': counters['read_errors']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    results = [
+        run_case('default', False, args.writers, args.readers, args.seconds),
+        run_case('wal_tuned', True, args.writers, args.readers, args.seconds)
+    ]
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""登录风暴基准：大量并发 /login 时 /predict 的延迟是否保持平稳。
+
+对比密码哈希在请求线程内同步计算（PASSWORD_HASH_WORKERS=0，改造前的行为）与进程池计算。
+每种模式先单独压测 /predict 得到基线，再叠加登录风暴重复一次；关闭校验结果缓存以测量真实哈希开销。
+用法（在 backend 目录下）：python -m benchmarks.bench_login_storm --seconds 5 --login-threads 16
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+CASES = {
+    'inline': {'PASSWORD_HASH_WORKERS': '0'},
+    'process_pool': {'PASSWORD_HASH_WORKERS': '2'}
+}
+
+PASSWORD = 'bench-pass'
+
+
+def predict_load(client, headers, seconds, threads):
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(index):
+        rng = random.Random(index)
+        local = []
+        while time.perf_counter() < deadline:
+            body = {'height': rng.uniform(150, 185), 'waist': rng.uniform(58, 100),
+                    'size': rng.randint(0, 26), 'category': 'dresses'}
+            started = time.perf_counter()
+            client.post('/predict', json=body, headers=headers)
+            local.append((time.perf_counter() - started) * 1000.0)
+        with lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies
+
+
+def run_worker(args):
+    from benchmarks.common import bootstrap, latency_summary, seed_users
+
+    app_module, _ = bootstrap(trees=args.trees)
+    usernames, _ = seed_users(app_module, args.login_threads, PASSWORD)
+    client = app_module.app.test_client()
+    token = client.post('/login', json={'username': usernames[0], 'password': PASSWORD}).get_json()['token']
+    headers = {'Authorization': 'Bearer ' + token}
+
+    baseline = latency_summary(predict_load(client, headers, args.seconds, args.predict_threads))
+
+    stop = threading.Event()
+    logins = [0]
+    login_lock = threading.Lock()
+
+    def storm(name):
+        storm_client = app_module.app.test_client()
+        while not stop.is_set():
+            storm_client.post('/login', json={'username': name, 'password': PASSWORD})
+            with login_lock:
+                logins[0] += 1
+
+    storm_threads = [threading.Thread(target=storm, args=(name,)) for name in usernames]
+    for t in storm_threads:
+        t.start()
+    time.sleep(0.5)
+    under_storm = latency_summary(predict_load(client, headers, args.seconds, args.predict_threads))
+    stop.set()
+    for t in storm_threads:
+        t.join()
+
+    print(json.dumps({
+        'predict_baseline': baseline,
+        'predict_under_login_storm': under_storm,
+        'logins_per_second': round(logins[0] / (args.seconds + 0.5), 1)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--predict-threads', type=int, default=2)
+    parser.add_argument('--login-threads', type=int, default=16)
+    parser.add_argument('--trees', type=int, default=50)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    from benchmarks.common import write_results
+
+    results = {}
+    for name, overrides in CASES.items():
+        env = dict(os.environ, PASSWORD_VERIFY_CACHE_TTL='0', PREDICT_CACHE_SIZE='0', **overrides)
+        out = subprocess.run([sys.executable, '-m', 'benchmarks.bench_login_storm', '--worker',
+                              '--seconds', str(args.seconds), '--predict-threads', str(args.predict_threads),
+                              '--login-threads', str(args.login_threads), '--trees', str(args.trees)],
+                             env=env, check=True, capture_output=True, text=True)
+        results[name] = json.loads(out.stdout.strip().splitlines()[-1])
+        base, storm = results[name]['predict_baseline'], results[name]['predict_under_login_storm']
+        print(f"{name:<13} predict p50 {base['p50_ms']} -> {storm['p50_ms']} ms, "
+              f"p99 {base['p99_ms']} -> {storm['p99_ms']} ms, logins/s {results[name]['logins_per_second']}")
+
+    print(json.dumps({'output': write_results(results, args.output, prefix='login-storm')}))
+
+
+if __name__ == '__main__':
+    main()
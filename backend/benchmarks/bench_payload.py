@@ -0,0 +1,134 @@
+"""响应体积与序列化耗时基准：GET /history 与 POST /predict 在各种组合下的字节数与耗时。
+
+对比项：标准库 json 与 orjson 序列化、不压缩 / gzip / brotli（已安装时）、fields= 精简字段、
+If-None-Match 命中时的 304。数据由固定随机种子生成，结果可复现。
+用法（在 backend 目录下）：python -m benchmarks.bench_payload --repeat 300
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+PASSWORD = 'bench-pass'
+HISTORY_SLIM = 'id,result,date,feedback'
+PREDICT_SLIM = 'result,probs,confidence_level'
+PREDICT_BODY = {'height': 165.0, 'waist': 72.0, 'hips': 98.0, 'bra_num': 34, 'cup_size': 'b',
+                'size': 8, 'category': 'dresses'}
+
+
+def seed_history(app_module, username, rows, seed=0):
+    """为用户写入固定的 rows 条历史记录，每 3 条带一条反馈。"""
+    from db_models import Feedback, History, User
+    from rollups import rebuild_rollups
+
+    db = app_module.db
+    rng = random.Random(seed)
+    with app_module.app.app_context():
+        user = User.query.filter_by(username=username).first()
+        started = datetime(2026, 1, 1)
+        histories = []
+        for i in range(rows):
+            category = rng.choice(['dresses', 'tops', 'bottoms', 'outerwear'])
+            histories.append(History(
+                user_id=user.id, timestamp=started + timedelta(minutes=i), category=category,
+                size_input=rng.randint(0, 26), image_url=app_module.get_category_image(category),
+                result=rng.choice(list(app_module.LABEL_MAP.values())), confidence=round(rng.uniform(0.4, 0.99), 4),
+                height=round(rng.uniform(150, 185), 1), waist=round(rng.uniform(58, 100), 1),
+                hips=round(rng.uniform(85, 120), 1), bra_size=rng.choice([32, 34, 36]), cup_size='b'))
+        db.session.add_all(histories)
+        db.session.flush()
+        db.session.add_all([Feedback(history_id=h.id, user_id=user.id,
+                                     fit_feedback=rng.choice(['tight', 'fit', 'loose']),
+                                     created_at=h.timestamp + timedelta(hours=1)) for h in histories[::3]])
+        rebuild_rollups(db.session)
+        db.session.commit()
+
+
+def measure(client, method, path, headers, repeat, body=None):
+    latencies = []
+    response = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000.0)
+    latencies.sort()
+    return response, round(latencies[len(latencies) // 2], 3)
+
+
+def serialize_ms(app, payload, repeat):
+    """只测 jsonify 本身：在请求上下文中反复调用 app.json.response。"""
+    with app.test_request_context():
+        started = time.perf_counter()
+        for _ in range(repeat):
+            app.json.response(payload)
+        return round((time.perf_counter() - started) * 1000.0 / repeat, 4)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200, help='种入的历史记录条数（每页 50 条）')
+    parser.add_argument('--repeat', type=int, default=300)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    from benchmarks.common import bootstrap, seed_users, write_results
+
+    app_module, _ = bootstrap(env={'PASSWORD_HASH_WORKERS': '0', 'HISTORY_WRITE_MODE': 'sync',
+                                   'PREDICT_CACHE_SIZE': '0'})
+    from flask.json.provider import DefaultJSONProvider
+    from response_encoding import OrjsonProvider, brotli, orjson
+
+    app = app_module.app
+    # /predict 会写入历史记录，用另一个用户压测，避免改变被测的历史分页内容
+    usernames, _ = seed_users(app_module, 2, PASSWORD)
+    seed_history(app_module, usernames[0], args.rows)
+    client = app.test_client()
+    auth, predict_auth = [
+        {'Authorization': 'Bearer ' + client.post('/login', json={'username': name, 'password': PASSWORD})
+         .get_json()['token']} for name in usernames]
+
+    providers = {'json': DefaultJSONProvider(app)}
+    if orjson is not None:
+        providers['orjson'] = OrjsonProvider(app)
+    encodings = {'identity': 'identity', 'gzip': 'gzip'}
+    if brotli is not None:
+        encodings['br'] = 'br'
+
+    history_payload = client.get('/history', headers=auth).get_json()
+    predict_payload = client.post('/predict', json=PREDICT_BODY, headers=predict_auth).get_json()
+    results = {'serialize_ms': {}, 'history': {}, 'predict': {}}
+    for name, provider in providers.items():
+        app.json = provider
+        results['serialize_ms'][name] = {'history_page': serialize_ms(app, history_payload, args.repeat),
+                                         'predict': serialize_ms(app, predict_payload, args.repeat)}
+        for label, fields in (('full', None), ('slim', HISTORY_SLIM)):
+            path = '/history' + (f'?fields={fields}' if fields else '')
+            for enc_name, encoding in encodings.items():
+                response, p50 = measure(client, 'GET', path, dict(auth, **{'Accept-Encoding': encoding}), args.repeat)
+                results['history'][f'{name}/{label}/{enc_name}'] = {'bytes': len(response.data), 'p50_ms': p50}
+        for label, fields in (('full', None), ('slim', PREDICT_SLIM)):
+            path = '/predict' + (f'?fields={fields}' if fields else '')
+            for enc_name, encoding in encodings.items():
+                response, p50 = measure(client, 'POST', path, dict(predict_auth, **{'Accept-Encoding': encoding}),
+                                        args.repeat // 3, body=PREDICT_BODY)
+                results['predict'][f'{name}/{label}/{enc_name}'] = {'bytes': len(response.data), 'p50_ms': p50}
+
+    # 条件请求：ETag 未变化时 304，不再查询分页也不序列化
+    etag = client.get('/history', headers=dict(auth, **{'Accept-Encoding': 'gzip'})).headers['ETag']
+    response, p50 = measure(client, 'GET', '/history',
+                            dict(auth, **{'Accept-Encoding': 'gzip', 'If-None-Match': etag}), args.repeat)
+    results['history']['not_modified'] = {'status': response.status_code, 'bytes': len(response.data), 'p50_ms': p50}
+
+    for section in ('history', 'predict'):
+        base = results[section]['json/full/identity']
+        for key, value in results[section].items():
+            print(f"{section:<8} {key:<26} {value['bytes']:>7} B ({value['bytes'] / base['bytes']:6.1%})  "
+                  f"p50 {value['p50_ms']} ms")
+    for name, timings in results['serialize_ms'].items():
+        print(f"serialize {name:<7} history page {timings['history_page']} ms, predict {timings['predict']} ms")
+    print(json.dumps({'output': write_results(results, args.output, prefix='payload')}))
+
+
+if __name__ == '__main__':
+    main()
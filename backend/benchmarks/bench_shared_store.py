@@ -0,0 +1,126 @@
+"""多进程共享存储基准：进程内存储与 RESP 共享存储下，跨 worker 的预测缓存命中率与限流效果。
+
+- cache：两个 worker 依次发送同一组输入，第二个 worker 能否命中第一个 worker 写入的结果
+- limit：两个 worker 同时以同一用户持续请求 /predict，统计放行与 429 的次数；
+  共享存储下两者合计放行数应接近 burst + rate * 秒数，进程内存储下约为其两倍
+RESP 共享存储由本进程内启动的 shared_store.RespServer 提供（与 python shared_store.py 相同）。
+用法（在 backend 目录下）：python -m benchmarks.bench_shared_store --inputs 300 --seconds 5
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PASSWORD = 'bench-pass'
+
+
+def request_bodies(n, seed=0):
+    rng = random.Random(seed)
+    return [{'height': round(rng.uniform(150, 185), 1), 'waist': round(rng.uniform(58, 100), 1),
+             'size': rng.randint(0, 26), 'category': rng.choice(['dresses', 'tops'])} for _ in range(n)]
+
+
+def run_worker(args):
+    from benchmarks.common import bootstrap, latency_summary, seed_users
+
+    app_module, _ = bootstrap(workdir=args.workdir)
+    usernames, _ = seed_users(app_module, 1, PASSWORD)
+    app = app_module.app
+    client = app.test_client()
+    token = client.post('/login', json={'username': usernames[0], 'password': PASSWORD}).get_json()['token']
+    headers = {'Authorization': 'Bearer ' + token}
+
+    if args.mode == 'cache':
+        latencies = []
+        for body in request_bodies(args.inputs):
+            started = time.perf_counter()
+            response = client.post('/predict', json=body, headers=headers)
+            latencies.append((time.perf_counter() - started) * 1000.0)
+            assert response.status_code == 200, response.get_data(as_text=True)
+        shared = app.extensions['shared_prediction_cache']
+        result = {'latency': latency_summary(latencies),
+                  'local_cache': app.extensions['prediction_cache'].stats(),
+                  'shared_cache': shared.stats() if shared is not None else None}
+    else:
+        statuses = {}
+        bodies = request_bodies(50, seed=os.getpid())
+        deadline = time.perf_counter() + args.seconds
+        i = 0
+        while time.perf_counter() < deadline:
+            code = client.post('/predict', json=bodies[i % len(bodies)], headers=headers).status_code
+            statuses[code] = statuses.get(code, 0) + 1
+            i += 1
+        result = {'statuses': statuses, 'limiter': app.extensions['rate_limiters']['predict'].stats()}
+    print(json.dumps(result))
+
+
+def spawn(args, mode, env):
+    return subprocess.Popen([sys.executable, '-m', 'benchmarks.bench_shared_store', '--worker', '--mode', mode,
+                             '--workdir', args.workdir, '--inputs', str(args.inputs), '--seconds', str(args.seconds)],
+                            env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def collect(proc):
+    out, err = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(err)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--inputs', type=int, default=300, help='cache 场景中不同输入的个数')
+    parser.add_argument('--seconds', type=float, default=5.0, help='limit 场景的压测时长')
+    parser.add_argument('--rate', type=float, default=5.0)
+    parser.add_argument('--burst', type=float, default=10.0)
+    parser.add_argument('--mode', choices=['cache', 'limit'], help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    from benchmarks.common import write_results
+    from shared_store import MemoryStore, RespServer
+
+    server = RespServer(('127.0.0.1', 0), MemoryStore())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stores = {'memory': 'memory://', 'resp': f'redis://127.0.0.1:{server.server_address[1]}/0'}
+
+    results = {}
+    for name, url in stores.items():
+        # 每种存储使用独立的临时库与模型目录，两个 worker 共用
+        args.workdir = tempfile.mkdtemp(prefix='smartfit-bench-')
+        env = dict(os.environ, SHARED_STORE_URL=url, HISTORY_WRITE_MODE='sync', PASSWORD_HASH_WORKERS='0')
+        first = collect(spawn(args, 'cache', env))
+        second = collect(spawn(args, 'cache', env))
+
+        limit_env = dict(env, RATE_LIMIT_PREDICT_RATE=str(args.rate), RATE_LIMIT_PREDICT_BURST=str(args.burst))
+        workers = [spawn(args, 'limit', limit_env) for _ in range(2)]
+        limited = [collect(proc) for proc in workers]
+        allowed = sum(r['statuses'].get('200', 0) for r in limited)
+        rejected = sum(r['statuses'].get('429', 0) for r in limited)
+
+        results[name] = {'cache_first_worker': first, 'cache_second_worker': second,
+                         'limit_workers': limited, 'limit_allowed': allowed, 'limit_rejected': rejected,
+                         'limit_expected_allowed': args.burst + args.rate * args.seconds}
+        second_hits = second['local_cache']['hits'] + (second['shared_cache'] or {}).get('hits', 0)
+        print(f"{name:<7} second worker hits {second_hits}/{args.inputs}, "
+              f"p50 {first['latency']['p50_ms']} -> {second['latency']['p50_ms']} ms; "
+              f"limit allowed {allowed} (single bucket ~{args.burst + args.rate * args.seconds:.0f}), "
+              f"rejected {rejected}")
+
+    server.shutdown()
+    print(json.dumps({'output': write_results(results, args.output, prefix='shared-store')}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Worker 启动基准：导入耗时、首次推理耗时（含模型加载）与常驻内存。
+
+对比 pickle 格式导入即加载（相当于改造前的行为）与原生格式（UBJ + spec）首次请求时加载。
+需要 models/ 下同时存在 fit_model.pkl 与原生格式文件（python train_model.py export）。
+用法（在 backend 目录下）：python -m benchmarks.bench_startup --repeat 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+CASES = {
+    'pickle_eager': {'MODEL_FORMAT': 'pickle', 'MODEL_PRELOAD': '1'},
+    'native_lazy': {'MODEL_FORMAT': 'native', 'MODEL_PRELOAD': '0'}
+}
+
+HEAVY_MODULES = ('pandas', 'sklearn', 'joblib', 'xgboost', 'alembic')
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def run_worker():
+    started = time.perf_counter()
+    import app
+    import_seconds = time.perf_counter() - started
+    heavy_after_import = [m for m in HEAVY_MODULES if m in sys.modules]
+    rss_after_import = rss_mb()
+
+    started = time.perf_counter()
+    loaded = app.model_registry.current
+    row = app.build_feature_row(app.parse_body_data({'height': 165, 'waist': 70}), 6.0, 'dresses')
+    loaded.predict_proba([row])
+    first_predict_seconds = time.perf_counter() - started
+
+    print(json.dumps({
+        'format': loaded.format,
+        'import_seconds': round(import_seconds, 3),
+        'first_predict_seconds': round(first_predict_seconds, 3),
+        'rss_after_import_mb': round(rss_after_import, 1),
+        'rss_after_first_predict_mb': round(rss_mb(), 1),
+        'heavy_modules_after_import': heavy_after_import,
+        'heavy_modules_after_predict': [m for m in HEAVY_MODULES if m in sys.modules]
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker()
+        return
+
+    results = {}
+    for name, overrides in CASES.items():
+        # 只测导入与推理，不要求默认库已升级到最新迁移
+        env = dict(os.environ, MODEL_POLL_INTERVAL='0', PREDICT_CACHE_SIZE='0', SCHEMA_CHECK='0', **overrides)
+        runs = []
+        for _ in range(args.repeat):
+            out = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--worker'],
+                                 env=env, check=True, capture_output=True, text=True)
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        # 取各项中位数，降低磁盘缓存等带来的抖动
+        summary = dict(runs[0])
+        for key in ('import_seconds', 'first_predict_seconds', 'rss_after_import_mb', 'rss_after_first_predict_mb'):
+            summary[key] = sorted(r[key] for r in runs)[len(runs) // 2]
+        results[name] = summary
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
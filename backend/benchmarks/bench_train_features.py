@@ -0,0 +1,149 @@
+"""训练特征工程基准：逐行 apply（旧实现）vs 向量化整表读取 vs 向量化分块读取。
+
+每种模式在独立子进程中运行，统计墙钟时间与峰值 RSS。默认使用合成的 ModCloth 格式数据；
+也可以用 --data 指定真实的 modcloth_final_data.json。
+用法（在 backend 目录下）：python -m benchmarks.bench_train_features --rows 200000 --chunksize 20000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def write_synthetic_modcloth(path, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    categories = ['dresses', 'tops', 'bottoms', 'outerwear', 'new', 'sale']
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(rows):
+            size = int(rng.integers(0, 39))
+            record = {
+                'item_id': int(rng.integers(100000, 900000)),
+                'size': size,
+                'quality': float(rng.integers(1, 6)),
+                'category': str(rng.choice(categories)),
+                'height': f'{int(rng.integers(4, 7))}ft {int(rng.integers(0, 12))}in' if rng.random() > 0.02 else None,
+                'user_name': f'user{i}',
+                'fit': str(rng.choice(['small', 'fit', 'large'])),
+                'user_id': int(rng.integers(1, 50000)),
+                'review_text': 'Lovely dress, fits true to size and the fabric is great. ' * 3
+            }
+            if rng.random() < 0.04:
+                record['waist'] = float(rng.integers(24, 40))
+            if rng.random() < 0.68:
+                record['hips'] = float(rng.integers(32, 50))
+            if rng.random() < 0.9:
+                record['bra size'] = float(rng.choice([32, 34, 36, 38]))
+                record['cup size'] = str(rng.choice(['a', 'b', 'c', 'd', 'dd/e']))
+            f.write(json.dumps(record) + '\n')
+
+
+def legacy_features(file_path):
+    """基线提交中 train_from_json 的特征工程（逐行 apply），仅用于对比。"""
+    df = pd.read_json(file_path, lines=True)
+
+    def parse_height(h):
+        if pd.isna(h) or not isinstance(h, str): return np.nan
+        try:
+            parts = h.split('ft')
+            ft = float(parts[0].strip())
+            inches = float(parts[1].replace('in', '').strip())
+            return (ft * 30.48) + (inches * 2.54)
+        except:
+            return np.nan
+
+    df['height_cm'] = df['height'].apply(parse_height)
+    df['height_cm'] = df['height_cm'].fillna(df['height_cm'].mean())
+    df['fit'] = df['fit'].astype(str).str.lower().str.strip()
+    df['target'] = df['fit'].map({'small': 0, 'fit': 1, 'large': 2})
+    df = df.dropna(subset=['target'])
+    np.random.seed(42)
+
+    def impute_waist(row):
+        if pd.notna(row['waist']):
+            return float(row['waist']) * 2.54
+        std_waist = row['size'] * 1.5 + 60.0
+        if row['target'] == 1:
+            return std_waist + np.random.normal(0, 4.0)
+        elif row['target'] == 0:
+            return std_waist + np.random.normal(6.0, 4.0)
+        else:
+            return std_waist - np.random.normal(6.0, 4.0)
+
+    df['waist_cm'] = df.apply(impute_waist, axis=1)
+
+    def impute_hips(row):
+        if pd.notna(row['hips']):
+            return float(row['hips']) * 2.54
+        return row['waist_cm'] * 1.4
+
+    df['hips_cm'] = df.apply(impute_hips, axis=1)
+    df['bra_num'] = df['bra size'].fillna((32 + (df['size'] // 2) * 2)).astype(int)
+    df['cup_size'] = df['cup size'].fillna('b')
+    df['bmi_proxy'] = df['waist_cm'] / df['height_cm']
+    df['category'] = df['category'].str.lower()
+    df = df[df['category'].isin(['dresses', 'tops', 'bottoms', 'outerwear'])].copy()
+    df = df.drop(columns=['waist', 'hips'], errors='ignore')
+    df = df.rename(columns={'waist_cm': 'waist', 'hips_cm': 'hips'})
+    return df[['cup_size', 'bra_num', 'hips', 'waist', 'category', 'size', 'height_cm', 'bmi_proxy']]
+
+
+def run_worker(mode, data, chunksize):
+    from train_model import load_training_frame
+
+    started = time.perf_counter()
+    if mode == 'legacy':
+        X = legacy_features(data)
+    elif mode == 'vectorized':
+        X, _ = load_training_frame(data)
+    else:
+        X, _ = load_training_frame(data, chunksize=chunksize)
+    elapsed = time.perf_counter() - started
+
+    # Linux 下 ru_maxrss 单位为 KB
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print(json.dumps({
+        'mode': mode,
+        'rows': int(len(X)),
+        'seconds': round(elapsed, 3),
+        'peak_rss_mb': round(peak_rss_mb, 1)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--chunksize', type=int, default=20000)
+    parser.add_argument('--data', default=None, help='使用已有的 ModCloth JSON 而不是合成数据')
+    parser.add_argument('--modes', default='legacy,vectorized,chunked')
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.data, args.chunksize)
+        return
+
+    data = args.data
+    if data is None:
+        data = os.path.join(tempfile.mkdtemp(prefix='smartfit-bench-'), 'modcloth_synthetic.json')
+        write_synthetic_modcloth(data, args.rows)
+
+    results = []
+    for mode in args.modes.split(','):
+        out = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_train_features', '--worker', mode,
+             '--data', data, '--chunksize', str(args.chunksize)],
+            check=True, capture_output=True, text=True
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
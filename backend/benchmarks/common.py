@@ -0,0 +1,135 @@
+"""基准测试公共部分：临时 SQLite 库 + 小型合成模型 + 查询计数。
+
+app.py 在导入时读取环境变量，因此必须先调用 bootstrap() 再导入 app。
+"""
+import json
+import os
+import platform
+import tempfile
+import threading
+from datetime import datetime
+
+import numpy as np
+
+
+def train_synthetic_model(model_path, rows=3000, trees=50, seed=0):
+    """训练并发布一个与线上特征一致的小模型（标签按尺码经验腰围规则加噪声生成）。"""
+    import pandas as pd
+    from fast_predictor import sample_rows
+    from train_model import build_pipeline, publish_model
+
+    X = pd.DataFrame(sample_rows(rows, seed=seed))
+    rng = np.random.default_rng(seed)
+    delta = X['waist'] - (X['size'] * 1.5 + 60.0) + rng.normal(0, 4.0, rows)
+    y = np.where(delta > 3, 0, np.where(delta < -3, 2, 1))
+
+    pipeline = build_pipeline()
+    pipeline.set_params(clf__n_estimators=trees, clf__max_depth=4)
+    pipeline.fit(X, y)
+    return publish_model(pipeline, model_path)
+
+
+def bootstrap(workdir=None, trees=50, env=None):
+    """准备临时数据库与模型并导入 app，返回 (app 模块, 工作目录)。"""
+    workdir = workdir or tempfile.mkdtemp(prefix='smartfit-bench-')
+    model_path = os.path.join(workdir, 'models', 'fit_model.pkl')
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    if not os.path.exists(model_path):
+        train_synthetic_model(model_path, trees=trees)
+
+    os.environ.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(workdir, 'bench.db'),
+        'MODEL_PATH': model_path,
+        'MODEL_POLL_INTERVAL': '0',
+        'MODEL_PRELOAD': '1'
+    })
+    # 基准按同一个用户压测，未显式指定时关闭限流
+    os.environ.setdefault('RATE_LIMIT_LOGIN_RATE', '0')
+    os.environ.setdefault('RATE_LIMIT_LOGIN_IP_RATE', '0')
+    os.environ.setdefault('RATE_LIMIT_LOGIN_USER_RATE', '0')
+    os.environ.setdefault('RATE_LIMIT_PREDICT_RATE', '0')
+    # 临时库由 db.create_all() 建表，没有迁移版本记录
+    os.environ.setdefault('SCHEMA_CHECK', '0')
+    os.environ.update(env or {})
+
+    import app as app_module
+    with app_module.app.app_context():
+        app_module.db.create_all()
+    return app_module, workdir
+
+
+def seed_users(app_module, n_users, password='bench-pass'):
+    """创建 n_users 个普通用户和一个管理员，返回 (用户名列表, 管理员用户名)。"""
+    from werkzeug.security import generate_password_hash
+    from db_models import User
+
+    # 所有账号共用一个哈希，避免播种阶段耗时
+    hashed = generate_password_hash(password)
+    usernames = [f'bench_user_{i}' for i in range(n_users)]
+    with app_module.app.app_context():
+        db = app_module.db
+        existing = {u.username for u in User.query.all()}
+        for name in usernames + ['bench_admin']:
+            if name not in existing:
+                db.session.add(User(username=name, password=hashed, is_admin=(name == 'bench_admin')))
+        db.session.commit()
+    return usernames, 'bench_admin'
+
+
+class QueryCounter:
+    """按线程统计 SQL 语句数（SQLAlchemy before_cursor_execute 事件）。"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def latency_summary(latencies_ms):
+    values = sorted(latencies_ms)
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values), 3) if values else 0.0,
+        'p50_ms': round(percentile(values, 50), 3),
+        'p95_ms': round(percentile(values, 95), 3),
+        'p99_ms': round(percentile(values, 99), 3),
+        'max_ms': round(values[-1], 3) if values else 0.0
+    }
+
+
+def write_results(results, output=None, prefix='bench'):
+    """结果写为 JSON，便于逐次对比回归；默认写到 benchmarks/results/ 下。"""
+    results = dict(results)
+    results['meta'] = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count()
+    }
+    if output is None:
+        out_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+        os.makedirs(out_dir, exist_ok=True)
+        output = os.path.join(out_dir, f"{prefix}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return output
@@ -0,0 +1,171 @@
+"""后端负载测试：在临时 SQLite 库与小型合成模型上并发压测主要接口。
+
+覆盖 /login、/predict、GET /history、/api/admin/dashboard/stats、/api/admin/users，
+输出各并发度下的 p50/p95/p99 延迟、吞吐与每请求 SQL 语句数，结果写为 JSON。
+用法（在 backend 目录下）：
+    python -m benchmarks.load_test --concurrency 1,8 --requests 200
+    python -m benchmarks.load_test --scenarios predict --env HISTORY_WRITE_MODE=sync
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+from benchmarks.common import QueryCounter, bootstrap, latency_summary, seed_users, write_results
+
+PASSWORD = 'bench-pass'
+CATEGORIES = ['dresses', 'tops', 'bottoms', 'outerwear']
+
+
+def random_body(rng):
+    return {
+        'height': round(rng.uniform(150, 185), 1),
+        'waist': round(rng.uniform(58, 100), 1),
+        'bra_num': rng.choice([32, 34, 36, 38]),
+        'cup_size': rng.choice(['a', 'b', 'c', 'd']),
+        'size': rng.randint(0, 26),
+        'category': rng.choice(CATEGORIES)
+    }
+
+
+class Scenario:
+    def __init__(self, name, method, path, body=None, token='user', expect=200):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.token = token
+        self.expect = expect
+
+
+def build_scenarios():
+    return {
+        'login': Scenario('login', 'post', '/login',
+                          body=lambda ctx, rng, worker: {'username': ctx['users'][worker % len(ctx['users'])],
+                                                         'password': PASSWORD},
+                          token=None),
+        'predict': Scenario('predict', 'post', '/predict', body=lambda ctx, rng, worker: random_body(rng)),
+        'history': Scenario('history', 'get', '/history'),
+        'admin_stats': Scenario('admin_stats', 'get', '/api/admin/dashboard/stats', token='admin'),
+        'admin_users': Scenario('admin_users', 'get', '/api/admin/users', token='admin')
+    }
+
+
+def login_all(app_module, usernames, admin):
+    client = app_module.app.test_client()
+    tokens = {}
+    for name in usernames + [admin]:
+        resp = client.post('/login', json={'username': name, 'password': PASSWORD})
+        tokens[name] = resp.get_json()['token']
+    return tokens
+
+
+def seed_history(app_module, ctx, per_user):
+    client = app_module.app.test_client()
+    rng = random.Random(1)
+    for name in ctx['users']:
+        headers = {'Authorization': 'Bearer ' + ctx['tokens'][name]}
+        for _ in range(per_user):
+            client.post('/predict', json=random_body(rng), headers=headers)
+    writer = app_module.app.extensions.get('history_writer')
+    if writer is not None:
+        writer.flush()
+
+
+def run_scenario(app_module, counter, ctx, scenario, concurrency, requests_per_worker):
+    latencies, queries = [], []
+    errors = [0]
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(index):
+        client = app_module.app.test_client()
+        rng = random.Random(index)
+        if scenario.token == 'admin':
+            token = ctx['tokens'][ctx['admin']]
+        elif scenario.token == 'user':
+            token = ctx['tokens'][ctx['users'][index % len(ctx['users'])]]
+        else:
+            token = None
+        headers = {'Authorization': 'Bearer ' + token} if token else {}
+
+        local_latencies, local_queries, local_errors = [], [], 0
+        barrier.wait()
+        for _ in range(requests_per_worker):
+            kwargs = {'headers': headers}
+            if scenario.body is not None:
+                kwargs['json'] = scenario.body(ctx, rng, index)
+            counter.reset()
+            started = time.perf_counter()
+            resp = getattr(client, scenario.method)(scenario.path, **kwargs)
+            local_latencies.append((time.perf_counter() - started) * 1000.0)
+            local_queries.append(counter.count)
+            if resp.status_code != scenario.expect:
+                local_errors += 1
+
+        with lock:
+            latencies.extend(local_latencies)
+            queries.extend(local_queries)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    result = {
+        'scenario': scenario.name,
+        'concurrency': concurrency,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'errors': errors[0],
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else 0.0
+    }
+    result.update(latency_summary(latencies))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', default='login,predict,history,admin_stats,admin_users')
+    parser.add_argument('--concurrency', default='1,8', help='逗号分隔的并发度列表')
+    parser.add_argument('--requests', type=int, default=100, help='每个并发 worker 的请求数')
+    parser.add_argument('--login-requests', type=int, default=10, help='login 场景每个 worker 的请求数（哈希较慢）')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--history-per-user', type=int, default=60)
+    parser.add_argument('--trees', type=int, default=50, help='合成模型的树数量')
+    parser.add_argument('--env', action='append', default=[], help='导入 app 前设置的环境变量，如 HISTORY_WRITE_MODE=sync')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    env = dict(item.split('=', 1) for item in args.env)
+    app_module, workdir = bootstrap(trees=args.trees, env=env)
+    usernames, admin = seed_users(app_module, args.users, PASSWORD)
+    ctx = {'users': usernames, 'admin': admin, 'tokens': login_all(app_module, usernames, admin)}
+    seed_history(app_module, ctx, args.history_per_user)
+
+    with app_module.app.app_context():
+        counter = QueryCounter(app_module.db.engine)
+
+    scenarios = build_scenarios()
+    results = []
+    for name in args.scenarios.split(','):
+        scenario = scenarios[name]
+        n = args.login_requests if name == 'login' else args.requests
+        for concurrency in [int(c) for c in args.concurrency.split(',')]:
+            result = run_scenario(app_module, counter, ctx, scenario, concurrency, n)
+            results.append(result)
+            print(f"{name:<12} c={concurrency:<3} rps={result['throughput_rps']:<8} "
+                  f"p50={result['p50_ms']:<8} p95={result['p95_ms']:<8} p99={result['p99_ms']:<8} "
+                  f"queries/req={result['queries_per_request']} errors={result['errors']}")
+
+    output = write_results({'env': env, 'workdir': workdir, 'results': results}, args.output, prefix='load')
+    print(json.dumps({'output': output}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""推理热路径微基准：predict_proba（Pipeline 参考通道 / 快速通道）、DataFrame 构建、build_explainability。
+
+用法（在 backend 目录下）：python -m benchmarks.micro --number 2000
+"""
+import argparse
+import json
+import time
+
+from benchmarks.common import bootstrap, write_results
+
+
+def measure(fn, number, repeat=5):
+    """返回 repeat 轮中最快一轮的单次耗时（微秒）。"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - started) / number)
+    return round(best * 1e6, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=1000)
+    parser.add_argument('--batch', type=int, default=100)
+    parser.add_argument('--trees', type=int, default=50)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    app_module, workdir = bootstrap(trees=args.trees, env={'MODEL_FORMAT': 'pickle'})
+    import pandas as pd
+    from fast_predictor import sample_rows
+    from model_registry import FEATURE_COLUMNS
+
+    loaded = app_module.model_registry.current
+    pipeline, fast = loaded.pipeline, loaded.fast
+    one = sample_rows(1)
+    batch = sample_rows(args.batch)
+    df_one = pd.DataFrame(one, columns=FEATURE_COLUMNS)
+    df_batch = pd.DataFrame(batch, columns=FEATURE_COLUMNS)
+
+    results = {
+        'dataframe_build_1_row_us': measure(lambda: pd.DataFrame(one, columns=FEATURE_COLUMNS), args.number),
+        'pipeline_predict_proba_1_row_us': measure(lambda: pipeline.predict_proba(df_one), args.number),
+        'fast_predict_proba_1_row_us': measure(lambda: fast.predict_proba(one), args.number),
+        f'dataframe_build_{args.batch}_rows_us': measure(lambda: pd.DataFrame(batch, columns=FEATURE_COLUMNS),
+                                                        max(1, args.number // 10)),
+        f'pipeline_predict_proba_{args.batch}_rows_us': measure(lambda: pipeline.predict_proba(df_batch),
+                                                               max(1, args.number // 10)),
+        f'fast_predict_proba_{args.batch}_rows_us': measure(lambda: fast.predict_proba(batch),
+                                                           max(1, args.number // 10)),
+        'build_explainability_us': measure(
+            lambda: app_module.build_explainability(72.5, 8.0, 'dresses', 'high'), args.number * 10)
+    }
+    for name, value in results.items():
+        print(f'{name:<40} {value:>10} us')
+
+    output = write_results({'trees': args.trees, 'workdir': workdir, 'results': results}, args.output,
+                           prefix='micro')
+    print(json.dumps({'output': output}))
+
+
+if __name__ == '__main__':
+    main()
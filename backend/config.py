@@ -0,0 +1,85 @@
+"""应用配置：全部来自环境变量（启动时由 python-dotenv 读取 .env），导入 app 时一次性写入 app.config。"""
+import os
+
+from db_config import configure_database
+
+
+def load_config(app, entry_point=False):
+    """读取环境变量写入 app.config；entry_point 为 True 表示以 python app.py 启动（而非被其他模块导入）。"""
+    # 数据库地址与连接池参数来自环境变量（DATABASE_URL 等），默认仍为本地 SQLite
+    configure_database(app)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['JWT_SECRET_KEY'] = 'smart-fit-super-secure-secret-key-2026-very-long'
+    # 预测记录落库方式：async 为后台批量写入（write-behind），sync 为请求内同步提交
+    app.config['HISTORY_WRITE_MODE'] = os.getenv('HISTORY_WRITE_MODE', 'async')
+    app.config['HISTORY_FLUSH_INTERVAL_MS'] = int(os.getenv('HISTORY_FLUSH_INTERVAL_MS', '50'))
+    app.config['HISTORY_FLUSH_ROWS'] = int(os.getenv('HISTORY_FLUSH_ROWS', '200'))
+    app.config['HISTORY_QUEUE_SIZE'] = int(os.getenv('HISTORY_QUEUE_SIZE', '10000'))
+    # 指标与追踪：METRICS_ENABLED=0 时不挂任何钩子；PROFILING_ENABLED=1 时请求头 X-Profile: 1 可对单个请求做栈采样
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', '1') != '0'
+    app.config['PROFILING_ENABLED'] = os.getenv('PROFILING_ENABLED') == '1'
+    app.config['PROFILE_INTERVAL_MS'] = float(os.getenv('PROFILE_INTERVAL_MS', '1'))
+    # /metrics 抓取令牌：请求头 Authorization: Bearer <METRICS_TOKEN>；未设置时 /metrics 只接受管理员登录令牌
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN', '')
+    # 密码哈希：算法与工作因子（如 scrypt:65536:8:1、pbkdf2:sha256:600000），登录时旧参数的哈希自动升级
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+    # 哈希进程池以 forkserver 启动，子进程会重新执行主脚本：python app.py 与 asgi.py 默认 2 个进程，其他导入 app 的
+    # 脚本/REPL 默认在请求线程内同步计算；自行开启时脚本须有 if __name__ == '__main__' 保护，进程池启动失败时退回同步计算
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', '2' if entry_point else '0'))
+    app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '32'))
+    app.config['PASSWORD_VERIFY_CACHE_TTL'] = float(os.getenv('PASSWORD_VERIFY_CACHE_TTL', '5'))
+    # 后台任务：批量删除/清空历史/保留期清理按 JOB_CHUNK_ROWS 行分块提交，块间暂停 JOB_CHUNK_PAUSE_MS 让出写锁
+    app.config['JOB_WORKER_ENABLED'] = os.getenv('JOB_WORKER_ENABLED', '1') != '0'
+    app.config['JOB_CHUNK_ROWS'] = int(os.getenv('JOB_CHUNK_ROWS', '500'))
+    app.config['JOB_CHUNK_PAUSE_MS'] = float(os.getenv('JOB_CHUNK_PAUSE_MS', '20'))
+    app.config['JOB_POLL_INTERVAL'] = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+    app.config['HISTORY_RETENTION_DAYS'] = int(os.getenv('HISTORY_RETENTION_DAYS', '0'))
+    # JWT 身份缓存秒数：令牌版本号/管理员标记的校验结果在进程内缓存；撤销经共享存储通知其他进程，
+    # 共享存储为 memory:// 时其他进程最多延迟该时间生效（管理员令牌始终查库）
+    app.config['IDENTITY_CACHE_TTL'] = float(os.getenv('IDENTITY_CACHE_TTL', '30'))
+    # 共享存储：多 worker 共享预测结果与限流状态；memory:// 为进程内（默认），redis://host:port/db 为 Redis 协议服务
+    app.config['SHARED_STORE_URL'] = os.getenv('SHARED_STORE_URL', 'memory://')
+    app.config['SHARED_STORE_TIMEOUT_MS'] = float(os.getenv('SHARED_STORE_TIMEOUT_MS', '100'))
+    app.config['SHARED_PREDICT_CACHE_TTL'] = float(os.getenv('SHARED_PREDICT_CACHE_TTL', '300'))
+    # 令牌桶限流：每个身份每秒补充 *_RATE 个令牌，最多积攒 *_BURST 个，超出返回 429；RATE 为 0 时关闭
+    # 登录按（客户端地址, 用户名）、客户端地址、用户名三级限流，后两者更宽松：单个来源无法锁死他人账号，也无法换用户名撞库
+    app.config['RATE_LIMIT_LOGIN_RATE'] = float(os.getenv('RATE_LIMIT_LOGIN_RATE', '0.2'))
+    app.config['RATE_LIMIT_LOGIN_BURST'] = float(os.getenv('RATE_LIMIT_LOGIN_BURST', '10'))
+    app.config['RATE_LIMIT_LOGIN_IP_RATE'] = float(os.getenv('RATE_LIMIT_LOGIN_IP_RATE', '1'))
+    app.config['RATE_LIMIT_LOGIN_IP_BURST'] = float(os.getenv('RATE_LIMIT_LOGIN_IP_BURST', '30'))
+    app.config['RATE_LIMIT_LOGIN_USER_RATE'] = float(os.getenv('RATE_LIMIT_LOGIN_USER_RATE', '1'))
+    app.config['RATE_LIMIT_LOGIN_USER_BURST'] = float(os.getenv('RATE_LIMIT_LOGIN_USER_BURST', '60'))
+    app.config['RATE_LIMIT_PREDICT_RATE'] = float(os.getenv('RATE_LIMIT_PREDICT_RATE', '10'))
+    app.config['RATE_LIMIT_PREDICT_BURST'] = float(os.getenv('RATE_LIMIT_PREDICT_BURST', '30'))
+    # 响应压缩：按 Accept-Encoding 协商 gzip（安装 brotli 后优先 br），小于 COMPRESSION_MIN_BYTES 的响应不压缩
+    app.config['COMPRESSION_ENABLED'] = os.getenv('COMPRESSION_ENABLED', '1') != '0'
+    app.config['COMPRESSION_MIN_BYTES'] = int(os.getenv('COMPRESSION_MIN_BYTES', '512'))
+    app.config['COMPRESSION_LEVEL'] = int(os.getenv('COMPRESSION_LEVEL', '6'))
+    # JSON 序列化：auto 在安装了 orjson 时使用 orjson，default 为标准库 json
+    app.config['JSON_PROVIDER'] = os.getenv('JSON_PROVIDER', 'auto')
+    # 管理后台用户列表的响应缓存秒数，0 为不缓存（仍返回 ETag）
+    app.config['ADMIN_USERS_CACHE_TTL'] = float(os.getenv('ADMIN_USERS_CACHE_TTL', '5'))
+    # 推理微批：并发请求在 PREDICT_BATCH_WINDOW_MS 内合并为一次 predict_proba（ASGI 入口 asgi.py 默认开启）
+    app.config['PREDICT_BATCHING'] = os.getenv('PREDICT_BATCHING', '0') == '1'
+    app.config['PREDICT_BATCH_WINDOW_MS'] = float(os.getenv('PREDICT_BATCH_WINDOW_MS', '2'))
+    app.config['PREDICT_BATCH_MAX'] = int(os.getenv('PREDICT_BATCH_MAX', '64'))
+    app.config['PREDICT_BATCH_WORKERS'] = int(os.getenv('PREDICT_BATCH_WORKERS', '1'))
+    # 表结构版本检查：数据库未升级到最新迁移时拒绝启动，SCHEMA_CHECK=0 关闭
+    app.config['SCHEMA_CHECK'] = os.getenv('SCHEMA_CHECK', '1') != '0'
+    # 模型注册表：后台每 MODEL_POLL_INTERVAL 秒检查模型文件/版本目录并热加载，0 为不监视
+    app.config['MODEL_PATH'] = os.getenv('MODEL_PATH', 'models/fit_model.pkl')
+    app.config['MODEL_POLL_INTERVAL'] = float(os.getenv('MODEL_POLL_INTERVAL', '2'))
+    app.config['FAST_INFERENCE'] = os.getenv('FAST_INFERENCE', '1') != '0'
+    app.config['MODEL_FORMAT'] = os.getenv('MODEL_FORMAT', 'auto')
+    app.config['INFERENCE_THREADS'] = int(os.getenv('INFERENCE_THREADS', '0'))
+    # 预计算查表（python train_model.py lut 生成），实测最大误差超过上限时不启用
+    app.config['LOOKUP_TABLE'] = os.getenv('LOOKUP_TABLE', '0') == '1'
+    app.config['LOOKUP_TABLE_MAX_ERROR'] = float(os.getenv('LOOKUP_TABLE_MAX_ERROR', '0.25'))
+    # 单行推理延迟预算（毫秒），超出时改用蒸馏小模型（python train_model.py distill 生成），0 为不启用
+    app.config['INFERENCE_LATENCY_BUDGET_MS'] = float(os.getenv('INFERENCE_LATENCY_BUDGET_MS', '0'))
+    # 默认在首个预测请求时才加载模型（fork 之后）；MODEL_PRELOAD=1 时导入即加载
+    app.config['MODEL_PRELOAD'] = os.getenv('MODEL_PRELOAD') == '1'
+    # 预测结果缓存：按量化后的身体数据 + 品类/尺码命中，模型版本切换时自动失效；PREDICT_CACHE_SIZE=0 关闭
+    app.config['PREDICT_CACHE_SIZE'] = int(os.getenv('PREDICT_CACHE_SIZE', '4096'))
+    app.config['PREDICT_CACHE_TTL'] = float(os.getenv('PREDICT_CACHE_TTL', '300'))
+    app.config['PREDICT_CACHE_RESOLUTION'] = float(os.getenv('PREDICT_CACHE_RESOLUTION', '0.5'))
@@ -0,0 +1,102 @@
+import ast
+import os
+import sqlite3
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import Engine
+
+DEFAULT_DATABASE_URI = 'sqlite:///site.db'
+# 迁移脚本目录；按模块位置定位，不依赖启动时的工作目录
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+def database_uri():
+    # 兼容部分平台提供的 postgres:// 旧写法
+    uri = os.getenv('DATABASE_URL', DEFAULT_DATABASE_URI)
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(uri):
+    """按数据库类型生成 SQLAlchemy 引擎参数，全部可通过环境变量覆盖。"""
+    if uri.startswith('sqlite'):
+        options = {
+            # 等锁超时由 PRAGMA busy_timeout 统一控制，这里同步设置驱动层超时
+            'connect_args': {
+                'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')) / 1000.0,
+                'check_same_thread': False
+            }
+        }
+        # 内存库使用 SingletonThreadPool/StaticPool，不接受 QueuePool 参数
+        if ':memory:' not in uri and uri not in ('sqlite://', 'sqlite:///'):
+            options.update({
+                'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+                'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+                'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30'))
+            })
+        return options
+
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        'pool_pre_ping': True
+    }
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    # WAL 模式下读写互不阻塞；synchronous=NORMAL 在 WAL 下仍保证崩溃一致性
+    cursor.execute(f"PRAGMA journal_mode={os.getenv('SQLITE_JOURNAL_MODE', 'WAL')}")
+    cursor.execute(f"PRAGMA synchronous={os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')}")
+    cursor.execute(f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))}")
+    cursor.close()
+
+
+def configure_database(app):
+    uri = database_uri()
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(uri)
+    if not event.contains(Engine, 'connect', apply_sqlite_pragmas):
+        event.listen(Engine, 'connect', apply_sqlite_pragmas)
+
+
+def migration_heads(directory=MIGRATIONS_DIR):
+    """解析迁移脚本中的 revision/down_revision 得到最新版本号集合；不导入 alembic，避免拖慢 worker 启动。"""
+    revisions, parents = set(), set()
+    versions = os.path.join(directory, 'versions')
+    for name in os.listdir(versions):
+        if not name.endswith('.py'):
+            continue
+        with open(os.path.join(versions, name), encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+        values = {}
+        for node in tree.body:
+            if (isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)
+                    and node.targets[0].id in ('revision', 'down_revision')):
+                values[node.targets[0].id] = ast.literal_eval(node.value)
+        if values.get('revision'):
+            revisions.add(values['revision'])
+            down = values.get('down_revision')
+            if isinstance(down, (tuple, list)):
+                parents.update(down)
+            elif down:
+                parents.add(down)
+    return revisions - parents
+
+
+def check_schema_current(engine):
+    """数据库的 alembic_version 与迁移脚本最新版本不一致时抛出 RuntimeError，阻止以旧表结构提供服务。"""
+    heads = migration_heads()
+    with engine.connect() as conn:
+        current = set()
+        if inspect(conn).has_table('alembic_version'):
+            current = {row[0] for row in conn.execute(text('SELECT version_num FROM alembic_version'))}
+    if current != heads:
+        raise RuntimeError(
+            f"数据库结构版本（{', '.join(sorted(current)) or '未迁移'}）与迁移最新版本（{', '.join(sorted(heads))}）"
+            f"不一致，请先执行 flask --app app db upgrade（或用 python app.py 启动自动升级）")
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -9,6 +10,8 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     password = db.Column(db.String(200), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
+    # 令牌版本号：写入 JWT，删除用户或调整角色时加一，使已签发的令牌失效
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     # 用户当前的身体数据缓存
     height = db.Column(db.Float, nullable=True)
     waist = db.Column(db.Float, nullable=True)
@@ -42,6 +45,11 @@ class History(db.Model):
     cup_size = db.Column(db.String(5), nullable=True)
     feedback = db.relationship('Feedback', backref='history', lazy=True, cascade='all, delete-orphan')
 
+    # 按用户分页拉取历史记录 (user_id, timestamp) 的复合索引
+    __table_args__ = (
+        db.Index('ix_history_user_id_timestamp', 'user_id', 'timestamp'),
+    )
+
 class Feedback(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     history_id = db.Column(db.Integer, db.ForeignKey('history.id'), nullable=False, index=True)
@@ -49,3 +57,79 @@ class Feedback(db.Model):
     fit_feedback = db.Column(db.String(20), nullable=False)  # tight / fit / loose
     note = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    # 查询每条历史记录最新反馈 (history_id, created_at) 的复合索引
+    __table_args__ = (
+        db.Index('ix_feedback_history_id_created_at', 'history_id', 'created_at'),
+    )
+
+
+class Job(db.Model):
+    """后台任务队列（批量删除用户、清空历史、按保留期清理）；由 jobs.JobRunner 认领并分块执行。"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued / running / done / failed
+    params = db.Column(db.Text, nullable=False, default='{}')
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_by = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # 每个分块提交时更新；执行进程异常退出后，心跳过期的任务会被重新认领
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
+    # 按状态认领最早的任务
+    __table_args__ = (
+        db.Index('ix_job_status_id', 'status', 'id'),
+    )
+
+
+def latest_feedback_subquery(history_ids=None, user_id=None):
+    """每条历史记录的最新一条反馈（窗口函数取 rn == 1）。"""
+    rn = db.func.row_number().over(
+        partition_by=Feedback.history_id,
+        order_by=(Feedback.created_at.desc(), Feedback.id.desc())
+    ).label('rn')
+    query = db.session.query(
+        Feedback.history_id.label('history_id'),
+        Feedback.fit_feedback.label('fit_feedback'),
+        Feedback.note.label('note'),
+        Feedback.created_at.label('created_at'),
+        rn
+    )
+    if history_ids is not None:
+        query = query.filter(Feedback.history_id.in_(history_ids))
+    if user_id is not None:
+        query = query.filter(Feedback.user_id == user_id)
+    return query.subquery()
+
+
+# --- 管理后台汇总表：与 History 的写入/删除在同一事务中增量维护 ---
+class ResultStat(db.Model):
+    result = db.Column(db.String(20), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+
+class UserHistoryStat(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    history_count = db.Column(db.Integer, nullable=False, default=0)
+
+    # 管理后台按预测记录数排序的 keyset 分页
+    __table_args__ = (
+        db.Index('ix_user_history_stat_count_user', 'history_count', 'user_id'),
+    )
+
+
+@event.listens_for(User, 'after_insert')
+def create_user_history_stat(mapper, connection, target):
+    # 每个用户都有一行汇总记录（新用户为 0），无论从注册接口、基准播种还是其他路径创建；
+    # 管理后台按预测记录数排序时内连接汇总表，不会漏掉用户
+    connection.execute(UserHistoryStat.__table__.insert().values(user_id=target.id, history_count=0))
+
+
+class CategoryDailyStat(db.Model):
+    category = db.Column(db.String(50), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
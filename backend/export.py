@@ -0,0 +1,224 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import and_, select, tuple_
+
+from db_models import db, History, latest_feedback_subquery
+from pagination import decode_cursor, encode_cursor
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet')
+}
+
+COLUMNS = [
+    'id', 'user_id', 'timestamp', 'category', 'size', 'result', 'confidence',
+    'height', 'waist', 'hips', 'bra_size', 'cup_size', 'feedback', 'feedback_note', 'feedback_at'
+]
+
+# 每次从游标取出的行数，也是 CSV/NDJSON 每个输出块与 Parquet 每个 row group 的行数
+CHUNK_ROWS = 1000
+
+
+class ExportError(ValueError):
+    """导出参数非法或缺少可选依赖，调用方应返回 400。"""
+
+
+def parse_time(raw, name):
+    if not raw:
+        return None
+    try:
+        return datetime.fromisoformat(raw)
+    except ValueError:
+        raise ExportError(f'{name} 参数非法，应为 ISO 日期或时间')
+
+
+def parse_filters(since=None, until=None, category=None, after=None):
+    """把字符串参数解析为 export_rows 的过滤条件；since/until 为左闭右开区间，after 为上次导出的水位。"""
+    try:
+        watermark = decode_cursor(after) if after else None
+    except ValueError:
+        raise ExportError('after 水位非法')
+    return {
+        'since': parse_time(since, 'since'),
+        'until': parse_time(until, 'until'),
+        'category': category or None,
+        'after': watermark
+    }
+
+
+def high_watermark(since=None, until=None, category=None, after=None, settle_seconds=5.0):
+    """本次导出的上界 (timestamp, id)，没有新数据时返回 None。
+
+    History 的 timestamp 在请求时生成、由后台队列稍后落库，最近 settle_seconds 秒内的记录可能还有
+    更早时间戳的行未提交，本次不导出，留给下一次增量导出，保证按水位续传不漏行。
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settle_seconds)
+    until = min(until, cutoff) if until else cutoff
+    query = db.session.query(History.timestamp, History.id).filter(*_criteria(since, until, category, after))
+    row = query.order_by(History.timestamp.desc(), History.id.desc()).first()
+    return (row[0], row[1]) if row else None
+
+
+def _criteria(since, until, category, after):
+    criteria = [History.timestamp.isnot(None)]
+    if since:
+        criteria.append(History.timestamp >= since)
+    if until:
+        criteria.append(History.timestamp < until)
+    if category:
+        criteria.append(History.category == category)
+    if after:
+        criteria.append(tuple_(History.timestamp, History.id) > after)
+    return criteria
+
+
+def export_rows(upto, since=None, until=None, category=None, after=None, chunk_rows=CHUNK_ROWS):
+    """按 (timestamp, id) 升序逐块产出 History 及其最新一条反馈，每块为元组列表。
+
+    使用服务端游标（stream_results）+ yield_per 分块拉取，内存占用与总行数无关；
+    只查列不查 ORM 对象，session 的 identity map 不随导出增长。
+    """
+    latest = latest_feedback_subquery()
+    stmt = select(
+        History.id, History.user_id, History.timestamp, History.category, History.size_input, History.result,
+        History.confidence, History.height, History.waist, History.hips, History.bra_size, History.cup_size,
+        latest.c.fit_feedback, latest.c.note, latest.c.created_at
+    ).outerjoin(
+        latest, and_(latest.c.history_id == History.id, latest.c.rn == 1)
+    ).where(
+        *_criteria(since, until, category, after),
+        tuple_(History.timestamp, History.id) <= upto
+    ).order_by(History.timestamp.asc(), History.id.asc())
+
+    result = db.session.execute(stmt.execution_options(stream_results=True, yield_per=chunk_rows))
+    try:
+        for partition in result.partitions():
+            yield partition
+    finally:
+        result.close()
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def _ndjson_chunks(partitions):
+    for rows in partitions:
+        lines = []
+        for row in rows:
+            record = dict(zip(COLUMNS, row))
+            record['timestamp'] = _iso(record['timestamp'])
+            record['feedback_at'] = _iso(record['feedback_at'])
+            lines.append(json.dumps(record, ensure_ascii=False))
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def _csv_chunks(partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for rows in partitions:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _parquet_chunks(partitions):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('id', pa.int64()), ('user_id', pa.int64()), ('timestamp', pa.timestamp('us')),
+        ('category', pa.string()), ('size', pa.float64()), ('result', pa.string()),
+        ('confidence', pa.float64()), ('height', pa.float64()), ('waist', pa.float64()),
+        ('hips', pa.float64()), ('bra_size', pa.float64()), ('cup_size', pa.string()),
+        ('feedback', pa.string()), ('feedback_note', pa.string()), ('feedback_at', pa.timestamp('us'))
+    ])
+    # 每块写成一个 row group，写完即把缓冲区里的字节交给调用方，文件尾在最后写出
+    sink = io.BytesIO()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    for rows in partitions:
+        columns = list(zip(*rows))
+        writer.write_table(pa.Table.from_arrays([pa.array(col, type=field.type)
+                                                 for col, field in zip(columns, schema)], schema=schema))
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+
+def check_format(fmt):
+    if fmt not in FORMATS:
+        raise ExportError(f"format 参数非法，可选 {'/'.join(FORMATS)}")
+    if fmt == 'parquet':
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ExportError('Parquet 导出需要安装 pyarrow')
+
+
+def encode(fmt, partitions):
+    """把 export_rows 的分块结果编码为字节块流。"""
+    return {'ndjson': _ndjson_chunks, 'csv': _csv_chunks, 'parquet': _parquet_chunks}[fmt](partitions)
+
+
+def format_watermark(watermark):
+    return encode_cursor(*watermark) if watermark else None
+
+
+def register_export_commands(app):
+    @app.cli.command('export-history')
+    @click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), default='ndjson')
+    @click.option('--output', '-o', required=True, help='输出文件路径')
+    @click.option('--since', default=None, help='起始时间（含），ISO 格式')
+    @click.option('--until', default=None, help='截止时间（不含），ISO 格式')
+    @click.option('--category', default=None)
+    @click.option('--state', default=None, help='水位文件：存在时从其中记录的位置续传，导出完成后更新')
+    @click.option('--settle-seconds', type=float, default=5.0, help='不导出最近 N 秒内的记录，等待后台写入落库')
+    def export_history_command(fmt, output, since, until, category, state, settle_seconds):
+        """流式导出预测历史及用户反馈（NDJSON / CSV / Parquet）。"""
+        after = None
+        if state and os.path.exists(state):
+            with open(state, encoding='utf-8') as f:
+                after = json.load(f).get('watermark')
+        try:
+            check_format(fmt)
+            filters = parse_filters(since, until, category, after)
+        except ExportError as e:
+            raise click.UsageError(str(e))
+
+        upto = high_watermark(settle_seconds=settle_seconds, **filters)
+        if upto is None:
+            print('没有新的记录需要导出')
+            return
+
+        rows = 0
+
+        def counted(partitions):
+            nonlocal rows
+            for partition in partitions:
+                rows += len(partition)
+                yield partition
+
+        # 先写临时文件，完整写出后再替换并更新水位，中途失败不会推进水位
+        with open(output + '.tmp', 'wb') as f:
+            for chunk in encode(fmt, counted(export_rows(upto, **filters))):
+                f.write(chunk)
+        os.replace(output + '.tmp', output)
+
+        watermark = format_watermark(upto)
+        if state:
+            with open(state + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({'watermark': watermark, 'exported_at': datetime.utcnow().isoformat()}, f)
+            os.replace(state + '.tmp', state)
+        print(f'已导出 {rows} 条记录到 {output}，水位 {watermark}')
@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# 原生模型格式：XGBoost UBJ booster + 描述预处理参数的 JSON，服务端加载时无需 sklearn/pandas/pickle
+SPEC_FORMAT_VERSION = 1
+
+
+class FastPredictor:
+    """绕过 pandas/sklearn 的推理快速通道。
+
+    启动时从已拟合的 Pipeline 中读出 StandardScaler 的均值/方差与 OneHotEncoder 的词表，
+    推理时直接把请求编码进预分配的 NumPy 行，再调用 XGBoost booster。
+    """
+
+    def __init__(self, booster, layout, width, iteration_range, sparse_input=False):
+        self.booster = booster
+        self.layout = layout
+        self.width = width
+        self.iteration_range = iteration_range
+        # 稀疏输入下 XGBoost 把未出现的 one-hot 位视为缺失值，快速通道需保持一致
+        self.inactive_value = np.nan if sparse_input else 0.0
+        self._local = threading.local()
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        pre = pipeline.named_steps['pre']
+        clf = pipeline.named_steps['clf']
+
+        if getattr(clf, 'n_classes_', 3) != 3:
+            raise ValueError('快速通道仅支持三分类模型')
+
+        layout = []
+        offset = 0
+        for name, transformer, columns in pre.transformers_:
+            if transformer == 'drop' or name == 'remainder':
+                continue
+            kind = type(transformer).__name__
+            if kind == 'StandardScaler':
+                n = len(columns)
+                mean = transformer.mean_ if transformer.with_mean else np.zeros(n)
+                scale = transformer.scale_ if transformer.with_std else np.ones(n)
+                layout.append(('num', list(columns), offset, np.asarray(mean, dtype=np.float64),
+                               np.asarray(scale, dtype=np.float64)))
+                offset += n
+            elif kind == 'OneHotEncoder':
+                if transformer.drop is not None:
+                    raise ValueError('快速通道不支持 OneHotEncoder(drop=...)')
+                for column, categories in zip(columns, transformer.categories_):
+                    index = {value: offset + i for i, value in enumerate(categories)}
+                    layout.append(('cat', column, index))
+                    offset += len(categories)
+            else:
+                raise ValueError(f'快速通道不支持的预处理器: {kind}')
+
+        booster = clf.get_booster()
+        try:
+            best_iteration = booster.best_iteration
+        except AttributeError:
+            best_iteration = None
+        iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, 0)
+
+        return cls(booster, layout, offset, iteration_range,
+                   sparse_input=bool(getattr(pre, 'sparse_output_', False)))
+
+    @classmethod
+    def from_spec(cls, spec, booster):
+        if spec.get('format_version') != SPEC_FORMAT_VERSION:
+            raise ValueError(f"不支持的预处理描述版本: {spec.get('format_version')}")
+        layout = []
+        for item in spec['layout']:
+            if item['kind'] == 'num':
+                layout.append(('num', item['columns'], item['offset'],
+                               np.asarray(item['mean'], dtype=np.float64),
+                               np.asarray(item['scale'], dtype=np.float64)))
+            else:
+                index = {value: item['offset'] + i for i, value in enumerate(item['categories'])}
+                layout.append(('cat', item['column'], index))
+        return cls(booster, layout, spec['width'], tuple(spec['iteration_range']),
+                   sparse_input=spec['sparse_input'])
+
+    def to_spec(self):
+        layout = []
+        for spec in self.layout:
+            if spec[0] == 'num':
+                _, columns, offset, mean, scale = spec
+                layout.append({'kind': 'num', 'columns': list(columns), 'offset': offset,
+                               'mean': mean.tolist(), 'scale': scale.tolist()})
+            else:
+                _, column, index = spec
+                categories = sorted(index, key=index.get)
+                layout.append({'kind': 'cat', 'column': column, 'offset': index[categories[0]] if categories else 0,
+                               'categories': [c.item() if hasattr(c, 'item') else c for c in categories]})
+        return {
+            'format_version': SPEC_FORMAT_VERSION,
+            'layout': layout,
+            'width': self.width,
+            'iteration_range': list(self.iteration_range),
+            'sparse_input': bool(self.inactive_value != 0.0),
+            'n_classes': 3
+        }
+
+    def _buffer(self, n_rows):
+        buf = getattr(self._local, 'buf', None)
+        if buf is None or buf.shape[0] < n_rows:
+            buf = np.empty((max(n_rows, 1), self.width), dtype=np.float64)
+            self._local.buf = buf
+        return buf[:n_rows]
+
+    def encode(self, rows):
+        out = self._buffer(len(rows))
+        out.fill(self.inactive_value)
+        for i, row in enumerate(rows):
+            line = out[i]
+            for spec in self.layout:
+                if spec[0] == 'num':
+                    _, columns, offset, mean, scale = spec
+                    for j, column in enumerate(columns):
+                        # 缺失字段与 DataFrame 构造时一样视为 NaN，由 XGBoost 按缺失值处理
+                        value = row.get(column)
+                        line[offset + j] = np.nan if value is None else (float(value) - mean[j]) / scale[j]
+                else:
+                    # handle_unknown='ignore'：未知类别（含缺失）整组保持为 0
+                    pos = spec[2].get(row.get(spec[1]))
+                    if pos is not None:
+                        line[pos] = 1.0
+        return out
+
+    def predict_proba(self, rows):
+        encoded = self.encode(rows)
+        return self.booster.inplace_predict(encoded, iteration_range=self.iteration_range)
+
+
+def native_paths(model_path):
+    """fit_model.pkl -> (fit_model.ubj, fit_model.spec.json)"""
+    stem = os.path.splitext(model_path)[0]
+    return stem + '.ubj', stem + '.spec.json'
+
+
+def save_native(fast, model_path):
+    booster_path, spec_path = native_paths(model_path)
+    # booster 先落盘，spec 最后原子替换，读到 spec 即说明整套文件已完整
+    fast.booster.save_model(booster_path + '.tmp.ubj')
+    os.replace(booster_path + '.tmp.ubj', booster_path)
+    with open(spec_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(fast.to_spec(), f, ensure_ascii=False)
+    os.replace(spec_path + '.tmp', spec_path)
+    return booster_path, spec_path
+
+
+def load_native(model_path, nthread=None):
+    # xgboost 只在真正加载模型时导入，缩短 worker 启动时间
+    import xgboost as xgb
+
+    booster_path, spec_path = native_paths(model_path)
+    with open(spec_path, encoding='utf-8') as f:
+        spec = json.load(f)
+    booster = xgb.Booster(model_file=booster_path)
+    if nthread:
+        booster.set_param({'nthread': nthread})
+    return FastPredictor.from_spec(spec, booster)
+
+
+def check_parity(pipeline, fast, rows, atol=1e-6):
+    """对比 Pipeline 参考通道与快速通道的概率输出，返回最大绝对误差与是否一致。"""
+    import pandas as pd
+
+    columns = list(rows[0].keys())
+    expected = pipeline.predict_proba(pd.DataFrame(rows, columns=columns))
+    actual = fast.predict_proba(rows)
+    max_diff = float(np.max(np.abs(expected - actual)))
+    return max_diff, max_diff <= atol
+
+
+def sample_rows(n=64, seed=0):
+    # 覆盖合法输入范围的合成样本，用于启动时一致性校验
+    rng = np.random.default_rng(seed)
+    rows = []
+    for _ in range(n):
+        height = float(rng.uniform(140, 200))
+        waist = float(rng.uniform(50, 120))
+        rows.append({
+            'cup_size': str(rng.choice(['a', 'b', 'c', 'd', 'dd', 'unknown'])),
+            'bra_num': float(rng.choice([30, 32, 34, 36, 38, 40])),
+            'hips': waist * 1.4,
+            'waist': waist,
+            'category': str(rng.choice(['dresses', 'tops', 'bottoms', 'outerwear'])),
+            'size': float(rng.integers(0, 27)),
+            'height_cm': height,
+            'bmi_proxy': waist / height
+        })
+    return rows
+
+
+if __name__ == '__main__':
+    import sys
+    import joblib
+
+    path = sys.argv[1] if len(sys.argv) > 1 else 'models/fit_model.pkl'
+    pipeline = joblib.load(path)
+    fast = FastPredictor.from_pipeline(pipeline)
+    max_diff, ok = check_parity(pipeline, fast, sample_rows(1000))
+    print(f'max_abs_diff={max_diff:.3e} parity={"OK" if ok else "FAILED"}')
+    sys.exit(0 if ok else 1)
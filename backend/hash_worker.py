@@ -0,0 +1,34 @@
+"""密码哈希进程池的工作进程入口。
+
+只依赖 werkzeug 与标准库：forkserver 服务进程预加载本模块，哈希进程由它 fork 而来，
+不会导入 app.py 及其中的数据库、模型注册表、共享存储等初始化逻辑。
+"""
+import multiprocessing
+import os
+import threading
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+def hash_password(password, method):
+    return generate_password_hash(password, method)
+
+
+def check_password(stored_hash, password):
+    return check_password_hash(stored_hash, password)
+
+
+def _watch_parent(parent):
+    # forkserver 下 getppid() 是服务进程，这里等待的是创建进程池的 app 进程
+    parent.join()
+    os._exit(0)
+
+
+def init_worker(nice):
+    # 哈希进程降低调度优先级，CPU 紧张时优先保证 /predict 等请求线程
+    if nice and hasattr(os, 'nice'):
+        os.nice(nice)
+    # 父进程被强制结束（未执行 atexit）时随之退出，不留下孤儿进程
+    parent = multiprocessing.parent_process()
+    if parent is not None:
+        threading.Thread(target=_watch_parent, args=(parent,), daemon=True).start()
@@ -0,0 +1,152 @@
+import threading
+import time
+
+import click
+from flask import current_app, jsonify
+from flask_jwt_extended import get_jwt
+
+from db_models import db, User
+from shared_store import StoreError
+
+# 缓存中表示“用户已不存在”的占位，与未缓存（None）区分
+_MISSING = object()
+
+
+def token_claims(user):
+    """登录时写入 JWT 的附加声明：管理员标记与令牌版本号。"""
+    return {'adm': bool(user.is_admin), 'ver': user.token_version or 0}
+
+
+def revoke_tokens(session, user_id):
+    """令牌版本号加一，使该用户已签发的令牌全部失效；调用方负责提交。"""
+    session.query(User).filter(User.id == user_id).update(
+        {'token_version': db.func.coalesce(User.token_version, 0) + 1}, synchronize_session=False)
+
+
+class IdentityCache:
+    """进程内的用户身份缓存：user_id -> (令牌版本号, 是否管理员)。
+
+    每个 @jwt_required 请求都要校验令牌版本号是否仍有效，命中缓存时不查库。
+    删除用户、调整角色后调用 invalidate()：本进程立即生效，并在共享存储（多进程部署时）中写入撤销标记，
+    其他进程命中缓存时同时读取该用户的撤销标记（一次 MGET），标记晚于缓存时间则重新查库。
+    共享存储不可用时按未命中处理（查库），不会因此放行已撤销的令牌。
+    """
+
+    def __init__(self, ttl=30.0, max_entries=10000, store=None, prefix='identity'):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # 进程内的 memory:// 存储无法跨进程传递撤销，不使用
+        self.store = store if store is not None and store.shared else None
+        self.prefix = prefix
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revoked = 0
+        self.store_errors = 0
+
+    def _revocation_key(self, user_id):
+        return f'{self.prefix}:revoked:{user_id}'
+
+    def _revoked_since(self, user_id, cached_at):
+        if self.store is None:
+            return False
+        try:
+            value = self.store.mget([self._revocation_key(user_id)])[0]
+        except StoreError:
+            self.store_errors += 1
+            return True
+        return value is not None and float(value) >= cached_at
+
+    def lookup(self, user_id, fresh=False):
+        """返回 (token_version, is_admin)，用户不存在时返回 None；fresh=True 时跳过缓存直接查库。"""
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if not fresh and entry is not None and entry[0] > now and not self._revoked_since(user_id, entry[2]):
+            self.hits += 1
+            return None if entry[1] is _MISSING else entry[1]
+
+        self.misses += 1
+        # 查库之前取墙上时间：查询与撤销并发时，撤销标记的时间不早于它，下次命中时会再查一次
+        cached_at = time.time()
+        row = db.session.query(User.token_version, User.is_admin).filter(User.id == user_id).first()
+        identity = (row[0] or 0, bool(row[1])) if row is not None else None
+        if self.ttl > 0:
+            with self._lock:
+                if len(self._entries) >= self.max_entries:
+                    self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                    if len(self._entries) >= self.max_entries:
+                        self._entries.clear()
+                self._entries[user_id] = (now + self.ttl, _MISSING if identity is None else identity, cached_at)
+        return identity
+
+    def invalidate(self, *user_ids):
+        """在撤销（令牌版本号加一或删除用户）提交之后调用。"""
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+        if self.store is None or self.ttl <= 0 or not user_ids:
+            return
+        # 标记保留 ttl 秒：更早缓存的条目届时均已过期
+        revoked_at = str(time.time()).encode('ascii')
+        try:
+            self.store.mset([(self._revocation_key(user_id), revoked_at) for user_id in user_ids], self.ttl)
+        except StoreError:
+            self.store_errors += 1
+            print(f'[identity] 撤销标记写入共享存储失败，其他进程最多延迟 {self.ttl:g} 秒生效: {user_ids}')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'revoked': self.revoked, 'store_errors': self.store_errors, 'ttl_seconds': self.ttl,
+                'shared': self.store is not None}
+
+
+def token_is_admin():
+    """当前请求的令牌是否属于管理员：以令牌声明为准（版本号已在校验令牌时按库中最新值核对），
+    旧令牌（无 adm 声明）直接查库。"""
+    claims = get_jwt()
+    if 'adm' in claims:
+        return bool(claims['adm'])
+    identity = current_app.extensions['identity_cache'].lookup(int(claims['sub']), fresh=True)
+    return identity is not None and identity[1]
+
+
+def init_identity_cache(app, jwt_manager):
+    cache = IdentityCache(ttl=app.config['IDENTITY_CACHE_TTL'], store=app.extensions.get('shared_store'))
+    app.extensions['identity_cache'] = cache
+
+    @jwt_manager.token_in_blocklist_loader
+    def token_revoked(jwt_header, jwt_payload):
+        # 用户已删除，或令牌版本号落后（角色调整、删除任务已提交）时拒绝；旧令牌没有 ver 声明，按 0 处理。
+        # 带管理员声明的令牌不走缓存：取消管理员或删除账号后，任何进程都不能再凭它访问管理接口
+        identity = cache.lookup(int(jwt_payload['sub']), fresh=bool(jwt_payload.get('adm')))
+        revoked = identity is None or identity[0] != jwt_payload.get('ver', 0)
+        if revoked:
+            cache.revoked += 1
+        return revoked
+
+    @jwt_manager.revoked_token_loader
+    def revoked_token_response(jwt_header, jwt_payload):
+        return jsonify({'msg': '登录状态已失效，请重新登录'}), 401
+
+    return cache
+
+
+def register_identity_commands(app):
+    @app.cli.command('set-admin')
+    @click.argument('username')
+    @click.option('--revoke', is_flag=True, help='取消管理员权限')
+    def set_admin_command(username, revoke):
+        """授予或取消用户的管理员权限，并使其已签发的令牌失效。"""
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.UsageError(f'用户不存在: {username}')
+        user.is_admin = not revoke
+        revoke_tokens(db.session, user.id)
+        db.session.commit()
+        app.extensions['identity_cache'].invalidate(user.id)
+        print(f"{username} 已{'取消' if revoke else '设为'}管理员，原有登录令牌已失效")
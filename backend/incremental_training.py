@@ -0,0 +1,142 @@
+from datetime import datetime
+
+import click
+import numpy as np
+from sqlalchemy import or_, tuple_
+
+from db_models import db, History, Feedback
+from pagination import decode_cursor
+
+# 用户反馈 -> 训练标签：偏紧即衣服偏小 (small=0)，偏松即偏大 (large=2)
+FEEDBACK_TARGET = {'tight': 0, 'fit': 1, 'loose': 2}
+
+
+def parse_watermark(raw):
+    """解析 training.json 中的反馈水位，返回 load_feedback 的过滤条件，没有水位时返回 None。
+
+    水位为已读取的最大 Feedback.id。created_at 在写入前由应用生成，提交可能晚于 created_at 更大的反馈，
+    按时间记水位会永久跳过这类反馈；id 在插入时分配，SQLite 同一时刻只有一个写事务，id 顺序即提交顺序。
+    旧版本记录的是 (created_at, id) 游标：其后的反馈与 id 更大的反馈（可能被跳过的那些）都视为未读取。
+    """
+    if raw is None:
+        return None
+    if isinstance(raw, int):
+        return Feedback.id > raw
+    created_at, feedback_id = decode_cursor(raw)
+    return or_(tuple_(Feedback.created_at, Feedback.id) > (created_at, feedback_id), Feedback.id > feedback_id)
+
+
+def load_feedback(after=None):
+    """读取水位之后的新反馈，返回 [(feedback_id, fit_feedback, History)]，按 id 升序。"""
+    query = db.session.query(Feedback.id, Feedback.fit_feedback, History) \
+        .join(History, History.id == Feedback.history_id)
+    if after is not None:
+        query = query.filter(after)
+    return query.order_by(Feedback.id.asc()).all()
+
+
+def feedback_frame(rows):
+    """把反馈对应的 History 身体数据映射为训练特征；同一条历史记录只保留最新一次反馈。"""
+    import pandas as pd
+    from train_model import FEATURES
+
+    latest = {}
+    for _, fit_feedback, h in rows:
+        if fit_feedback in FEEDBACK_TARGET and h.height and h.waist:
+            latest[h.id] = (h, FEEDBACK_TARGET[fit_feedback])
+
+    records, targets = [], []
+    for h, target in latest.values():
+        # 与 app.py 中 parse_body_data/build_feature_row 的口径一致
+        hips = h.hips if h.hips else h.waist * 1.4
+        records.append({
+            'cup_size': h.cup_size or 'b',
+            'bra_num': h.bra_size or 0.0,
+            'hips': hips,
+            'waist': h.waist,
+            'category': h.category,
+            'size': h.size_input,
+            'height_cm': h.height,
+            'bmi_proxy': h.waist / h.height
+        })
+        targets.append(target)
+    return pd.DataFrame(records, columns=FEATURES), np.array(targets, dtype=int)
+
+
+def split_holdout(X, y, fraction, seed=0):
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(y))
+    n_holdout = int(round(len(y) * fraction))
+    holdout, train = order[:n_holdout], order[n_holdout:]
+    return X.iloc[train], y[train], X.iloc[holdout], y[holdout]
+
+
+def run_incremental_training(model_path, rounds=20, learning_rate=None, min_rows=50, holdout=0.2,
+                             tolerance=0.0, force=False, lookup_table=False):
+    """从上次水位之后的用户反馈继续训练当前模型，留出集上不差于旧模型时发布新版本。
+
+    水位记录在每个版本目录的 training.json 中，随模型版本走：全量重训的版本没有水位，
+    下一次增量训练会从头读取全部反馈（全量训练只用了 ModCloth 数据）。
+    """
+    import joblib
+    from train_model import continue_boosting, current_model, holdout_scores, publish_model, training_metadata
+
+    base_version, base_path = current_model(model_path)
+    meta = training_metadata(base_path)
+    rows = load_feedback(parse_watermark(meta.get('feedback_watermark')))
+    X, y = feedback_frame(rows)
+    report = {'base_version': base_version, 'new_feedback': len(rows), 'rows': int(len(y))}
+    if len(y) < min_rows:
+        report['status'] = 'skipped'
+        report['reason'] = f'新反馈不足 {min_rows} 条'
+        return report
+
+    X_train, y_train, X_holdout, y_holdout = split_holdout(X, y, holdout)
+    pipeline = joblib.load(base_path)
+    updated = continue_boosting(pipeline, X_train, y_train, rounds=rounds, learning_rate=learning_rate)
+
+    report['holdout_rows'] = int(len(y_holdout))
+    if len(y_holdout):
+        report['holdout'] = {'base': holdout_scores(pipeline, X_holdout, y_holdout),
+                             'updated': holdout_scores(updated, X_holdout, y_holdout)}
+        regressed = report['holdout']['updated']['accuracy'] < report['holdout']['base']['accuracy'] - tolerance
+        if regressed and not force:
+            # 不推进水位，新反馈留到下一次与更多数据一起训练
+            report['status'] = 'rejected'
+            report['reason'] = '留出集准确率低于当前模型'
+            return report
+
+    watermark = rows[-1][0]
+    report['version'] = publish_model(updated, model_path, lookup_table=lookup_table, metadata={
+        'kind': 'incremental',
+        'base_version': base_version,
+        'feedback_watermark': watermark,
+        'feedback_rows': int(len(y)),
+        'rounds': rounds,
+        'total_rounds': updated.named_steps['clf'].get_booster().num_boosted_rounds(),
+        'holdout': report.get('holdout'),
+        'trained_at': datetime.utcnow().isoformat()
+    })
+    report['status'] = 'published'
+    report['feedback_watermark'] = watermark
+    return report
+
+
+def register_training_commands(app):
+    @app.cli.command('train-incremental')
+    @click.option('--model', default=None, help='模型路径，默认与服务端 MODEL_PATH 一致')
+    @click.option('--rounds', type=int, default=20, help='在当前 booster 上追加的树数量')
+    @click.option('--learning-rate', type=float, default=None, help='追加树的学习率，默认沿用当前模型')
+    @click.option('--min-rows', type=int, default=50, help='新反馈少于该条数时不训练')
+    @click.option('--holdout', type=float, default=0.2, help='留出评估的反馈比例')
+    @click.option('--tolerance', type=float, default=0.0, help='允许留出集准确率下降的幅度')
+    @click.option('--force', is_flag=True, help='留出集变差时仍然发布')
+    @click.option('--lookup-table', is_flag=True, help='同时为新版本生成预计算查表')
+    def train_incremental_command(model, rounds, learning_rate, min_rows, holdout, tolerance, force, lookup_table):
+        """用上次水位之后的用户反馈热启动继续训练，发布新的模型版本。"""
+        model_path = model or app.config['MODEL_PATH']
+        report = run_incremental_training(model_path, rounds=rounds, learning_rate=learning_rate,
+                                          min_rows=min_rows, holdout=holdout, tolerance=tolerance,
+                                          force=force, lookup_table=lookup_table)
+        for key, value in report.items():
+            print(f'{key}: {value}')
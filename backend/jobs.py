@@ -0,0 +1,266 @@
+import json
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+from background import BackgroundThread
+from db_models import db, User, History, Feedback, Job, UserHistoryStat
+from rollups import record_deleted
+
+JOB_KINDS = ('delete_users', 'purge_history', 'retention')
+
+
+# --- 分块删除：每一步只删除一小块并由调用方单独提交，步与步之间让出 SQLite 写锁 ---
+def _delete_history_chunk(session, criteria, chunk_rows):
+    ids = [row[0] for row in session.query(History.id).filter(*criteria).order_by(History.id).limit(chunk_rows)]
+    if not ids:
+        return 0
+    session.query(Feedback).filter(Feedback.history_id.in_(ids)).delete(synchronize_session=False)
+    record_deleted(session, History.id.in_(ids))
+    session.query(History).filter(History.id.in_(ids)).delete(synchronize_session=False)
+    return len(ids)
+
+
+def _history_steps(session, criteria, chunk_rows):
+    while True:
+        n = _delete_history_chunk(session, criteria, chunk_rows)
+        if not n:
+            return
+        yield n
+
+
+def _feedback_steps(session, user_id, chunk_rows):
+    # 只用于删除用户：该用户对其他用户记录留下的反馈不会随上面的 History 一并删除
+    while True:
+        ids = [row[0] for row in session.query(Feedback.id).filter(Feedback.user_id == user_id).limit(chunk_rows)]
+        if not ids:
+            return
+        session.query(Feedback).filter(Feedback.id.in_(ids)).delete(synchronize_session=False)
+        yield 0
+
+
+def purge_history_steps(session, params, chunk_rows):
+    for user_id in params['user_ids']:
+        criteria = [History.user_id == user_id]
+        # 只清理提交任务时已有的记录，执行期间新产生的预测记录保留
+        if params.get('max_history_id') is not None:
+            criteria.append(History.id <= params['max_history_id'])
+        # 反馈随所属的 History 分块删除，执行期间新记录上的反馈同样保留
+        yield from _history_steps(session, criteria, chunk_rows)
+
+
+def delete_users_steps(session, params, chunk_rows):
+    for user_id in params['user_ids']:
+        yield from _history_steps(session, [History.user_id == user_id], chunk_rows)
+        yield from _feedback_steps(session, user_id, chunk_rows)
+        session.query(UserHistoryStat).filter(UserHistoryStat.user_id == user_id).delete(synchronize_session=False)
+        session.query(User).filter(User.id == user_id).delete(synchronize_session=False)
+        yield 0
+
+
+def retention_steps(session, params, chunk_rows):
+    cutoff = datetime.fromisoformat(params['before'])
+    yield from _history_steps(session, [History.timestamp < cutoff], chunk_rows)
+
+
+def count_rows(session, kind, params):
+    """任务涉及的 History 行数，作为进度的分母。"""
+    query = session.query(db.func.count(History.id))
+    if kind == 'retention':
+        return query.filter(History.timestamp < datetime.fromisoformat(params['before'])).scalar()
+    query = query.filter(History.user_id.in_(params['user_ids']))
+    if params.get('max_history_id') is not None:
+        query = query.filter(History.id <= params['max_history_id'])
+    return query.scalar()
+
+
+STEPS = {
+    'delete_users': delete_users_steps,
+    'purge_history': purge_history_steps,
+    'retention': retention_steps
+}
+
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'params': json.loads(job.params),
+        'total': job.total,
+        'processed': job.processed,
+        'progress': round(job.processed / job.total, 4) if job.total else (1.0 if job.status == 'done' else 0.0),
+        'error': job.error,
+        'created_by': job.created_by,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+class JobRunner:
+    """表驱动的后台任务队列。
+
+    任务写入 job 表后由后台线程认领（条件 UPDATE，多进程部署下同一任务只会被一个进程执行），
+    按 chunk_rows 行一块分多次提交，块与块之间暂停 pause 秒，让 /predict 的写入有机会拿到写锁。
+    每块提交时同时更新进度与心跳；心跳超过 stale_after 秒的 running 任务视为执行进程已退出，重新认领，
+    由于每一步都只删除剩余的行，重复执行是安全的。
+    retention_days > 0 时每天自动提交一次按保留期清理 History 的任务。
+    """
+
+    def __init__(self, app, chunk_rows=500, pause=0.02, poll_interval=1.0, retention_days=0, stale_after=60.0,
+                 worker=True):
+        self.app = app
+        # worker=False 时本进程只提交任务，由其他进程（如单独的任务进程）执行
+        self.worker = worker
+        self.chunk_rows = chunk_rows
+        self.pause = pause
+        self.poll_interval = poll_interval
+        self.retention_days = retention_days
+        self.stale_after = stale_after
+        self._wakeup = threading.Event()
+        self._worker = BackgroundThread(self._run, 'job-runner')
+        self._next_retention_check = 0.0
+
+        self.chunks = 0
+        self.completed = 0
+        self.failed = 0
+
+    def ensure_started(self):
+        if self.worker:
+            self._worker.ensure_started()
+
+    def enqueue(self, session, kind, params, created_by=None):
+        """在调用方的事务中写入任务并提交，返回任务对象。"""
+        if kind not in STEPS:
+            raise ValueError(f'未知的任务类型: {kind}')
+        job = Job(kind=kind, status='queued', params=json.dumps(params), created_by=created_by)
+        session.add(job)
+        session.commit()
+        self._invalidate_caches(kind, params)
+        self.ensure_started()
+        self._wakeup.set()
+        return job
+
+    def drain_writes(self):
+        # 本进程后台写入队列中尚未落库的预测记录先写入，避免删除后才落库、留下孤立记录
+        writer = self.app.extensions.get('history_writer')
+        if writer is not None:
+            writer.flush()
+
+    def run_inline(self, session, kind, params):
+        """数据量很小时在请求线程内直接执行，逐块提交，返回删除的 History 行数。"""
+        self.drain_writes()
+        deleted = 0
+        for n in STEPS[kind](session, params, self.chunk_rows):
+            session.commit()
+            deleted += n
+        session.commit()
+        self._invalidate_caches(kind, params)
+        return deleted
+
+    def _invalidate_caches(self, kind, params):
+        # 提交任务时（令牌已撤销）与执行结束时（用户/记录数已变化）都让本进程的用户列表缓存立即失效，
+        # 其他进程最多延迟 ADMIN_USERS_CACHE_TTL 秒
+        cache = self.app.extensions.get('admin_users_cache')
+        if cache is not None:
+            cache.clear()
+        if kind == 'delete_users':
+            identities = self.app.extensions.get('identity_cache')
+            if identities is not None:
+                identities.invalidate(*params['user_ids'])
+
+    def _run(self):
+        while True:
+            claimed = False
+            with self.app.app_context():
+                try:
+                    self._maybe_schedule_retention()
+                    job = self._claim()
+                    if job is not None:
+                        claimed = True
+                        self._execute(job)
+                except Exception:
+                    db.session.rollback()
+                    traceback.print_exc()
+                finally:
+                    db.session.remove()
+            if not claimed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _claim(self):
+        stale = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        claimable = or_(Job.status == 'queued', (Job.status == 'running') & (Job.heartbeat_at < stale))
+        for (job_id,) in db.session.query(Job.id).filter(claimable).order_by(Job.id).limit(5).all():
+            now = datetime.utcnow()
+            claimed = db.session.query(Job).filter(Job.id == job_id, claimable) \
+                .update({'status': 'running', 'heartbeat_at': now,
+                         'started_at': db.func.coalesce(Job.started_at, now)}, synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                return db.session.get(Job, job_id)
+        return None
+
+    def _execute(self, job):
+        job_id, kind, params = job.id, job.kind, json.loads(job.params)
+        try:
+            self.drain_writes()
+            if not job.total:
+                job.total = count_rows(db.session, kind, params)
+                db.session.commit()
+            for n in STEPS[kind](db.session, params, self.chunk_rows):
+                db.session.query(Job).filter(Job.id == job_id).update(
+                    {'processed': Job.processed + n, 'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+                db.session.commit()
+                self.chunks += 1
+                if self.pause:
+                    time.sleep(self.pause)
+            db.session.query(Job).filter(Job.id == job_id).update(
+                {'status': 'done', 'finished_at': datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+            self.completed += 1
+        except Exception as e:
+            db.session.rollback()
+            traceback.print_exc()
+            db.session.query(Job).filter(Job.id == job_id).update(
+                {'status': 'failed', 'error': str(e)[:2000], 'finished_at': datetime.utcnow()},
+                synchronize_session=False)
+            db.session.commit()
+            self.failed += 1
+
+        self._invalidate_caches(kind, params)
+
+    def _maybe_schedule_retention(self):
+        if self.retention_days <= 0 or time.monotonic() < self._next_retention_check:
+            return
+        self._next_retention_check = time.monotonic() + 3600
+        # 已有排队/执行中的清理任务，或 24 小时内提交过，则不重复提交
+        recent = db.session.query(Job.id).filter(
+            Job.kind == 'retention',
+            or_(Job.status.in_(['queued', 'running']), Job.created_at > datetime.utcnow() - timedelta(days=1))
+        ).first()
+        if recent is None:
+            before = datetime.utcnow() - timedelta(days=self.retention_days)
+            self.enqueue(db.session, 'retention', {'before': before.isoformat(), 'days': self.retention_days})
+
+    def stats(self):
+        return {'chunks': self.chunks, 'completed': self.completed, 'failed': self.failed}
+
+
+def init_job_runner(app):
+    runner = JobRunner(
+        app,
+        chunk_rows=app.config['JOB_CHUNK_ROWS'],
+        pause=app.config['JOB_CHUNK_PAUSE_MS'] / 1000.0,
+        poll_interval=app.config['JOB_POLL_INTERVAL'],
+        retention_days=app.config['HISTORY_RETENTION_DAYS'],
+        worker=app.config['JOB_WORKER_ENABLED']
+    )
+    app.extensions['job_runner'] = runner
+    # 首个请求时拉起工作线程，处理上次进程退出时遗留的任务与保留期清理
+    app.before_request(runner.ensure_started)
+    return runner
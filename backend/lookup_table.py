@@ -0,0 +1,207 @@
+import json
+import os
+
+import numpy as np
+
+# 查表格式：<模型名>.lut.npy 为网格点概率，<模型名>.lut.mask.npy 标记可插值的网格单元，
+# <模型名>.lut.json 为网格描述与实测误差（最后写入）
+LUT_FORMAT_VERSION = 1
+
+# 默认网格：品类、罩杯、尺码为离散轴；下胸围、身高、腰围为等距网格，查表时三线性插值
+DEFAULT_CATEGORIES = ['dresses', 'tops', 'bottoms', 'outerwear']
+DEFAULT_CUPS = ['a', 'b', 'c', 'd', 'dd/e', 'f', 'g', 'h']
+DEFAULT_BRA = (28.0, 50.0, 2.0)
+DEFAULT_HEIGHT = (140.0, 200.0, 5.0)
+DEFAULT_WAIST = (50.0, 130.0, 2.5)
+SIZES = 27
+# 网格只覆盖未填写臀围（按腰围 * 1.4 推算）的输入
+HIPS_RATIO = 1.4
+
+
+def lookup_paths(model_path):
+    """fit_model.pkl -> (fit_model.lut.npy, fit_model.lut.mask.npy, fit_model.lut.json)"""
+    stem = os.path.splitext(model_path)[0]
+    return stem + '.lut.npy', stem + '.lut.mask.npy', stem + '.lut.json'
+
+
+def axis_points(axis):
+    start, stop, step = axis
+    return start + step * np.arange(int(round((stop - start) / step)) + 1)
+
+
+def grid_spec(categories=None, cups=None, bra=DEFAULT_BRA, height=DEFAULT_HEIGHT, waist=DEFAULT_WAIST,
+              tolerance=0.02):
+    return {
+        'format_version': LUT_FORMAT_VERSION,
+        'categories': list(categories or DEFAULT_CATEGORIES),
+        'cups': list(cups or DEFAULT_CUPS),
+        'bra': list(bra),
+        'height': list(height),
+        'waist': list(waist),
+        'sizes': SIZES,
+        'hips_ratio': HIPS_RATIO,
+        # 网格单元中心处插值与模型的差超过 tolerance 时，该单元内的输入回退到模型
+        'tolerance': tolerance
+    }
+
+
+def table_shape(spec):
+    # (品类, 罩杯, 下胸围, 尺码, 身高, 腰围, 3 类概率)；同一组身体数据下全部尺码在内存中相邻
+    return (len(spec['categories']), len(spec['cups']), len(axis_points(spec['bra'])), spec['sizes'],
+            len(axis_points(spec['height'])), len(axis_points(spec['waist'])), 3)
+
+
+def mask_shape(spec):
+    # 每个插值单元一个标记：连续轴比网格点少 1
+    c, u, b, s, h, w, _ = table_shape(spec)
+    return c, u, b - 1, s, h - 1, w - 1
+
+
+def save_lookup_table(table, mask, spec, model_path):
+    table_path, mask_path, meta_path = lookup_paths(model_path)
+    # 数组先落盘，描述文件最后原子替换，读到描述即说明数组已完整
+    for path, array in ((table_path, table), (mask_path, mask)):
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, array)
+        os.replace(path + '.tmp', path)
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(spec, f, ensure_ascii=False)
+    os.replace(meta_path + '.tmp', meta_path)
+    return table_path, meta_path
+
+
+def _cell(value, axis, n):
+    # 单个值的左侧网格下标与插值权重，超出网格返回 None
+    start, _, step = axis
+    pos = (value - start) / step
+    if pos < -1e-9 or pos > n - 1 + 1e-9:
+        return None
+    index = min(max(int(pos), 0), n - 2)
+    return index, min(max(pos - index, 0.0), 1.0)
+
+
+def _locate(values, axis, n):
+    # 返回左侧网格下标与插值权重；超出网格的位置标记为 False
+    start, _, step = axis
+    pos = (values - start) / step
+    inside = (pos >= -1e-9) & (pos <= n - 1 + 1e-9)
+    index = np.clip(np.floor(pos).astype(np.int64), 0, n - 2)
+    frac = np.clip(pos - index, 0.0, 1.0)
+    return index, frac, inside
+
+
+class LookupTable:
+    """内存映射的预计算概率表，网格内的输入以插值代替模型推理，网格外的输入交由模型回退。"""
+
+    def __init__(self, table, mask, spec):
+        # 去掉 np.memmap 子类包装（切片开销更小），底层仍是同一块内存映射
+        self.table = np.asarray(table)
+        self.mask = np.asarray(mask)
+        self.spec = spec
+        self.category_index = {c: i for i, c in enumerate(spec['categories'])}
+        self.cup_index = {c: i for i, c in enumerate(spec['cups'])}
+        self.bra_n, self.height_n, self.waist_n = table.shape[2], table.shape[4], table.shape[5]
+        self.hits = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def load(cls, model_path):
+        table_path, mask_path, meta_path = lookup_paths(model_path)
+        with open(meta_path, encoding='utf-8') as f:
+            spec = json.load(f)
+        if spec.get('format_version') != LUT_FORMAT_VERSION:
+            raise ValueError(f"不支持的查表格式版本: {spec.get('format_version')}")
+        table = np.load(table_path, mmap_mode='r')
+        mask = np.load(mask_path, mmap_mode='r')
+        if table.shape != table_shape(spec) or mask.shape != mask_shape(spec):
+            raise ValueError(f'查表维度与描述不一致: {table.shape}')
+        return cls(table, mask, spec)
+
+    @property
+    def max_error(self):
+        return self.spec.get('error', {}).get('max_abs_error')
+
+    def interpolate(self, cat_idx, cup_idx, bra, size_idx, height, waist):
+        """向量化查表：离散轴直接取下标，下胸围/身高/腰围三线性插值；返回 (概率, 是否可用查表结果)。"""
+        b, fb, in_b = _locate(bra, self.spec['bra'], self.bra_n)
+        h, fh, in_h = _locate(height, self.spec['height'], self.height_n)
+        w, fw, in_w = _locate(waist, self.spec['waist'], self.waist_n)
+
+        probs = np.zeros((len(cat_idx), 3))
+        for db, wb in ((0, 1.0 - fb), (1, fb)):
+            for dh, wh in ((0, 1.0 - fh), (1, fh)):
+                for dw, ww in ((0, 1.0 - fw), (1, fw)):
+                    corner = self.table[cat_idx, cup_idx, b + db, size_idx, h + dh, w + dw]
+                    probs += (wb * wh * ww)[:, None] * corner
+        # 模型在单元内有明显跳变（树模型分裂点）时插值不可靠，由模型回退
+        smooth = self.mask[cat_idx, cup_idx, b, size_idx, h, w] if self.mask is not None else True
+        return probs, in_b & in_h & in_w & smooth
+
+    def _corners(self, row):
+        # 单行输入所在的网格单元：返回 (品类, 罩杯, 下胸围/身高/腰围的下标与权重)，不在网格内返回 None
+        cat = self.category_index.get(row['category'])
+        cup = self.cup_index.get(row['cup_size'])
+        if cat is None or cup is None:
+            return None
+        if abs(row['hips'] - row['waist'] * self.spec['hips_ratio']) > 1e-6:
+            return None
+        cells = (_cell(float(row['bra_num']), self.spec['bra'], self.bra_n),
+                 _cell(float(row['height_cm']), self.spec['height'], self.height_n),
+                 _cell(float(row['waist']), self.spec['waist'], self.waist_n))
+        if None in cells:
+            return None
+        (fb, fh, fw) = (cell[1] for cell in cells)
+        # 8 个角点的权重，顺序与 table[..., b:b+2, s, h:h+2, w:w+2] 展平后一致
+        weights = np.array([wb * wh * ww for wb in (1.0 - fb, fb) for wh in (1.0 - fh, fh) for ww in (1.0 - fw, fw)])
+        return cat, cup, cells[0][0], cells[1][0], cells[2][0], weights
+
+    def lookup(self, rows):
+        """返回 (概率数组, 未命中行下标列表)；未命中的行对应概率为 0，需由调用方用模型补齐。"""
+        probs = np.zeros((len(rows), 3))
+        missing = []
+        for i, row in enumerate(rows):
+            size = float(row['size'])
+            corners = self._corners(row) if size.is_integer() and 0 <= size < self.spec['sizes'] else None
+            if corners is None:
+                missing.append(i)
+                continue
+            cat, cup, b, h, w, weights = corners
+            if not self.mask[cat, cup, b, int(size), h, w]:
+                missing.append(i)
+                continue
+            # 一次切片取出 8 个角点 (2, 2, 2, 3)，按权重加权求和
+            probs[i] = weights @ self.table[cat, cup, b:b + 2, int(size), h:h + 2, w:w + 2].reshape(8, 3)
+
+        self.hits += len(rows) - len(missing)
+        self.fallbacks += len(missing)
+        return probs, missing
+
+    def size_curve(self, row):
+        """同一组身体数据下 0~26 全部尺码的概率 (27, 3) 及各尺码能否查表 (27,)；不在网格内时返回 None。"""
+        corners = self._corners(row)
+        if corners is None:
+            return None
+        cat, cup, b, h, w, weights = corners
+        # 全部尺码在数组中相邻，一次切片得到 (2, 27, 2, 2, 3)
+        block = self.table[cat, cup, b:b + 2, :, h:h + 2, w:w + 2]
+        values = np.einsum('bhw,bshwk->sk', weights.reshape(2, 2, 2), block)
+        return values, np.asarray(self.mask[cat, cup, b, :, h, w])
+
+    def info(self):
+        return {
+            'shape': list(self.table.shape),
+            'error': self.spec.get('error'),
+            'hits': self.hits,
+            'fallbacks': self.fallbacks
+        }
+
+
+def load_lookup_table(model_path, max_error=None):
+    """加载模型旁的查表；不存在或实测误差超过 max_error 时返回 None。"""
+    if not os.path.exists(lookup_paths(model_path)[2]):
+        return None
+    table = LookupTable.load(model_path)
+    if max_error is not None and (table.max_error is None or table.max_error > max_error):
+        print(f'[lookup_table] 查表实测最大误差 {table.max_error} 超过上限 {max_error}，改用模型推理')
+        return None
+    return table
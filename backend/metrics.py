@@ -0,0 +1,407 @@
+import bisect
+import contextlib
+import hmac
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+
+from flask import Response, current_app, g, has_request_context, jsonify, request
+from flask_jwt_extended import verify_jwt_in_request
+from flask_jwt_extended.config import config as jwt_config
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from identity import token_is_admin
+
+# 延迟直方图分桶（秒）
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# 每请求 SQL 语句数分桶
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """进程内计数器 / 直方图，按 Prometheus 文本格式导出。
+
+    多进程部署时每个 worker 各自统计，由 Prometheus 分别抓取后聚合。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            self._counters[(name, labels)] += value
+
+    def observe(self, name, value, labels=(), buckets=LATENCY_BUCKETS):
+        with self._lock:
+            hist = self._histograms.get((name, labels))
+            if hist is None:
+                hist = self._histograms[(name, labels)] = Histogram(buckets)
+            hist.observe(value)
+
+    def add_collector(self, callback):
+        """注册抓取时调用的 callback()，返回 [(指标名, labels, 值)]，用于导出各组件已有的统计。"""
+        self._collectors.append(callback)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.buckets), list(h.counts), h.sum, h.count) for key, h in histograms]
+
+        gauges = []
+        for callback in self._collectors:
+            try:
+                gauges.extend(callback())
+            except Exception:
+                pass
+
+        seen = set()
+
+        def header(name, default_kind):
+            if name in seen:
+                return
+            seen.add(name)
+            kind, text = self._help.get(name, (default_kind, None))
+            if text:
+                lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        for (name, labels), buckets, counts, total, count in histograms:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", _format_value(bound)),))} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+        for name, labels, value in sorted(gauges, key=lambda item: (item[0], item[1])):
+            header(name, 'gauge')
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+registry = MetricsRegistry()
+
+
+class _Span:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _record_span(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def _record_span(name, elapsed):
+    registry.observe('smartfit_span_seconds', elapsed, (('span', name),))
+    if has_request_context():
+        spans = g.setdefault('metrics_spans', {})
+        spans[name] = spans.get(name, 0.0) + elapsed
+
+
+def span(name):
+    """统计代码段耗时：with span('predict_proba'): ...；关闭指标时返回空上下文，几乎无开销。"""
+    if not registry.enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+class SamplingProfiler:
+    """对单个线程做栈采样，结果为 flamegraph 使用的折叠栈格式（frame;frame;... 次数）。"""
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = defaultdict(int)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def collapsed(self):
+        ordered = sorted(self.samples.items(), key=lambda item: -item[1])
+        return '\n'.join(f'{stack} {count}' for stack, count in ordered) + '\n'
+
+
+class ProfileStore:
+    """保留最近若干次请求的采样结果，供管理端按 ID 查看。"""
+
+    def __init__(self, max_profiles=20):
+        self.max_profiles = max_profiles
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, path, profiler):
+        profile_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._profiles[profile_id] = {
+                'path': path,
+                'elapsed_ms': round(profiler.elapsed * 1000, 3),
+                'samples': sum(profiler.samples.values()),
+                'collapsed': profiler.collapsed()
+            }
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self):
+        with self._lock:
+            return [{'id': key, 'path': value['path'], 'elapsed_ms': value['elapsed_ms'], 'samples': value['samples']}
+                    for key, value in reversed(self._profiles.items())]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['metrics_query_start'] = time.perf_counter()
+    if has_request_context():
+        g.metrics_queries = g.get('metrics_queries', 0) + 1
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('metrics_query_start', None)
+    if started is not None:
+        registry.observe('smartfit_db_query_seconds', time.perf_counter() - started)
+    registry.inc('smartfit_db_queries_total')
+
+
+def _instrument_jwt(jwt_manager):
+    # 借助 flask-jwt-extended 的公开回调计时：decode_key_loader 在验签前取密钥，
+    # token_verification_loader 在验签与过期等校验通过后调用，两者之间即 @jwt_required 的验签耗时
+    @jwt_manager.decode_key_loader
+    def decode_key(jwt_header, jwt_data):
+        if has_request_context():
+            g.metrics_jwt_started = time.perf_counter()
+        return jwt_config.decode_key
+
+    @jwt_manager.token_verification_loader
+    def verified(jwt_header, jwt_data):
+        started = g.pop('metrics_jwt_started', None) if has_request_context() else None
+        if started is not None:
+            _record_span('jwt_verify', time.perf_counter() - started)
+        return True
+
+
+def _metrics_authorized():
+    """配置了 METRICS_TOKEN 时凭 Authorization: Bearer <METRICS_TOKEN> 抓取，否则只对管理员令牌开放。"""
+    token = current_app.config['METRICS_TOKEN']
+    if token and hmac.compare_digest(request.headers.get('Authorization', '').encode('utf-8'),
+                                     f'Bearer {token}'.encode('utf-8')):
+        return True
+    try:
+        verify_jwt_in_request()
+    except Exception:
+        return False
+    return token_is_admin()
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    interval = current_app.config['PROFILE_INTERVAL_MS'] / 1000.0
+    if current_app.config['PROFILING_ENABLED'] and request.headers.get('X-Profile') == '1':
+        g.metrics_profiler = SamplingProfiler(threading.get_ident(), interval).start()
+
+
+def _after_request(response):
+    profiler = g.pop('metrics_profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        response.headers['X-Profile-Id'] = current_app.extensions['profiles'].add(request.path, profiler)
+
+    started = g.get('metrics_started')
+    if started is None or not registry.enabled:
+        return response
+
+    elapsed = time.perf_counter() - started
+    endpoint = request.endpoint or 'unmatched'
+    registry.observe('smartfit_http_request_seconds', elapsed, (('endpoint', endpoint), ('method', request.method)))
+    registry.inc('smartfit_http_requests_total',
+                 (('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))))
+    registry.observe('smartfit_db_queries_per_request', g.get('metrics_queries', 0), (('endpoint', endpoint),),
+                     buckets=QUERY_COUNT_BUCKETS)
+
+    # 各阶段耗时同时写入 Server-Timing 头，浏览器开发者工具可直接查看
+    spans = g.get('metrics_spans')
+    if spans:
+        response.headers['Server-Timing'] = ', '.join(
+            f'{name};dur={value * 1000:.3f}' for name, value in spans.items())
+    return response
+
+
+def component_stats(app):
+    """抓取 /metrics 时顺带导出缓存、写入队列、模型注册表等组件（app.extensions 中）的现有统计。"""
+    ext = app.extensions
+    cache = ext['prediction_cache'].stats()
+    writer = ext['history_writer'].stats()
+    hasher, runner, identities = ext['password_hasher'], ext['job_runner'], ext['identity_cache']
+    optional = []
+    batcher = ext.get('micro_batcher')
+    if batcher is not None:
+        stats = batcher.stats()
+        optional += [
+            ('smartfit_predict_batches', (), stats['batches']),
+            ('smartfit_predict_batch_queue_depth', (), stats['queued'])
+        ]
+    shared = ext.get('shared_prediction_cache')
+    if shared is not None:
+        optional += [
+            ('smartfit_shared_prediction_cache_hits', (), shared.hits),
+            ('smartfit_shared_prediction_cache_misses', (), shared.misses),
+            ('smartfit_shared_store_errors', (), shared.errors)
+        ]
+    compressor = ext.get('compressor')
+    if compressor is not None:
+        optional += [
+            ('smartfit_compressed_responses', (), compressor.compressed),
+            ('smartfit_compression_bytes_in', (), compressor.bytes_in),
+            ('smartfit_compression_bytes_out', (), compressor.bytes_out)
+        ]
+    limiters = ext['rate_limiters']
+    for name, limiter in limiters.items():
+        optional += [
+            ('smartfit_rate_limit_allowed', (('limiter', name),), limiter.allowed),
+            ('smartfit_rate_limit_rejected', (('limiter', name),), limiter.rejected)
+        ]
+    return optional + [
+        ('smartfit_prediction_cache_entries', (), cache['entries']),
+        ('smartfit_prediction_cache_hits', (), cache['hits']),
+        ('smartfit_prediction_cache_misses', (), cache['misses']),
+        ('smartfit_rate_limit_store_errors', (), sum(limiter.errors for limiter in limiters.values())),
+        ('smartfit_history_queue_depth', (), writer['queued']),
+        ('smartfit_history_flushed_rows', (), writer['flushed_rows']),
+        ('smartfit_history_sync_fallbacks', (), writer['sync_fallbacks']),
+        ('smartfit_history_dropped_entries', (), writer['dropped']),
+        ('smartfit_model_reloads', (), ext['model_registry'].reloads),
+        ('smartfit_password_hash_rejected', (), hasher.rejected),
+        ('smartfit_password_hash_pool_failures', (), hasher.pool_failures),
+        ('smartfit_password_verify_cache_hits', (), hasher.cache_hits),
+        ('smartfit_job_chunks', (), runner.chunks),
+        ('smartfit_jobs_failed', (), runner.failed),
+        ('smartfit_identity_cache_hits', (), identities.hits),
+        ('smartfit_identity_cache_misses', (), identities.misses),
+        ('smartfit_revoked_tokens_rejected', (), identities.revoked),
+        ('smartfit_identity_store_errors', (), identities.store_errors)
+    ]
+
+
+def init_metrics(app, jwt_manager=None):
+    """按配置挂载请求计时、SQL 统计、JWT 计时、/metrics 端点与单请求采样分析。
+
+    METRICS_ENABLED=0 时不注册任何钩子，span() 直接返回空上下文。
+    """
+    registry.enabled = app.config['METRICS_ENABLED']
+    app.extensions['metrics'] = registry
+    app.extensions['profiles'] = ProfileStore()
+
+    registry.describe('smartfit_http_request_seconds', 'histogram', '请求处理耗时（秒）')
+    registry.describe('smartfit_http_requests_total', 'counter', '请求数')
+    registry.describe('smartfit_span_seconds', 'histogram', '热路径各阶段耗时（秒）')
+    registry.describe('smartfit_db_query_seconds', 'histogram', '单条 SQL 执行耗时（秒）')
+    registry.describe('smartfit_db_queries_total', 'counter', 'SQL 语句数')
+    registry.describe('smartfit_db_queries_per_request', 'histogram', '每个请求执行的 SQL 语句数')
+    # 各组件在 init_metrics 之后创建，抓取时才从 app.extensions 读取
+    registry.add_collector(lambda: component_stats(app))
+
+    if registry.enabled or app.config['PROFILING_ENABLED']:
+        app.before_request(_before_request)
+        app.after_request(_after_request)
+
+    if not registry.enabled:
+        return registry
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    if jwt_manager is not None:
+        _instrument_jwt(jwt_manager)
+
+    # 指标含各接口耗时、缓存与限流计数及模型版本，不对匿名请求开放
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        if not _metrics_authorized():
+            return jsonify({'msg': '无权访问监控指标'}), 401
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    return registry
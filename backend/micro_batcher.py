@@ -0,0 +1,124 @@
+import queue
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from background import BackgroundThread
+from metrics import registry
+
+# 每批行数分桶
+BATCH_ROWS_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+class _Pending:
+    __slots__ = ('loaded', 'rows', 'future')
+
+    def __init__(self, loaded, rows):
+        self.loaded = loaded
+        self.rows = rows
+        self.future = Future()
+
+
+class MicroBatcher:
+    """跨请求的推理微批调度器。
+
+    请求线程调用 predict(loaded, rows) 入队后等待结果；调度线程从第一条请求到达起最多等待 window 秒
+    或攒满 max_batch 行，按模型版本分组后合并为一次 compute(loaded, rows) 调用，在执行器中运行，
+    再把结果按行切分回各调用方。执行器运行上一批时调度线程继续收集下一批。
+    """
+
+    def __init__(self, compute, window_ms=2.0, max_batch=64, workers=1):
+        self.compute = compute
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._executor = None
+        self._worker = BackgroundThread(self._run, 'predict-batcher', on_start=self._start_executor)
+
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+        self.max_seen = 0
+
+    def _start_executor(self):
+        # 执行器的工作线程同样不会随 fork 进入子进程，随调度线程一起重建
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='predict-batch')
+
+    def submit(self, loaded, rows):
+        self._worker.ensure_started()
+        pending = _Pending(loaded, rows)
+        self._queue.put(pending)
+        return pending.future
+
+    def predict(self, loaded, rows, timeout=None):
+        return self.submit(loaded, rows).result(timeout)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            size = len(first.rows)
+            deadline = time.monotonic() + self.window
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item.rows)
+
+            # 热加载切换期间同一批可能混有新旧两个版本，按版本分别推理
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item.loaded), []).append(item)
+            for items in groups.values():
+                self._executor.submit(self._execute, items)
+
+    def _execute(self, items):
+        rows = [row for item in items for row in item.rows]
+        try:
+            probs = self.compute(items[0].loaded, rows)
+        except Exception as e:
+            traceback.print_exc()
+            for item in items:
+                item.future.set_exception(e)
+            return
+
+        offset = 0
+        for item in items:
+            item.future.set_result(probs[offset:offset + len(item.rows)])
+            offset += len(item.rows)
+
+        self.batches += 1
+        self.requests += len(items)
+        self.rows += len(rows)
+        self.max_seen = max(self.max_seen, len(rows))
+        if registry.enabled:
+            registry.observe('smartfit_predict_batch_rows', len(rows), buckets=BATCH_ROWS_BUCKETS)
+
+    def stats(self):
+        return {
+            'window_ms': self.window * 1000.0,
+            'max_batch': self.max_batch,
+            'batches': self.batches,
+            'requests': self.requests,
+            'rows': self.rows,
+            'avg_batch_rows': round(self.rows / self.batches, 2) if self.batches else 0.0,
+            'max_batch_rows': self.max_seen,
+            'queued': self._queue.qsize()
+        }
+
+
+def init_micro_batcher(app, compute):
+    if not app.config['PREDICT_BATCHING']:
+        return None
+    batcher = MicroBatcher(
+        compute,
+        window_ms=app.config['PREDICT_BATCH_WINDOW_MS'],
+        max_batch=app.config['PREDICT_BATCH_MAX'],
+        workers=app.config['PREDICT_BATCH_WORKERS']
+    )
+    app.extensions['micro_batcher'] = batcher
+    return batcher
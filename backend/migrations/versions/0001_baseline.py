@@ -0,0 +1,90 @@
+"""baseline schema
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+已有的 site.db 由 db.create_all() 建表，没有 alembic_version 记录；
+因此基线迁移对已存在的表和索引跳过创建，老库可直接执行 flask db upgrade。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_index(inspector, table, name):
+    return any(index['name'] == name for index in inspector.get_indexes(table))
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('user'):
+        op.create_table(
+            'user',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=80), nullable=False),
+            sa.Column('password', sa.String(length=200), nullable=False),
+            sa.Column('is_admin', sa.Boolean(), nullable=True),
+            sa.Column('height', sa.Float(), nullable=True),
+            sa.Column('waist', sa.Float(), nullable=True),
+            sa.Column('hips', sa.Float(), nullable=True),
+            sa.Column('bra_size', sa.Float(), nullable=True),
+            sa.Column('cup_size', sa.String(length=5), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('username')
+        )
+
+    if not inspector.has_table('history'):
+        op.create_table(
+            'history',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('category', sa.String(length=50), nullable=False),
+            sa.Column('size_input', sa.Float(), nullable=False),
+            sa.Column('image_url', sa.String(length=200), nullable=True),
+            sa.Column('result', sa.String(length=20), nullable=False),
+            sa.Column('confidence', sa.Float(), nullable=True),
+            sa.Column('timestamp', sa.DateTime(), nullable=True),
+            sa.Column('height', sa.Float(), nullable=True),
+            sa.Column('waist', sa.Float(), nullable=True),
+            sa.Column('hips', sa.Float(), nullable=True),
+            sa.Column('bra_size', sa.Float(), nullable=True),
+            sa.Column('cup_size', sa.String(length=5), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if not _has_index(inspector, 'history', 'ix_history_user_id'):
+        op.create_index('ix_history_user_id', 'history', ['user_id'], unique=False)
+    if not _has_index(inspector, 'history', 'ix_history_timestamp'):
+        op.create_index('ix_history_timestamp', 'history', ['timestamp'], unique=False)
+
+    if not inspector.has_table('feedback'):
+        op.create_table(
+            'feedback',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('history_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('fit_feedback', sa.String(length=20), nullable=False),
+            sa.Column('note', sa.String(length=255), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['history_id'], ['history.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+    for column in ('history_id', 'user_id', 'created_at'):
+        name = f'ix_feedback_{column}'
+        if not _has_index(inspector, 'feedback', name):
+            op.create_index(name, 'feedback', [column], unique=False)
+
+
+def downgrade():
+    op.drop_table('feedback')
+    op.drop_table('history')
+    op.drop_table('user')
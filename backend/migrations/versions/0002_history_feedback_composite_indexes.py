@@ -0,0 +1,29 @@
+"""composite indexes for history paging and latest feedback lookup
+
+Revision ID: 0002_history_feedback_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-17 00:00:01
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_history_feedback_indexes'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'ix_history_user_id_timestamp' not in {i['name'] for i in inspector.get_indexes('history')}:
+        op.create_index('ix_history_user_id_timestamp', 'history', ['user_id', 'timestamp'], unique=False)
+    if 'ix_feedback_history_id_created_at' not in {i['name'] for i in inspector.get_indexes('feedback')}:
+        op.create_index('ix_feedback_history_id_created_at', 'feedback', ['history_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_feedback_history_id_created_at', table_name='feedback')
+    op.drop_index('ix_history_user_id_timestamp', table_name='history')
@@ -0,0 +1,71 @@
+"""admin dashboard rollup tables
+
+Revision ID: 0003_admin_rollup_tables
+Revises: 0002_history_feedback_indexes
+Create Date: 2026-10-17 00:00:02
+
+建表后立即从 history 全量回填，之后由写入/删除路径增量维护；
+数据校正可执行 flask rebuild-rollups。
+python app.py 曾用 db.create_all() 建表，老库上这些表可能已存在但为空（或只有建表之后的增量），
+因此已存在的表跳过创建，回填前先清空，保证与 history 一致。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_admin_rollup_tables'
+down_revision = '0002_history_feedback_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('result_stat'):
+        op.create_table(
+            'result_stat',
+            sa.Column('result', sa.String(length=20), nullable=False),
+            sa.Column('total', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('result')
+        )
+    if not inspector.has_table('user_history_stat'):
+        op.create_table(
+            'user_history_stat',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('history_count', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('user_id')
+        )
+    if not inspector.has_table('category_daily_stat'):
+        op.create_table(
+            'category_daily_stat',
+            sa.Column('category', sa.String(length=50), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('total', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('category', 'day')
+        )
+
+    for table in ('result_stat', 'user_history_stat', 'category_daily_stat'):
+        op.execute(f'DELETE FROM {table}')
+    op.execute(
+        'INSERT INTO result_stat (result, total) '
+        'SELECT result, COUNT(id) FROM history GROUP BY result'
+    )
+    op.execute(
+        'INSERT INTO user_history_stat (user_id, history_count) '
+        'SELECT "user".id, COUNT(history.id) FROM "user" '
+        'LEFT OUTER JOIN history ON history.user_id = "user".id GROUP BY "user".id'
+    )
+    op.execute(
+        'INSERT INTO category_daily_stat (category, day, total) '
+        'SELECT category, DATE(timestamp), COUNT(id) FROM history '
+        'WHERE timestamp IS NOT NULL GROUP BY category, DATE(timestamp)'
+    )
+
+
+def downgrade():
+    op.drop_table('category_daily_stat')
+    op.drop_table('user_history_stat')
+    op.drop_table('result_stat')
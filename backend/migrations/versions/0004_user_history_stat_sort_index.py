@@ -0,0 +1,39 @@
+"""index for sorting admin user listing by history count
+
+Revision ID: 0004_user_history_stat_sort_index
+Revises: 0003_admin_rollup_tables
+Create Date: 2026-10-18 00:00:00
+
+管理后台按预测记录数排序的 keyset 分页走 (history_count, user_id) 索引；
+同时为还没有汇总行的用户按 history 补齐汇总行，排序查询无需再外连接 user 表；
+之后新用户的汇总行由 User 的 after_insert 事件写入。索引已存在（如由 db.create_all() 建出）时跳过。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_user_history_stat_sort_index'
+down_revision = '0003_admin_rollup_tables'
+branch_labels = None
+depends_on = None
+
+
+def _has_index(inspector, table, name):
+    return any(index['name'] == name for index in inspector.get_indexes(table))
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not _has_index(inspector, 'user_history_stat', 'ix_user_history_stat_count_user'):
+        op.create_index('ix_user_history_stat_count_user', 'user_history_stat', ['history_count', 'user_id'],
+                        unique=False)
+    op.execute(
+        'INSERT INTO user_history_stat (user_id, history_count) '
+        'SELECT "user".id, (SELECT COUNT(history.id) FROM history WHERE history.user_id = "user".id) FROM "user" '
+        'WHERE NOT EXISTS (SELECT 1 FROM user_history_stat WHERE user_history_stat.user_id = "user".id)'
+    )
+
+
+def downgrade():
+    op.drop_index('ix_user_history_stat_count_user', table_name='user_history_stat')
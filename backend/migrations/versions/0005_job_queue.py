@@ -0,0 +1,49 @@
+"""background job queue table
+
+Revision ID: 0005_job_queue
+Revises: 0004_user_history_stat_sort_index
+Create Date: 2026-10-18 00:00:01
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_job_queue'
+down_revision = '0004_user_history_stat_sort_index'
+branch_labels = None
+depends_on = None
+
+
+def _has_index(inspector, table, name):
+    return any(index['name'] == name for index in inspector.get_indexes(table))
+
+
+def upgrade():
+    # db.create_all() 建过表的老库上跳过已存在的表与索引
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('job'):
+        op.create_table(
+            'job',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('kind', sa.String(length=30), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('params', sa.Text(), nullable=False),
+            sa.Column('total', sa.Integer(), nullable=False),
+            sa.Column('processed', sa.Integer(), nullable=False),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('created_by', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if not _has_index(sa.inspect(op.get_bind()), 'job', 'ix_job_status_id'):
+        op.create_index('ix_job_status_id', 'job', ['status', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_job_status_id', table_name='job')
+    op.drop_table('job')
@@ -0,0 +1,30 @@
+"""user token version for JWT revocation
+
+Revision ID: 0006_user_token_version
+Revises: 0005_job_queue
+Create Date: 2026-10-18 00:00:02
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_user_token_version'
+down_revision = '0005_job_queue'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() 建过表的库上 user 表可能已有该列
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('user')}
+    if 'token_version' in columns:
+        return
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('token_version')
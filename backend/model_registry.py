@@ -0,0 +1,315 @@
+import json
+import os
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from background import BackgroundThread
+from fast_predictor import FastPredictor, check_parity, load_native, native_paths, sample_rows
+from lookup_table import load_lookup_table, lookup_paths
+from metrics import span
+
+# 模型输入特征顺序，需与 train_model.py 保持一致
+FEATURE_COLUMNS = ['cup_size', 'bra_num', 'hips', 'waist', 'category', 'size', 'height_cm', 'bmi_proxy']
+
+# 版本化目录：<模型目录>/CURRENT 写着当前版本名，模型位于 <模型目录>/versions/<版本名>/fit_model.pkl
+CURRENT_POINTER = 'CURRENT'
+VERSIONS_DIR = 'versions'
+
+
+def student_paths(model_path):
+    """fit_model.pkl -> (fit_model.student.pkl, fit_model.student.json)；原生格式文件名由 native_paths 推出。"""
+    stem = os.path.splitext(model_path)[0]
+    return stem + '.student.pkl', stem + '.student.json'
+
+
+def single_row_latency_ms(loaded, rows, repeats=50):
+    # 加载时实测单行推理耗时（中位数），用于在 teacher / student 之间按延迟预算选择
+    times = []
+    for i in range(repeats):
+        started = time.perf_counter()
+        loaded.predict_model([rows[i % len(rows)]])
+        times.append(time.perf_counter() - started)
+    times.sort()
+    return times[len(times) // 2] * 1000.0
+
+
+class LoadedModel:
+    """一个已加载、已预热的模型版本；加载完成后只读，可被多个请求线程共享。"""
+
+    def __init__(self, pipeline, version, path, fast=None, model_format='pickle', lookup=None):
+        self.pipeline = pipeline
+        self.version = version
+        self.path = path
+        self.fast = fast
+        self.format = model_format
+        self.lookup = lookup
+        # 按延迟预算选用蒸馏小模型时，模型推理改走 student；serving 记录选择依据
+        self.student = None
+        self.serving = None
+        self.loaded_at = datetime.utcnow()
+
+    def predict_proba(self, rows):
+        if self.lookup is None:
+            return self.predict_model(rows)
+
+        # 网格内的输入直接查表插值，网格外的输入由模型补齐
+        with span('lookup_table'):
+            probs, missing = self.lookup.lookup(rows)
+        if missing:
+            probs[missing] = self.predict_model([rows[i] for i in missing])
+        return probs
+
+    def predict_model(self, rows):
+        if self.student is not None:
+            return self.student.predict_model(rows)
+        if self.fast is not None:
+            with span('model_inference'):
+                return self.fast.predict_proba(rows)
+
+        # 参考通道：多行特征合并为一个 DataFrame，只调用一次 predict_proba
+        import pandas as pd
+
+        with span('dataframe_build'):
+            input_df = pd.DataFrame(rows, columns=FEATURE_COLUMNS)
+        with span('model_inference'):
+            return self.pipeline.predict_proba(input_df)
+
+
+class ModelRegistry:
+    """模型注册表：后台线程监视模型文件/版本目录，新模型加载并预热后原子替换。
+
+    请求在开始时读取一次 current，整个请求都使用同一个版本，替换不会影响进行中的请求。
+    首次访问 current 时才加载模型，多进程部署下每个 worker 在 fork 之后各自加载。
+    model_format: auto 优先加载原生格式（UBJ booster + spec JSON），不存在时回退到 pickle；
+    native / pickle 则强制使用对应格式。
+    lookup_table: 模型旁存在预计算查表且实测最大误差不超过 lookup_max_error 时，网格内输入改为查表。
+    latency_budget_ms: 模型旁存在蒸馏小模型时，加载后实测两者的单行推理耗时，
+    大模型超出预算而小模型满足时改用小模型（都超出时选更快的一个）。
+    """
+
+    def __init__(self, model_path, poll_interval=2.0, fast_inference=True, model_format='auto', nthread=None,
+                 lookup_table=False, lookup_max_error=None, latency_budget_ms=None):
+        self.model_path = model_path
+        self.model_dir = os.path.dirname(model_path) or '.'
+        self.poll_interval = poll_interval
+        self.fast_inference = fast_inference
+        self.model_format = model_format
+        self.nthread = nthread
+        self.lookup_table = lookup_table
+        self.lookup_max_error = lookup_max_error
+        self.latency_budget_ms = latency_budget_ms
+
+        self._current = None
+        self._loaded_stamp = None
+        self._failed_stamp = None
+        self._listeners = []
+        self._reload_event = threading.Event()
+        self._load_lock = threading.Lock()
+        self._watcher = BackgroundThread(self._watch, 'model-watcher')
+
+        self.last_error = None
+        self.last_check = None
+        self.reloads = 0
+
+    @property
+    def current(self):
+        if self._current is None:
+            self.check_for_update()
+        self._ensure_watching()
+        return self._current
+
+    def add_listener(self, callback):
+        """注册模型切换回调 callback(new_model)。"""
+        self._listeners.append(callback)
+
+    def _resolve_source(self):
+        # 优先使用版本化目录，否则回退到单一模型文件；返回 (路径, 版本号, 文件戳)
+        pointer = os.path.join(self.model_dir, CURRENT_POINTER)
+        if os.path.exists(pointer):
+            with open(pointer, encoding='utf-8') as f:
+                version = f.read().strip()
+            path = os.path.join(self.model_dir, VERSIONS_DIR, version, os.path.basename(self.model_path))
+        else:
+            path = self.model_path
+            version = None
+
+        # 只有原生格式文件时以 spec 文件为准（spec 总是最后写入）
+        stamp_path = path if os.path.exists(path) else native_paths(path)[1]
+        try:
+            st = os.stat(stamp_path)
+        except OSError:
+            return None
+        if version is None:
+            version = f"{os.path.basename(path)}@{datetime.fromtimestamp(st.st_mtime).strftime('%Y%m%d%H%M%S')}"
+        stamp = (stamp_path, st.st_mtime_ns, st.st_size)
+        if self.lookup_table:
+            # 查表是事后单独生成的，其描述文件变化同样触发重新加载
+            try:
+                stamp += (os.stat(lookup_paths(path)[2]).st_mtime_ns,)
+            except OSError:
+                pass
+        if self.latency_budget_ms:
+            try:
+                stamp += (os.stat(student_paths(path)[1]).st_mtime_ns,)
+            except OSError:
+                pass
+        return path, version, stamp
+
+    def _use_native(self, path):
+        if self.model_format == 'pickle':
+            return False
+        if self.model_format == 'native':
+            return True
+        return all(os.path.exists(p) for p in native_paths(path))
+
+    def _load_model(self, path, version):
+        if self._use_native(path):
+            # 原生格式在导出时已与 Pipeline 做过一致性校验，加载时无需 sklearn/pandas
+            return LoadedModel(None, version, path, fast=load_native(path, nthread=self.nthread),
+                               model_format='native')
+        return self._load_pickle(path, version)
+
+    def _load(self, path, version):
+        loaded = self._load_model(path, version)
+
+        if self.lookup_table:
+            loaded.lookup = load_lookup_table(path, self.lookup_max_error)
+
+        # 预热：用合成样本跑一次推理，避免切换后第一个请求承担冷启动开销
+        probs = loaded.predict_proba(sample_rows(1))
+        if probs.shape != (1, 3):
+            raise ValueError(f'模型输出维度异常: {probs.shape}')
+
+        student_path, report_path = student_paths(path)
+        if self.latency_budget_ms and os.path.exists(report_path):
+            self._choose_variant(loaded, student_path, report_path, version)
+        return loaded
+
+    def _choose_variant(self, loaded, student_path, report_path, version):
+        student = self._load_model(student_path, version)
+        rows = sample_rows(64)
+        for row in rows[:10]:
+            student.predict_model([row])
+        teacher_ms = single_row_latency_ms(loaded, rows)
+        student_ms = single_row_latency_ms(student, rows)
+        use_student = teacher_ms > self.latency_budget_ms and (student_ms <= self.latency_budget_ms
+                                                              or student_ms < teacher_ms)
+        with open(report_path, encoding='utf-8') as f:
+            report = json.load(f)
+        loaded.serving = {
+            'variant': 'student' if use_student else 'teacher',
+            'budget_ms': self.latency_budget_ms,
+            'teacher_ms': round(teacher_ms, 3),
+            'student_ms': round(student_ms, 3),
+            'agreement': report.get('agreement'),
+            'accuracy_delta': report.get('accuracy_delta')
+        }
+        if use_student:
+            loaded.student = student
+
+    def _load_pickle(self, path, version):
+        import joblib
+
+        pipeline = joblib.load(path)
+
+        fast = None
+        if self.fast_inference:
+            # 推理快速通道：编译特征编码器，并与 Pipeline 参考通道做一致性校验
+            try:
+                fast = FastPredictor.from_pipeline(pipeline)
+                max_diff, parity_ok = check_parity(pipeline, fast, sample_rows())
+                if not parity_ok:
+                    print(f'[model_registry] {version} 快速通道与 Pipeline 输出不一致 '
+                          f'(max_abs_diff={max_diff:.3e})，回退到参考通道')
+                    fast = None
+            except Exception:
+                traceback.print_exc()
+                fast = None
+
+        return LoadedModel(pipeline, version, path, fast=fast)
+
+    def check_for_update(self):
+        """检查模型源是否变化，变化则加载新版本并替换；返回是否发生了切换。"""
+        with self._load_lock:
+            self.last_check = datetime.utcnow()
+            source = self._resolve_source()
+            if source is None:
+                return False
+            path, version, stamp = source
+            if stamp == self._loaded_stamp or stamp == self._failed_stamp:
+                return False
+
+            try:
+                loaded = self._load(path, version)
+            except Exception as e:
+                # 加载失败（例如文件写到一半）时保留旧模型，文件再次变化后重试
+                self._failed_stamp = stamp
+                self.last_error = f'{version}: {e}'
+                traceback.print_exc()
+                return False
+
+            self._current = loaded
+            self._loaded_stamp = stamp
+            self._failed_stamp = None
+            self.last_error = None
+            self.reloads += 1
+
+        for callback in self._listeners:
+            try:
+                callback(loaded)
+            except Exception:
+                traceback.print_exc()
+        return True
+
+    def request_reload(self):
+        """唤醒后台线程立即检查一次模型源（不阻塞调用方）。"""
+        self._ensure_watching()
+        self._reload_event.set()
+
+    def _ensure_watching(self):
+        if self.poll_interval > 0:
+            self._watcher.ensure_started()
+
+    def _watch(self):
+        while True:
+            self._reload_event.wait(self.poll_interval)
+            self._reload_event.clear()
+            try:
+                self.check_for_update()
+            except Exception:
+                traceback.print_exc()
+
+    def info(self):
+        loaded = self._current
+        return {
+            'version': loaded.version if loaded else None,
+            'path': loaded.path if loaded else None,
+            'format': loaded.format if loaded else None,
+            'loaded_at': loaded.loaded_at.isoformat() if loaded else None,
+            'fast_path': bool(loaded and loaded.fast is not None),
+            'lookup_table': loaded.lookup.info() if loaded and loaded.lookup is not None else None,
+            'serving': loaded.serving if loaded else None,
+            'reloads': self.reloads,
+            'poll_interval_seconds': self.poll_interval,
+            'last_check': self.last_check.isoformat() if self.last_check else None,
+            'last_error': self.last_error
+        }
+
+
+def init_model_registry(app):
+    registry = ModelRegistry(
+        app.config['MODEL_PATH'],
+        poll_interval=app.config['MODEL_POLL_INTERVAL'],
+        fast_inference=app.config['FAST_INFERENCE'],
+        model_format=app.config['MODEL_FORMAT'],
+        nthread=app.config['INFERENCE_THREADS'] or None,
+        lookup_table=app.config['LOOKUP_TABLE'],
+        lookup_max_error=app.config['LOOKUP_TABLE_MAX_ERROR'],
+        latency_budget_ms=app.config['INFERENCE_LATENCY_BUDGET_MS'] or None
+    )
+    if app.config['MODEL_PRELOAD']:
+        registry.check_for_update()
+    app.extensions['model_registry'] = registry
+    return registry
@@ -0,0 +1,51 @@
+import base64
+import json
+from datetime import datetime
+
+
+def encode_cursor(timestamp, row_id):
+    """把 (timestamp, id) 编码为不透明的游标字符串。"""
+    raw = f'{timestamp.isoformat()}|{row_id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，格式非法时抛出 ValueError。"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        timestamp, row_id = raw.split('|', 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError('分页游标非法')
+
+
+def encode_keyset(*values):
+    """把任意排序键（数字/字符串）编码为不透明的游标字符串。"""
+    raw = json.dumps(list(values), ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_keyset(cursor, n):
+    """解析 encode_keyset 生成的游标，键的个数不是 n 或格式非法时抛出 ValueError。"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError('分页游标非法')
+    if not isinstance(values, list) or len(values) != n:
+        raise ValueError('分页游标非法')
+    return tuple(values)
+
+
+def prefix_upper_bound(prefix):
+    """前缀搜索的右开边界：col >= prefix AND col < 上界 可以走普通 B 树索引（LIKE 'x%' 在 SQLite 下走不了）。"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def parse_limit(raw_limit, default=50, maximum=200):
+    try:
+        limit = int(raw_limit) if raw_limit is not None else default
+    except (TypeError, ValueError):
+        raise ValueError('limit 参数非法')
+    return max(1, min(limit, maximum))
@@ -0,0 +1,173 @@
+import atexit
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
+
+from hash_worker import check_password, hash_password, init_worker
+
+
+class HasherBusy(Exception):
+    """等待哈希的请求已达上限，调用方应返回 503。"""
+
+
+def normalize_method(method):
+    """把 'scrypt' / 'pbkdf2:sha256' 等简写补全为 werkzeug 写入哈希串的完整参数，用于判断是否需要重新哈希。"""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = (list(map(int, args)) + [2 ** 15, 8, 1][len(args):])[:3]
+        return f'scrypt:{n}:{r}:{p}'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    raise ValueError(f'不支持的密码哈希算法: {method}')
+
+
+def worker_context():
+    """哈希进程的启动方式：forkserver 服务进程只预加载 hash_worker，哈希进程由它 fork 而来；
+    不支持 forkserver 的平台（Windows）退回 spawn。两种方式都不继承 app 进程的线程与连接。"""
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['hash_worker'])
+    return context
+
+
+class PasswordHasher:
+    """在独立进程池中计算密码哈希，避免 scrypt/pbkdf2 占满请求线程。
+
+    - 进程池有界：同时等待的哈希任务超过 max_pending 时抛出 HasherBusy；
+    - 校验结果按 (用户名, 存储哈希, 密码) 的 HMAC 摘要缓存 cache_ttl 秒，吸收客户端重试，
+      密钥为进程内随机值，缓存中不保存明文密码；
+    - workers=0 时退化为在请求线程内同步计算；进程池无法启动或异常中断时（如导入 app 的脚本没有
+      if __name__ == '__main__' 保护，子进程重新执行脚本失败）同样退回同步计算，并只打印一次原因。
+    """
+
+    def __init__(self, method='scrypt', workers=2, max_pending=32, wait_timeout=2.0, cache_ttl=5.0,
+                 cache_size=10000, nice=5):
+        self.method = method
+        self.target = normalize_method(method)
+        self.workers = workers
+        self.wait_timeout = wait_timeout
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.nice = nice
+
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pid = None
+        self._pool_lock = threading.Lock()
+        self._inline = False
+        self._secret = os.urandom(32)
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
+        self.cache_hits = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.pool_failures = 0
+
+    def _executor(self):
+        # 惰性创建；fork 之后子进程重新创建自己的进程池
+        if self._pool is not None and self._pid == os.getpid():
+            return self._pool
+        with self._pool_lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context(),
+                                                 initializer=init_worker, initargs=(self.nice,))
+                self._pid = os.getpid()
+        return self._pool
+
+    def _fall_back(self, error):
+        with self._pool_lock:
+            self.pool_failures += 1
+            if self._inline:
+                return
+            self._inline = True
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        print(f'[password_hashing] 哈希进程池不可用（{type(error).__name__}: {error}），改为在请求线程内同步计算；'
+              f"开启进程池时导入 app 的脚本需放在 if __name__ == '__main__' 之下")
+
+    def _run(self, fn, *args):
+        if self.workers <= 0 or self._inline:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            self.rejected += 1
+            raise HasherBusy()
+        try:
+            try:
+                future = self._executor().submit(fn, *args)
+            except (BrokenProcessPool, OSError, RuntimeError) as e:
+                self._fall_back(e)
+                return fn(*args)
+            try:
+                return future.result()
+            except BrokenProcessPool as e:
+                self._fall_back(e)
+                return fn(*args)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.method)
+
+    def verify(self, username, stored_hash, password):
+        key = hmac.new(self._secret, '\0'.join((username, stored_hash, password)).encode('utf-8'),
+                       hashlib.sha256).digest()
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                self.cache_hits += 1
+                return entry[1]
+
+        ok = self._run(check_password, stored_hash, password)
+
+        if self.cache_ttl > 0:
+            with self._cache_lock:
+                if len(self._cache) >= self.cache_size:
+                    self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+                    if len(self._cache) >= self.cache_size:
+                        self._cache.clear()
+                self._cache[key] = (now + self.cache_ttl, ok)
+        return ok
+
+    def needs_rehash(self, stored_hash):
+        """存储的哈希参数与当前配置不一致（算法或工作因子变化）时返回 True。"""
+        return stored_hash.split('$', 1)[0] != self.target
+
+    def shutdown(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            'method': self.target,
+            'workers': 0 if self._inline else self.workers,
+            'pool_failures': self.pool_failures,
+            'cache_entries': len(self._cache),
+            'cache_hits': self.cache_hits,
+            'rejected': self.rejected,
+            'rehashed': self.rehashed
+        }
+
+
+def init_password_hasher(app):
+    hasher = PasswordHasher(
+        method=app.config['PASSWORD_HASH_METHOD'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+        cache_ttl=app.config['PASSWORD_VERIFY_CACHE_TTL']
+    )
+    app.extensions['password_hasher'] = hasher
+    atexit.register(hasher.shutdown)
+    return hasher
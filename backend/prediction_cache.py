@@ -0,0 +1,219 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from shared_store import StoreError
+
+# 参与量化的连续型身体数据
+QUANTIZED_FIELDS = ('height_cm', 'waist', 'hips', 'bra_num')
+
+
+def quantize_value(value, resolution):
+    value = float(value)
+    if resolution <= 0:
+        return value
+    return round(round(value / resolution) * resolution, 6)
+
+
+def quantize_row(row, resolution):
+    """返回量化后的特征行；bmi_proxy 由量化后的腰围/身高重新计算，保证同键同输入。"""
+    quantized = dict(row)
+    for field in QUANTIZED_FIELDS:
+        quantized[field] = quantize_value(row[field], resolution)
+    height = quantized['height_cm']
+    quantized['bmi_proxy'] = quantized['waist'] / height if height > 0 else 0
+    return quantized
+
+
+def make_key(row):
+    return (row['height_cm'], row['waist'], row['hips'], row['bra_num'],
+            row['cup_size'], row['category'], float(row['size']))
+
+
+class PredictionCache:
+    """进程内 LRU + TTL 预测缓存。
+
+    缓存键为按 resolution 量化后的 (身高, 腰围, 臀围, 下胸围, 罩杯, 品类, 尺码)，
+    调用方传入的模型版本变化时（模型文件更新并热加载后）整体失效。
+    量化只用于生成键：未命中时按请求的原始数据推理，命中时返回的是 resolution 以内相近输入的结果。
+    """
+
+    def __init__(self, max_entries=4096, ttl=300.0, resolution=0.5):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.resolution = resolution
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def quantize_row(self, row):
+        return quantize_row(row, self.resolution)
+
+    @staticmethod
+    def make_key(row):
+        return make_key(row)
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+            self._version = version
+
+    def predict(self, rows, compute, version=None):
+        """查缓存，未命中的行合并为一次 compute(rows) 调用；返回与 rows 对齐的概率数组。"""
+        keys = [self.make_key(self.quantize_row(row)) for row in rows]
+        results = [None] * len(rows)
+        pending = OrderedDict()
+
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(version)
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    pending.setdefault(key, []).append(i)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    results[i] = entry[1]
+
+        if pending:
+            # 同一次调用中落在同一个键上的行只推理第一行的原始数据
+            miss_rows = [rows[indexes[0]] for indexes in pending.values()]
+            computed = compute(miss_rows)
+            expires_at = time.monotonic() + self.ttl
+            with self._lock:
+                # 计算期间模型已切换时，旧版本结果只返回给本次调用，不写入缓存
+                store = version == self._version
+                for (key, indexes), probs in zip(pending.items(), computed):
+                    probs = np.array(probs, copy=True)
+                    for i in indexes:
+                        results[i] = probs
+                    if store:
+                        self._entries[key] = (expires_at, probs)
+                        self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+        return np.vstack(results)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'resolution': self.resolution,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+
+class SharedPredictionCache:
+    """多 worker 共享的二级预测缓存，存放在共享存储中（键含模型版本，切换模型后自然不再命中）。
+
+    通常作为 PredictionCache 的 compute 使用：进程内缓存未命中的行先查共享存储，仍未命中才推理，
+    推理结果写回共享存储。共享存储不可用时直接推理。键同样由量化后的数据生成，推理使用原始数据。
+    """
+
+    def __init__(self, store, ttl=300.0, resolution=0.5, prefix='pred'):
+        self.store = store
+        self.ttl = ttl
+        self.resolution = resolution
+        self.prefix = prefix
+
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _store_key(self, version, row):
+        return f"{self.prefix}:{version}:" + '|'.join(str(part) for part in make_key(row))
+
+    def predict(self, rows, compute, version=None):
+        keys = [self._store_key(version, quantize_row(row, self.resolution)) for row in rows]
+        try:
+            cached = self.store.mget(keys)
+        except StoreError:
+            self.errors += 1
+            return compute(rows)
+
+        results = [None] * len(rows)
+        missing = []
+        for i, value in enumerate(cached):
+            if value is None:
+                missing.append(i)
+            else:
+                results[i] = np.frombuffer(value, dtype=np.float64)
+        self.hits += len(rows) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            computed = np.asarray(compute([rows[i] for i in missing]), dtype=np.float64)
+            for i, probs in zip(missing, computed):
+                results[i] = probs
+            try:
+                self.store.mset([(keys[i], probs.tobytes()) for i, probs in zip(missing, computed)], self.ttl)
+            except StoreError:
+                self.errors += 1
+        return np.vstack(results)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.store).__name__,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'errors': self.errors
+        }
+
+
+def init_prediction_caches(app, store):
+    """返回 (进程内缓存, 共享二级缓存)；共享存储为进程内实现时不启用二级缓存（返回 None）。"""
+    cache = PredictionCache(
+        max_entries=app.config['PREDICT_CACHE_SIZE'],
+        ttl=app.config['PREDICT_CACHE_TTL'],
+        resolution=app.config['PREDICT_CACHE_RESOLUTION']
+    )
+    app.extensions['prediction_cache'] = cache
+
+    shared = None
+    if store.shared and app.config['SHARED_PREDICT_CACHE_TTL'] > 0:
+        shared = SharedPredictionCache(store, ttl=app.config['SHARED_PREDICT_CACHE_TTL'], resolution=cache.resolution)
+    app.extensions['shared_prediction_cache'] = shared
+    return cache, shared
@@ -0,0 +1,58 @@
+import hashlib
+import threading
+import time
+
+
+def strong_etag(body):
+    """按响应体内容计算强 ETag（不含引号，交给 response.set_etag 加引号）。"""
+    return hashlib.sha1(body).hexdigest()
+
+
+class ResponseCache:
+    """短 TTL 的序列化响应缓存：按请求参数缓存 (ETag, 响应体, 额外响应头)。
+
+    TTL 内的重复请求不查库；带 If-None-Match 且与缓存 ETag 一致时直接返回 304。
+    数据变更处调用 clear() 立即失效，其余变化最多延迟 ttl 秒可见。
+    """
+
+    def __init__(self, ttl=5.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1:]
+            self.misses += 1
+            return None
+
+    def put(self, key, body, headers=None):
+        etag = strong_etag(body)
+        if not self.enabled:
+            return etag
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (now + self.ttl, etag, body, headers or {})
+        return etag
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'ttl_seconds': self.ttl}
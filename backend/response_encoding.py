@@ -0,0 +1,149 @@
+import gzip
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+from metrics import span
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时沿用标准库 json
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，未安装时只协商 gzip
+    brotli = None
+
+# 值得压缩的响应类型；导出等流式响应不经过压缩
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/csv', 'text/html'}
+
+
+# --- JSON 序列化 ---
+class OrjsonProvider(DefaultJSONProvider):
+    """用 orjson 序列化响应，输出与默认实现等价：键排序，日期沿用 HTTP 日期格式。
+
+    orjson 总是输出 UTF-8，中文不再转义为 \\uXXXX，响应体更小；调试模式下的缩进输出仍交给默认实现。
+    """
+
+    option = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    def _orjson_default(self, o):
+        # numpy 标量等 float/int 的子类，标准库 json 可以直接序列化，orjson 需要先转换
+        if isinstance(o, float):
+            return float(o)
+        if isinstance(o, int):
+            return int(o)
+        return self.default(o)
+
+    def _pretty(self):
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self._orjson_default, option=self.option).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        if self._pretty():
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self._orjson_default, option=self.option | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    """JSON_PROVIDER=auto（默认，已安装 orjson 时启用）/ orjson / default。"""
+    choice = app.config['JSON_PROVIDER']
+    if choice == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_PROVIDER=orjson 需要安装 orjson')
+    if choice in ('auto', 'orjson') and orjson is not None:
+        app.json = OrjsonProvider(app)
+    return type(app.json).__name__
+
+
+# --- 响应压缩 ---
+def etag_matches(etag):
+    """If-None-Match 是否命中；压缩后的响应 ETag 带编码后缀（见 ResponseCompressor），同样视为命中。"""
+    candidates = request.if_none_match
+    return any(candidates.contains(etag + suffix) for suffix in ('', '-gzip', '-br'))
+
+
+class ResponseCompressor:
+    """按 Accept-Encoding 协商压缩响应体（brotli 优先，其次 gzip）。
+
+    只压缩完整生成的响应：流式响应（导出）、已编码的响应与过小的响应原样返回。
+    强 ETag 对应具体的字节，压缩后追加 -gzip / -br 后缀，条件请求由 etag_matches 识别。
+    """
+
+    def __init__(self, min_bytes=512, gzip_level=6, brotli_quality=5):
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def choose_encoding(self, accept_encodings):
+        if brotli is not None and accept_encodings.quality('br') > 0:
+            return 'br'
+        if accept_encodings.quality('gzip') > 0:
+            return 'gzip'
+        return None
+
+    def __call__(self, response):
+        if response.status_code == 304:
+            return self._not_modified(response)
+        if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+                or response.status_code == 204 or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.choose_encoding(request.accept_encodings)
+        body = response.get_data()
+        if encoding is None or len(body) < self.min_bytes:
+            return response
+
+        with span('compress'):
+            if encoding == 'br':
+                compressed = brotli.compress(body, quality=self.brotli_quality)
+            else:
+                compressed = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f'{etag}-{encoding}')
+
+        self.compressed += 1
+        self.bytes_in += len(body)
+        self.bytes_out += len(compressed)
+        return response
+
+    def _not_modified(self, response):
+        # 304 须带与 200 相同的 ETag：客户端缓存的是压缩后的表示时补上编码后缀
+        etag, weak = response.get_etag()
+        encoding = self.choose_encoding(request.accept_encodings)
+        if etag and not weak and encoding and request.if_none_match.contains(f'{etag}-{encoding}'):
+            response.set_etag(f'{etag}-{encoding}')
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def stats(self):
+        return {'compressed': self.compressed, 'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out,
+                'brotli': brotli is not None}
+
+
+def init_compression(app):
+    if not app.config['COMPRESSION_ENABLED']:
+        return None
+    compressor = ResponseCompressor(
+        min_bytes=app.config['COMPRESSION_MIN_BYTES'],
+        gzip_level=app.config['COMPRESSION_LEVEL']
+    )
+    app.after_request(compressor)
+    app.extensions['compressor'] = compressor
+    return compressor
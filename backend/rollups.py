@@ -0,0 +1,106 @@
+from collections import Counter
+from datetime import date
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from db_models import db, User, History, ResultStat, UserHistoryStat, CategoryDailyStat
+
+
+def _as_date(value):
+    # SQLite 的 DATE() 返回字符串，PostgreSQL 返回 date
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _increment(session, model, keys, column, delta):
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert_fn = sqlite_insert if dialect == 'sqlite' else pg_insert
+        stmt = insert_fn(table).values(**keys, **{column: delta})
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: table.c[column] + delta}
+        )
+        session.execute(stmt)
+        return
+
+    updated = session.query(model).filter_by(**keys) \
+        .update({column: getattr(model, column) + delta}, synchronize_session=False)
+    if not updated:
+        session.add(model(**keys, **{column: delta}))
+
+
+def apply_deltas(session, result_counts, user_counts, category_day_counts, sign=1):
+    """把三类计数按 sign（+1 写入 / -1 删除）累加到汇总表，不提交事务。"""
+    for result, n in result_counts.items():
+        _increment(session, ResultStat, {'result': result}, 'total', sign * n)
+    for user_id, n in user_counts.items():
+        _increment(session, UserHistoryStat, {'user_id': user_id}, 'history_count', sign * n)
+    for (category, day), n in category_day_counts.items():
+        if day is not None:
+            _increment(session, CategoryDailyStat, {'category': category, 'day': day}, 'total', sign * n)
+
+
+def record_inserted(session, histories):
+    """新写入的 History 对象计入汇总表。"""
+    result_counts, user_counts, category_day_counts = Counter(), Counter(), Counter()
+    for h in histories:
+        result_counts[h.result] += 1
+        user_counts[h.user_id] += 1
+        category_day_counts[(h.category, h.timestamp.date() if h.timestamp else None)] += 1
+    apply_deltas(session, result_counts, user_counts, category_day_counts)
+
+
+def record_deleted(session, *criteria):
+    """在删除 History 之前调用：按删除条件分组统计并从汇总表中扣减。"""
+    day = func.date(History.timestamp)
+    rows = session.query(History.user_id, History.result, History.category, day, func.count(History.id)) \
+        .filter(*criteria) \
+        .group_by(History.user_id, History.result, History.category, day) \
+        .all()
+
+    result_counts, user_counts, category_day_counts = Counter(), Counter(), Counter()
+    for user_id, result, category, row_day, n in rows:
+        result_counts[result] += n
+        user_counts[user_id] += n
+        category_day_counts[(category, _as_date(row_day))] += n
+    apply_deltas(session, result_counts, user_counts, category_day_counts, sign=-1)
+
+
+def rebuild_rollups(session):
+    """全量重建汇总表（首次上线回填或数据校正），调用方负责提交。"""
+    session.query(ResultStat).delete(synchronize_session=False)
+    session.query(UserHistoryStat).delete(synchronize_session=False)
+    session.query(CategoryDailyStat).delete(synchronize_session=False)
+
+    session.execute(insert(ResultStat).from_select(
+        ['result', 'total'],
+        select(History.result, func.count(History.id)).group_by(History.result)
+    ))
+    session.execute(insert(UserHistoryStat).from_select(
+        ['user_id', 'history_count'],
+        select(User.id, func.count(History.id))
+        .select_from(User)
+        .outerjoin(History, History.user_id == User.id)
+        .group_by(User.id)
+    ))
+    day = func.date(History.timestamp)
+    session.execute(insert(CategoryDailyStat).from_select(
+        ['category', 'day', 'total'],
+        select(History.category, day, func.count(History.id))
+        .where(History.timestamp.isnot(None))
+        .group_by(History.category, day)
+    ))
+
+
+def register_rollup_commands(app):
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """全量重建管理后台汇总表。"""
+        rebuild_rollups(db.session)
+        db.session.commit()
+        print('汇总表重建完成')
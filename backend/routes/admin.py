@@ -1,31 +1,48 @@
-from flask import Blueprint, jsonify
+import json
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Blueprint, Response, jsonify, current_app, request, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from db_models import db, User, History, Feedback
-from sqlalchemy import func
+from db_models import db, User, History, Job, ResultStat, UserHistoryStat
+from identity import revoke_tokens, token_is_admin
+from jobs import JOB_KINDS, job_to_dict
+from pagination import decode_keyset, encode_keyset, parse_limit, prefix_upper_bound
+from response_cache import ResponseCache
+from response_encoding import etag_matches
+from export import FORMATS, ExportError, check_format, encode, export_rows, format_watermark, high_watermark, \
+    parse_filters
+from sqlalchemy import func, tuple_
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
-def _get_admin_user():
-    current_user_id = int(get_jwt_identity())
-    user = db.session.get(User, current_user_id)
-    return current_user_id, user
+# 用户列表支持的排序方式及其游标键的个数
+USER_SORT_KEYS = {'id': 1, 'username': 1, 'history_count': 2}
+
+
+def admin_required(fn):
+    """校验登录令牌并要求管理员身份；管理员标记取自令牌声明，不查库。"""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if not token_is_admin():
+            return jsonify({"code": 403, "msg": "权限不足，仅限管理员访问"}), 403
+        return fn(*args, **kwargs)
+    return wrapper
 
 
 @admin_bp.route('/dashboard/stats', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_dashboard_stats():
-    current_user_id, user = _get_admin_user()
-
-    if not user or not user.is_admin:
-        return jsonify({"code": 403, "msg": "权限不足，仅限管理员访问"}), 403
+    current_user_id = int(get_jwt_identity())
 
         # 仅统计普通注册用户（不含管理员账号）
     total_registered_users = User.query.filter_by(is_admin=False).count()
 
-    # 3. 分组统计全站推荐结果分布 (Fit, Small, Large)
+    # 3. 全站推荐结果分布 (Fit, Small, Large)，直接读取增量维护的汇总表
     results_stats = db.session.query(
-        History.result,
-        func.count(History.id)
-    ).group_by(History.result).all()
+        ResultStat.result,
+        ResultStat.total
+    ).filter(ResultStat.total > 0).all()
 
     # 将查询结果转换为前端 ECharts 所需的字典格式
     chart_data = [{"name": row[0], "value": row[1]} for row in results_stats]
@@ -38,48 +55,93 @@ def get_dashboard_stats():
             "admin_id": current_user_id
         }
     })
+def _users_cache():
+    cache = current_app.extensions.get('admin_users_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            'admin_users_cache', ResponseCache(ttl=current_app.config.get('ADMIN_USERS_CACHE_TTL', 5.0)))
+    return cache
+
+
+def _query_users(sort, prefix, after, limit):
+    """按 sort 做 keyset 分页，多取一条用于判断是否还有下一页；返回 (行列表, 行 -> 游标键)。"""
+    if sort == 'history_count':
+        # 每个用户都有一行汇总记录（User 的 after_insert 事件写入，老库由迁移 0004 补齐），
+        # 内连接不会漏掉用户，按 (history_count, user_id) 索引倒序扫描
+        query = db.session.query(User.id, User.username, User.is_admin, UserHistoryStat.history_count) \
+            .join(User, User.id == UserHistoryStat.user_id)
+        if after:
+            query = query.filter(tuple_(UserHistoryStat.history_count, UserHistoryStat.user_id) < after)
+        order = (UserHistoryStat.history_count.desc(), UserHistoryStat.user_id.desc())
+        key = lambda u: (int(u.history_count), u.id)
+    else:
+        query = db.session.query(
+            User.id, User.username, User.is_admin,
+            func.coalesce(UserHistoryStat.history_count, 0).label('history_count')
+        ).outerjoin(UserHistoryStat, User.id == UserHistoryStat.user_id)
+        column = User.username if sort == 'username' else User.id
+        if after:
+            query = query.filter(column > after[0])
+        order = (column.asc(),)
+        key = (lambda u: (u.username,)) if sort == 'username' else (lambda u: (u.id,))
+
+    if prefix:
+        # 用户名唯一索引上的范围扫描
+        query = query.filter(User.username >= prefix, User.username < prefix_upper_bound(prefix))
+    return query.order_by(*order).limit(limit + 1).all(), key
+
+
 @admin_bp.route('/users', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_users():
-    _, user = _get_admin_user()
-
-    if not user or not user.is_admin:
-        return jsonify({"code": 403, "msg": "权限不足，仅限管理员访问"}), 403
-
-    history_count_subquery = db.session.query(
-        History.user_id,
-        func.count(History.id).label('history_count')
-    ).group_by(History.user_id).subquery()
-
-    users = db.session.query(
-        User.id,
-        User.username,
-        User.is_admin,
-        func.coalesce(history_count_subquery.c.history_count, 0).label('history_count')
-    ).outerjoin(
-        history_count_subquery, User.id == history_count_subquery.c.user_id
-    ).order_by(User.id.asc()).all()
-
-    user_list = [
-        {
-            "id": u.id,
-            "username": u.username,
-            "is_admin": u.is_admin,
-            "history_count": int(u.history_count)
-        }
-        for u in users
-    ]
+    sort = request.args.get('sort', 'id')
+    if sort not in USER_SORT_KEYS:
+        return jsonify({"code": 400, "msg": f"sort 参数非法，可选 {'/'.join(USER_SORT_KEYS)}"}), 400
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        cursor = request.args.get('cursor')
+        after = decode_keyset(cursor, USER_SORT_KEYS[sort]) if cursor else None
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 400
+    prefix = request.args.get('q', '').strip()
+
+    # 同一组参数在 TTL 内直接返回缓存的响应体；客户端带 If-None-Match 时返回 304
+    cache = _users_cache()
+    cache_key = (sort, prefix, cursor, limit)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        etag, body, headers = cached
+    else:
+        rows, key = _query_users(sort, prefix, after, limit)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        user_list = [
+            {
+                "id": u.id,
+                "username": u.username,
+                "is_admin": u.is_admin,
+                "history_count": int(u.history_count)
+            }
+            for u in rows
+        ]
+        next_cursor = encode_keyset(*key(rows[-1])) if has_more else None
+        body = json.dumps({"code": 200, "data": {"users": user_list, "next_cursor": next_cursor}},
+                          ensure_ascii=False).encode('utf-8')
+        headers = {'X-Next-Cursor': next_cursor} if next_cursor else {}
+        etag = cache.put(cache_key, body, headers)
 
-    return jsonify({"code": 200, "data": {"users": user_list}}), 200
+    # 压缩后的 ETag 带编码后缀，由 etag_matches 一并识别
+    response = Response(status=304) if etag_matches(etag) else \
+        Response(body, mimetype='application/json', headers=headers)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @admin_bp.route('/users/<int:user_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required
 def delete_user(user_id):
-    current_user_id, admin_user = _get_admin_user()
-
-    if not admin_user or not admin_user.is_admin:
-        return jsonify({"code": 403, "msg": "权限不足，仅限管理员访问"}), 403
+    current_user_id = int(get_jwt_identity())
 
     if current_user_id == user_id:
         return jsonify({"code": 400, "msg": "不能删除当前登录的管理员账号"}), 400
@@ -89,17 +151,157 @@ def delete_user(user_id):
         return jsonify({"code": 404, "msg": "用户不存在"}), 404
 
     try:
-        history_ids_subquery = db.session.query(History.id).filter(History.user_id == user_id).subquery()
-
-        db.session.query(Feedback).filter(
-            (Feedback.user_id == user_id) | (Feedback.history_id.in_(history_ids_subquery))
-        ).delete(synchronize_session=False)
+        # 预测记录较多的用户交给后台任务分块删除，请求立即返回任务编号
+        runner = current_app.extensions['job_runner']
+        stat = db.session.get(UserHistoryStat, user_id)
+        if stat is not None and stat.history_count > runner.chunk_rows:
+            # 任务执行期间该用户的令牌即刻失效，不再产生新的预测记录
+            revoke_tokens(db.session, user_id)
+            # 提交与完成时都会清空用户列表缓存与该用户的身份缓存
+            job = runner.enqueue(db.session, 'delete_users', {'user_ids': [user_id]}, created_by=current_user_id)
+            return jsonify({"code": 202, "msg": "删除任务已提交", "data": job_to_dict(job)}), 202
 
-        db.session.query(History).filter(History.user_id == user_id).delete(synchronize_session=False)
-        db.session.delete(user_to_delete)
-        db.session.commit()
+        runner.run_inline(db.session, 'delete_users', {'user_ids': [user_id]})
 
         return jsonify({"code": 200, "msg": "用户及相关数据删除成功"}), 200
     except Exception:
         db.session.rollback()
-        return jsonify({"code": 500, "msg": "删除用户失败"}), 500
\ No newline at end of file
+        return jsonify({"code": 500, "msg": "删除用户失败"}), 500
+
+
+@admin_bp.route('/jobs', methods=['POST'])
+@admin_required
+def create_job():
+    current_user_id = int(get_jwt_identity())
+
+    payload = request.get_json(silent=True) or {}
+    kind = payload.get('kind')
+    if kind not in JOB_KINDS:
+        return jsonify({"code": 400, "msg": f"kind 参数非法，可选 {'/'.join(JOB_KINDS)}"}), 400
+
+    if kind == 'retention':
+        days = payload.get('days')
+        if not isinstance(days, int) or isinstance(days, bool) or days < 1:
+            return jsonify({"code": 400, "msg": "days 参数非法，应为正整数"}), 400
+        before = datetime.utcnow() - timedelta(days=days)
+        params = {'before': before.isoformat(), 'days': days}
+    else:
+        user_ids = payload.get('user_ids')
+        if not isinstance(user_ids, list) or not user_ids \
+                or not all(isinstance(i, int) and not isinstance(i, bool) for i in user_ids):
+            return jsonify({"code": 400, "msg": "user_ids 参数非法，应为用户 ID 列表"}), 400
+        if kind == 'delete_users' and current_user_id in user_ids:
+            return jsonify({"code": 400, "msg": "不能删除当前登录的管理员账号"}), 400
+        user_ids = sorted(set(user_ids))
+        params = {'user_ids': user_ids}
+        if kind == 'delete_users':
+            for user_id in user_ids:
+                revoke_tokens(db.session, user_id)
+        if kind == 'purge_history':
+            # 只清理提交时已有的记录（本进程写入队列中的预测先落库）
+            current_app.extensions['job_runner'].drain_writes()
+            params['max_history_id'] = db.session.query(func.max(History.id)) \
+                .filter(History.user_id.in_(user_ids)).scalar()
+
+    job = current_app.extensions['job_runner'].enqueue(db.session, kind, params, created_by=current_user_id)
+    return jsonify({"code": 202, "msg": "任务已提交", "data": job_to_dict(job)}), 202
+
+
+@admin_bp.route('/jobs', methods=['GET'])
+@admin_required
+def list_jobs():
+    try:
+        limit = parse_limit(request.args.get('limit'), default=20, maximum=100)
+    except ValueError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 400
+    jobs = Job.query.order_by(Job.id.desc()).limit(limit).all()
+    return jsonify({"code": 200, "data": [job_to_dict(job) for job in jobs]}), 200
+
+
+@admin_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@admin_required
+def get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({"code": 404, "msg": "任务不存在"}), 404
+    return jsonify({"code": 200, "data": job_to_dict(job)}), 200
+
+
+@admin_bp.route('/cache/stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    cache = current_app.extensions.get('prediction_cache')
+    if cache is None:
+        return jsonify({"code": 404, "msg": "预测缓存未启用"}), 404
+
+    data = cache.stats()
+    # 多 worker 共享的二级缓存与限流计数（均为本进程视角）
+    shared = current_app.extensions.get('shared_prediction_cache')
+    data['shared'] = shared.stats() if shared is not None else None
+    data['rate_limits'] = {name: limiter.stats()
+                           for name, limiter in current_app.extensions.get('rate_limiters', {}).items()}
+    return jsonify({"code": 200, "data": data}), 200
+
+
+@admin_bp.route('/model', methods=['GET'])
+@admin_required
+def get_model_info():
+    registry = current_app.extensions.get('model_registry')
+    if registry is None:
+        return jsonify({"code": 404, "msg": "模型注册表未启用"}), 404
+
+    return jsonify({"code": 200, "data": registry.info()}), 200
+
+
+@admin_bp.route('/model/reload', methods=['POST'])
+@admin_required
+def reload_model():
+    registry = current_app.extensions.get('model_registry')
+    if registry is None:
+        return jsonify({"code": 404, "msg": "模型注册表未启用"}), 404
+
+    # 后台线程加载并预热新模型，完成后原子切换，不阻塞当前请求
+    registry.request_reload()
+    return jsonify({"code": 202, "msg": "已触发模型重新加载", "data": registry.info()}), 202
+
+
+@admin_bp.route('/profiles', methods=['GET'])
+@admin_required
+def list_profiles():
+    return jsonify({"code": 200, "data": current_app.extensions['profiles'].list()}), 200
+
+
+@admin_bp.route('/profiles/<profile_id>', methods=['GET'])
+@admin_required
+def get_profile(profile_id):
+    profile = current_app.extensions['profiles'].get(profile_id)
+    if profile is None:
+        return jsonify({"code": 404, "msg": "未找到采样结果"}), 404
+
+    # 折叠栈格式，可直接交给 flamegraph.pl / speedscope 生成火焰图
+    return Response(profile['collapsed'], mimetype='text/plain')
+
+
+@admin_bp.route('/export/history', methods=['GET'])
+@admin_required
+def export_history():
+    fmt = request.args.get('format', 'ndjson')
+    try:
+        check_format(fmt)
+        filters = parse_filters(request.args.get('since'), request.args.get('until'),
+                                request.args.get('category'), request.args.get('after'))
+    except ExportError as e:
+        return jsonify({"code": 400, "msg": str(e)}), 400
+
+    # 先确定本次导出的上界，作为下一次增量导出的 after 参数随响应头返回
+    upto = high_watermark(**filters)
+    mimetype, extension = FORMATS[fmt]
+    headers = {
+        'X-Export-Watermark': format_watermark(upto) or request.args.get('after', ''),
+        'Content-Disposition': f'attachment; filename=history-export.{extension}',
+        'Cache-Control': 'no-store'
+    }
+    # 不设 Content-Length，逐块写出（chunked），数据库游标随响应一起保持到流结束
+    partitions = export_rows(upto, **filters) if upto is not None else iter(())
+    body = stream_with_context(encode(fmt, partitions))
+    return Response(body, mimetype=mimetype, headers=headers)
@@ -0,0 +1,429 @@
+"""多进程共享的键值存储：预测结果二级缓存与令牌桶限流。
+
+- memory://（默认）：进程内实现，单进程部署或开发时使用
+- redis://[:password@]host:port/db：任何兼容 Redis 协议（RESP）的服务
+- 本模块也可作为一个极简的 RESP 服务运行，供同一台机器上的多个 worker 共享（无需安装 Redis）：
+  python shared_store.py --port 6390，再设置 SHARED_STORE_URL=redis://127.0.0.1:6390/0
+"""
+import argparse
+import hashlib
+import math
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+# 令牌桶：按服务端时钟补充令牌，读-改-写在一次脚本调用内完成，多个 worker 并发扣减不会超发
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry)}
+"""
+TOKEN_BUCKET_SHA = hashlib.sha1(TOKEN_BUCKET_SCRIPT.encode('utf-8')).hexdigest()
+
+
+class StoreError(Exception):
+    """共享存储不可用（连接失败、超时或协议错误），调用方应降级处理。"""
+
+
+class MemoryStore:
+    """进程内实现，接口与 RespStore 一致。
+
+    缓存值超过 max_entries 时按最近最少使用的顺序逐个淘汰；限流桶单独存放，不受缓存写入量影响，
+    只有已补满（与新建等价）的桶才会被清理，写入大量不同的缓存键无法重置任何人的限流状态。
+    """
+
+    shared = False
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._values = OrderedDict()
+        self._buckets = {}
+        self._next_bucket_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def mget(self, keys):
+        now = time.time()
+        result = []
+        with self._lock:
+            for key in keys:
+                entry = self._values.get(key)
+                if entry is not None and entry[0] <= now:
+                    del self._values[key]
+                    entry = None
+                if entry is not None:
+                    self._values.move_to_end(key)
+                result.append(entry[1] if entry is not None else None)
+        return result
+
+    def mset(self, items, ttl):
+        """items 为 [(key, bytes)]，ttl 秒后过期。"""
+        now = time.time()
+        with self._lock:
+            for key, value in items:
+                self._values[key] = (now + ttl, value)
+                self._values.move_to_end(key)
+            while len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+                self._buckets.pop(key, None)
+
+    def token_bucket(self, key, rate, burst, cost=1):
+        """扣减 cost 个令牌，返回 (是否放行, 需等待的秒数)。"""
+        now = time.time()
+        with self._lock:
+            tokens, ts, _ = self._buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + max(0.0, now - ts) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            # 记录补满的时刻：各限流器的速率不同，清理时按各自的时刻判断
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            if len(self._buckets) > self.max_entries and now >= self._next_bucket_sweep:
+                self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+                self._next_bucket_sweep = now + 1.0
+            return (True, 0.0) if allowed else (False, (cost - tokens) / rate)
+
+    def ping(self):
+        return True
+
+    def close(self):
+        pass
+
+
+def _encode_command(*args):
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode('utf-8')
+        elif not isinstance(arg, bytes):
+            arg = str(arg).encode('utf-8')
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+class _RespError(Exception):
+    pass
+
+
+class _Connection:
+    def __init__(self, host, port, timeout, password=None, db=0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+        if password:
+            self.execute('AUTH', password)
+        if db:
+            self.execute('SELECT', db)
+
+    def send(self, payload):
+        self.sock.sendall(payload)
+
+    def read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('连接已关闭')
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body
+        if kind == b'-':
+            return _RespError(body.decode('utf-8', 'replace'))
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            n = int(body)
+            if n < 0:
+                return None
+            data = self.reader.read(n + 2)
+            return data[:-2]
+        if kind == b'*':
+            n = int(body)
+            return None if n < 0 else [self.read() for _ in range(n)]
+        raise ConnectionError(f'无法解析的响应: {line[:32]!r}')
+
+    def execute(self, *args):
+        self.send(_encode_command(*args))
+        reply = self.read()
+        if isinstance(reply, _RespError):
+            raise reply
+        return reply
+
+    def pipeline(self, commands):
+        self.send(b''.join(_encode_command(*args) for args in commands))
+        return [self.read() for _ in commands]
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RespStore:
+    """Redis 协议客户端：每个线程一条连接（fork 后重新建立），超时很短。
+
+    存储出错后 backoff 秒内不再尝试，直接抛出 StoreError，避免每个请求都等一次超时。
+    """
+
+    shared = True
+
+    def __init__(self, host='127.0.0.1', port=6379, db=0, password=None, timeout=0.1, backoff=1.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.backoff = backoff
+        self._local = threading.local()
+        self._down_until = 0.0
+        self.errors = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = _Connection(self.host, self.port, self.timeout, self.password, self.db)
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _call(self, fn):
+        if time.monotonic() < self._down_until:
+            raise StoreError('共享存储暂不可用')
+        try:
+            return fn(self._connection())
+        except (OSError, ConnectionError, ValueError) as e:
+            conn = getattr(self._local, 'conn', None)
+            if conn is not None:
+                conn.close()
+            self._local.conn = None
+            self.errors += 1
+            self._down_until = time.monotonic() + self.backoff
+            raise StoreError(str(e)) from e
+        except _RespError as e:
+            self.errors += 1
+            raise StoreError(str(e)) from e
+
+    def mget(self, keys):
+        if not keys:
+            return []
+        return self._call(lambda conn: conn.execute('MGET', *keys))
+
+    def mset(self, items, ttl):
+        if not items:
+            return
+        px = max(1, int(ttl * 1000))
+        self._call(lambda conn: conn.pipeline([('SET', key, value, 'PX', px) for key, value in items]))
+
+    def delete(self, *keys):
+        if keys:
+            self._call(lambda conn: conn.execute('DEL', *keys))
+
+    def token_bucket(self, key, rate, burst, cost=1):
+        def run(conn):
+            try:
+                return conn.execute('EVALSHA', TOKEN_BUCKET_SHA, 1, key, rate, burst, cost)
+            except _RespError as e:
+                # 服务端首次执行或重启后脚本缓存为空
+                if not str(e).startswith('NOSCRIPT'):
+                    raise
+                return conn.execute('EVAL', TOKEN_BUCKET_SCRIPT, 1, key, rate, burst, cost)
+
+        allowed, retry = self._call(run)
+        return bool(allowed), float(retry)
+
+    def ping(self):
+        return self._call(lambda conn: conn.execute('PING')) == b'PONG'
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def open_store(url, timeout=0.1):
+    if not url or url.startswith('memory://'):
+        return MemoryStore()
+    parsed = urlparse(url)
+    if parsed.scheme != 'redis':
+        raise ValueError(f'不支持的共享存储地址: {url}')
+    db = int(parsed.path.lstrip('/') or 0)
+    return RespStore(parsed.hostname or '127.0.0.1', parsed.port or 6379, db=db,
+                     password=parsed.password, timeout=timeout)
+
+
+class RateLimiter:
+    """按身份（用户名或用户 ID）划分的令牌桶：每秒补充 rate 个令牌，最多积攒 burst 个。
+
+    共享存储不可用时放行（fail open），只计数，不影响正常请求。
+    """
+
+    def __init__(self, store, name, rate, burst):
+        self.store = store
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.allowed = 0
+        self.rejected = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return self.rate > 0 and self.burst > 0
+
+    def acquire(self, identity, cost=1):
+        """返回 (是否放行, Retry-After 秒数)。"""
+        if not self.enabled:
+            return True, 0
+        try:
+            allowed, retry = self.store.token_bucket(f'rl:{self.name}:{identity}', self.rate, self.burst,
+                                                     min(cost, self.burst))
+        except StoreError:
+            self.errors += 1
+            return True, 0
+        if allowed:
+            self.allowed += 1
+            return True, 0
+        self.rejected += 1
+        return False, max(1, math.ceil(retry))
+
+    def stats(self):
+        return {'rate': self.rate, 'burst': self.burst, 'allowed': self.allowed,
+                'rejected': self.rejected, 'errors': self.errors}
+
+
+def init_shared_store(app):
+    store = open_store(app.config['SHARED_STORE_URL'], timeout=app.config['SHARED_STORE_TIMEOUT_MS'] / 1000.0)
+    app.extensions['shared_store'] = store
+    return store
+
+
+# 限流器名称 -> 配置项前缀
+RATE_LIMITERS = {'login': 'RATE_LIMIT_LOGIN', 'login_ip': 'RATE_LIMIT_LOGIN_IP',
+                 'login_user': 'RATE_LIMIT_LOGIN_USER', 'predict': 'RATE_LIMIT_PREDICT'}
+
+
+def init_rate_limiters(app, store):
+    limiters = {name: RateLimiter(store, name, app.config[f'{prefix}_RATE'], app.config[f'{prefix}_BURST'])
+                for name, prefix in RATE_LIMITERS.items()}
+    app.extensions['rate_limiters'] = limiters
+    return limiters
+
+
+# --- 极简 RESP 服务：以 MemoryStore 为后端，支持本模块用到的命令 ---
+class _RespHandler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            n = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(n + 2)[:-2])
+        return args
+
+    def _reply(self, value):
+        if value is None:
+            return b'$-1\r\n'
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, int):
+            return b':%d\r\n' % value
+        if isinstance(value, list):
+            return b'*%d\r\n' % len(value) + b''.join(self._reply(v) for v in value)
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            if not args:
+                continue
+            name = args[0].upper()
+            try:
+                if name == b'PING':
+                    out = b'+PONG\r\n'
+                elif name in (b'AUTH', b'SELECT'):
+                    out = b'+OK\r\n'
+                elif name == b'MGET':
+                    out = self._reply(store.mget([k.decode() for k in args[1:]]))
+                elif name == b'GET':
+                    out = self._reply(store.mget([args[1].decode()])[0])
+                elif name == b'SET':
+                    ttl = None
+                    if len(args) >= 5 and args[3].upper() in (b'PX', b'EX'):
+                        ttl = float(args[4]) / (1000.0 if args[3].upper() == b'PX' else 1.0)
+                    store.mset([(args[1].decode(), args[2])], ttl if ttl is not None else 10 ** 9)
+                    out = b'+OK\r\n'
+                elif name == b'DEL':
+                    store.delete(*[k.decode() for k in args[1:]])
+                    out = b':%d\r\n' % (len(args) - 1)
+                elif name in (b'EVALSHA', b'EVAL'):
+                    script = args[1].decode()
+                    if script not in (TOKEN_BUCKET_SHA, TOKEN_BUCKET_SCRIPT):
+                        out = b'-NOSCRIPT No matching script\r\n'
+                    else:
+                        key, rate, burst, cost = args[3].decode(), float(args[4]), float(args[5]), float(args[6])
+                        allowed, retry = store.token_bucket(key, rate, burst, cost)
+                        out = self._reply([int(allowed), repr(retry)])
+                else:
+                    out = b'-ERR unknown command\r\n'
+            except (IndexError, ValueError) as e:
+                out = b'-ERR %s\r\n' % str(e).encode('utf-8')
+            self.wfile.write(out)
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, store=None):
+        super().__init__(address, _RespHandler)
+        self.store = store or MemoryStore()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本机多 worker 共享的极简 RESP 存储服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    parser.add_argument('--max-entries', type=int, default=100000)
+    args = parser.parse_args()
+
+    server = RespServer((args.host, args.port), MemoryStore(max_entries=args.max_entries))
+    print(f'共享存储已启动: redis://{args.host}:{args.port}/0')
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
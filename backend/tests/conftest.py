@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+
+# 测试按 backend 目录下的平铺模块导入（与 python app.py 的运行方式一致）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """以临时 SQLite 库导入 app；配置在导入时读取，须先设置环境变量。"""
+    workdir = tmp_path_factory.mktemp('smartfit')
+    os.environ.update({
+        'DATABASE_URL': 'sqlite:///' + str(workdir / 'test.db'),
+        'MODEL_PATH': str(workdir / 'models' / 'fit_model.pkl'),
+        'MODEL_POLL_INTERVAL': '0',
+        'MODEL_PRELOAD': '0',
+        # 表由 db.create_all() 创建，没有迁移版本记录
+        'SCHEMA_CHECK': '0',
+        'PASSWORD_HASH_WORKERS': '0',
+        'HISTORY_WRITE_MODE': 'sync',
+        'JOB_WORKER_ENABLED': '0',
+        'RATE_LIMIT_LOGIN_RATE': '0',
+        'RATE_LIMIT_LOGIN_IP_RATE': '0',
+        'RATE_LIMIT_LOGIN_USER_RATE': '0',
+        'RATE_LIMIT_PREDICT_RATE': '0'
+    })
+    import app as module
+    return module
+
+
+@pytest.fixture
+def app_db(app_module):
+    """每个用例使用重建的空库与清空的进程内缓存。"""
+    app = app_module.app
+    with app.app_context():
+        app_module.db.session.remove()
+        app_module.db.drop_all()
+        app_module.db.create_all()
+    for name in ('admin_users_cache', 'identity_cache'):
+        cache = app.extensions.get(name)
+        if cache is not None:
+            cache.clear()
+    with app.app_context():
+        yield app_module
+        app_module.db.session.remove()
+
+
+@pytest.fixture
+def client(app_db):
+    return app_db.app.test_client()
+
+
+def create_user(username, password='test-pass', is_admin=False):
+    from werkzeug.security import generate_password_hash
+    from db_models import db, User
+
+    user = User(username=username, password=generate_password_hash(password), is_admin=is_admin)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def login(client, username, password='test-pass'):
+    response = client.post('/login', json={'username': username, 'password': password})
+    return {'Authorization': 'Bearer ' + response.get_json()['token']}
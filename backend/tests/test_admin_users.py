@@ -0,0 +1,74 @@
+from datetime import datetime
+
+from conftest import create_user, login
+from db_models import db, History
+from rollups import record_inserted
+
+
+def add_history(user_id, n):
+    rows = [History(user_id=user_id, category='dresses', size_input=6.0, result='合身 (Fit)', confidence=0.9,
+                    timestamp=datetime(2026, 1, 1)) for _ in range(n)]
+    db.session.add_all(rows)
+    record_inserted(db.session, rows)
+    db.session.commit()
+
+
+def list_users(client, auth, **params):
+    """按 next_cursor 翻完所有页，返回每页的用户名列表。"""
+    pages, cursor = [], None
+    while True:
+        query = dict(params, **({'cursor': cursor} if cursor else {}))
+        response = client.get('/api/admin/users', query_string=query, headers=auth)
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        pages.append([u['username'] for u in data['users']])
+        cursor = data['next_cursor']
+        assert response.headers.get('X-Next-Cursor') == cursor
+        if cursor is None:
+            return pages
+
+
+def setup_users(client):
+    create_user('root', is_admin=True)
+    counts = {'carol': 2, 'alice': 5, 'bob': 2, 'alan': 0, 'albert': 2, 'dave': 7}
+    for name, n in counts.items():
+        add_history(create_user(name).id, n)
+    return login(client, 'root')
+
+
+def test_sort_orders_and_paging(app_db, client):
+    auth = setup_users(client)
+
+    assert list_users(client, auth, limit=3) == [['root', 'carol', 'alice'], ['bob', 'alan', 'albert'], ['dave']]
+    assert list_users(client, auth, sort='username', limit=4) == [['alan', 'albert', 'alice', 'bob'],
+                                                                  ['carol', 'dave', 'root']]
+    # 次数相同的用户按 id 倒序，页边界落在并列值中间时既不重复也不遗漏
+    assert list_users(client, auth, sort='history_count', limit=2) == [['dave', 'alice'], ['albert', 'bob'],
+                                                                       ['carol', 'alan'], ['root']]
+    users = client.get('/api/admin/users?sort=history_count&limit=2', headers=auth).get_json()['data']['users']
+    assert [u['history_count'] for u in users] == [7, 5]
+
+
+def test_prefix_search(app_db, client):
+    auth = setup_users(client)
+    create_user('Alfred')
+
+    assert list_users(client, auth, q='al', sort='username') == [['alan', 'albert', 'alice']]
+    assert list_users(client, auth, q='al', sort='history_count', limit=2) == [['alice', 'albert'], ['alan']]
+    assert list_users(client, auth, q='ali') == [['alice']]
+    assert list_users(client, auth, q='zz') == [[]]
+
+
+def test_not_modified_and_bad_parameters(app_db, client):
+    auth = setup_users(client)
+    first = client.get('/api/admin/users?limit=2', headers=auth)
+    etag = first.headers['ETag']
+
+    again = client.get('/api/admin/users?limit=2', headers=dict(auth, **{'If-None-Match': etag}))
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+    assert client.get('/api/admin/users?limit=3', headers=dict(auth, **{'If-None-Match': etag})).status_code == 200
+
+    assert client.get('/api/admin/users?sort=password', headers=auth).status_code == 400
+    assert client.get('/api/admin/users?sort=history_count&cursor=WzFd', headers=auth).status_code == 400
+    assert client.get('/api/admin/users', headers=login(client, 'alice')).status_code == 403
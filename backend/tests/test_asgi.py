@@ -0,0 +1,81 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import create_user
+
+
+def call(application, method, path, body=b'', headers=(), client=('10.1.2.3', 5000)):
+    """以最小的 ASGI 事件序列调用应用，返回 (状态码, 响应头, 响应体)。"""
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'http_version': '1.1',
+             'headers': list(headers), 'client': client, 'server': ('testserver', 80)}
+    asyncio.run(application(scope, receive, send))
+    start = sent[0]
+    assert start['type'] == 'http.response.start'
+    return start['status'], dict(start['headers']), b''.join(m.get('body', b'') for m in sent[1:])
+
+
+def test_flask_routes_through_adapter(app_db):
+    from asgi import application
+
+    create_user('alice')
+    status, headers, body = call(application, 'POST', '/login', b'{"username": "alice", "password": "test-pass"}',
+                                 headers=[(b'content-type', b'application/json')])
+    assert status == 200
+    assert b'token' in body
+    assert headers[b'content-type'] == b'application/json'
+
+    status, _, _ = call(application, 'GET', '/history')
+    assert status == 401
+
+
+def test_requests_run_concurrently_on_executor():
+    from asgi import ThreadedWsgiToAsgi
+
+    # 两个请求都要等到对方进入 WSGI 应用才返回：串行执行会在 barrier 上超时
+    barrier = threading.Barrier(2, timeout=5)
+    seen = []
+
+    def wsgi_app(environ, start_response):
+        barrier.wait()
+        seen.append((threading.current_thread().name, environ['REMOTE_ADDR'], environ['HTTP_X_TEST']))
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'a', b'', b'b']
+
+    application = ThreadedWsgiToAsgi(wsgi_app, ThreadPoolExecutor(max_workers=2, thread_name_prefix='test-asgi'))
+
+    async def both():
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*[
+            loop.run_in_executor(None, call, application, 'GET', '/', b'', [(b'x-test', b'1'), (b'x-test', b'2')])
+            for _ in range(2)])
+
+    results = asyncio.run(both())
+    assert [r[2] for r in results] == [b'ab', b'ab']
+    assert all(name.startswith('test-asgi') for name, _, _ in seen)
+    assert {(addr, header) for _, addr, header in seen} == {('10.1.2.3', '1,2')}
+
+
+def test_lifespan_is_acknowledged():
+    from asgi import ThreadedWsgiToAsgi
+
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    asyncio.run(ThreadedWsgiToAsgi(None, None)({'type': 'lifespan'}, receive, send))
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
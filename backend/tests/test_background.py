@@ -0,0 +1,43 @@
+import os
+import threading
+
+import pytest
+
+from background import BackgroundThread
+
+
+def test_restarts_after_thread_exits():
+    runs = []
+    worker = BackgroundThread(lambda: runs.append(1), 'test-worker')
+    worker.ensure_started()
+    worker.join(5)
+    assert not worker.alive
+    worker.ensure_started()
+    worker.join(5)
+    assert runs == [1, 1]
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='需要 fork')
+def test_restarts_in_forked_child_even_if_lock_was_held():
+    stop = threading.Event()
+    starts = []
+    worker = BackgroundThread(stop.wait, 'test-worker', on_start=lambda: starts.append(os.getpid()))
+    worker.ensure_started()
+    assert worker.alive
+
+    # fork 时锁被父进程中的其他线程持有，子进程不能因此死锁
+    with worker._lock:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                if not worker.alive:
+                    worker.ensure_started()
+                    code = 0 if worker.alive and starts[-1] == os.getpid() else 2
+            finally:
+                os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    stop.set()
+    worker.join(5)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert starts == [os.getpid()]
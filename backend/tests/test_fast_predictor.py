@@ -0,0 +1,79 @@
+"""FastPredictor 与 sklearn Pipeline 的概率输出一致性。"""
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+
+from fast_predictor import FastPredictor, sample_rows
+from train_model import FEATURES, build_pipeline
+
+ATOL = 1e-6
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    rows = sample_rows(600, seed=1)
+    X = pd.DataFrame(rows, columns=FEATURES)
+    delta = X['waist'] - (X['size'] * 1.5 + 60.0)
+    y = np.where(delta > 3, 0, np.where(delta < -3, 2, 1))
+    pipeline = build_pipeline(n_estimators=30, max_depth=4)
+    pipeline.fit(X, y)
+    return pipeline
+
+
+@pytest.fixture(scope='module', params=['pipeline', 'spec'])
+def fast(request, pipeline):
+    fast = FastPredictor.from_pipeline(pipeline)
+    if request.param == 'spec':
+        # 与 save_native/load_native 相同的往返：booster 序列化为 UBJ，预处理参数经 JSON 还原
+        booster = xgb.Booster()
+        booster.load_model(bytearray(fast.booster.save_raw('ubj')))
+        fast = FastPredictor.from_spec(fast.to_spec(), booster)
+    return fast
+
+
+def assert_parity(pipeline, fast, rows):
+    expected = pipeline.predict_proba(pd.DataFrame(rows, columns=FEATURES))
+    actual = fast.predict_proba(rows)
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=ATOL)
+
+
+def test_parity_on_valid_rows(pipeline, fast):
+    assert_parity(pipeline, fast, sample_rows(500, seed=2))
+
+
+def test_spec_round_trip_is_json_stable(fast):
+    spec = fast.to_spec()
+    assert FastPredictor.from_spec(spec, fast.booster).to_spec() == spec
+
+
+def test_parity_with_nan_and_missing_fields(pipeline, fast):
+    rows = sample_rows(40, seed=3)
+    for i, row in enumerate(rows):
+        column = ('hips', 'bra_num', 'height_cm', 'bmi_proxy')[i % 4]
+        if i % 2:
+            row[column] = math.nan
+        else:
+            del row[column]
+    rows[0].pop('cup_size')
+    rows[1]['category'] = None
+    assert_parity(pipeline, fast, rows)
+
+
+def test_parity_with_unseen_categories(pipeline, fast):
+    rows = sample_rows(40, seed=4)
+    for i, row in enumerate(rows):
+        if i % 2:
+            row['category'] = 'swimwear'
+        else:
+            row['cup_size'] = 'k'
+    assert_parity(pipeline, fast, rows)
+
+
+def test_single_row_matches_batch(fast):
+    rows = sample_rows(8, seed=5)
+    batch = fast.predict_proba(rows).copy()
+    for i, row in enumerate(rows):
+        np.testing.assert_allclose(fast.predict_proba([row])[0], batch[i], rtol=0, atol=ATOL)
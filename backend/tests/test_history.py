@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+from benchmarks.common import QueryCounter
+from conftest import create_user, login
+from db_models import db, Feedback, History
+from rollups import record_inserted
+
+
+def add_history(user_id, timestamps):
+    rows = [History(user_id=user_id, category='dresses', size_input=6.0, result='合身 (Fit)', confidence=0.9,
+                    timestamp=ts) for ts in timestamps]
+    db.session.add_all(rows)
+    db.session.flush()
+    record_inserted(db.session, rows)
+    db.session.commit()
+    return [h.id for h in rows]
+
+
+def test_history_page_costs_two_statements(app_db, client):
+    user_id = create_user('alice').id
+    add_history(user_id, [datetime(2026, 1, 1) + timedelta(minutes=i) for i in range(5)])
+    auth = login(client, 'alice')
+    # 预热身份缓存，只统计 ETag 与分页查询
+    client.get('/history', headers=auth)
+
+    counter = QueryCounter(db.engine)
+    counter.reset()
+    response = client.get('/history?limit=2', headers=auth)
+    assert response.status_code == 200
+    assert counter.count == 2
+
+    counter.reset()
+    response = client.get('/history?limit=2', headers=dict(auth, **{'If-None-Match': response.headers['ETag']}))
+    assert response.status_code == 304
+    assert counter.count == 1
+
+
+def test_etag_changes_with_feedback_and_deletes(app_db, client):
+    user_id = create_user('alice').id
+    ids = add_history(user_id, [datetime(2026, 1, 1), datetime(2026, 1, 2)])
+    auth = login(client, 'alice')
+    first = client.get('/history', headers=auth).headers['ETag']
+
+    assert client.post(f'/history/{ids[0]}/feedback', json={'fit_feedback': 'tight'}, headers=auth).status_code == 201
+    second = client.get('/history', headers=auth).headers['ETag']
+    assert second != first
+
+    assert client.delete('/history', headers=auth).status_code == 200
+    assert client.get('/history', headers=auth).headers['ETag'] not in (first, second)
+    assert Feedback.query.count() == 0
+
+
+def fetch_all_pages(client, auth, limit):
+    pages, cursor = [], None
+    while True:
+        url = f'/history?limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(url, headers=auth)
+        assert response.status_code == 200
+        pages.append([row['id'] for row in response.get_json()])
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            return pages
+
+
+def test_cursor_pages_cover_equal_timestamps_once(app_db, client):
+    user_id = create_user('alice').id
+    bob = create_user('bob').id
+    same = datetime(2026, 1, 2)
+    ids = add_history(user_id, [datetime(2026, 1, 1), same, same, same, same, datetime(2026, 1, 3)])
+    add_history(bob, [same, same])
+    auth = login(client, 'alice')
+
+    # 时间相同的记录按 id 倒序，页边界落在相同时间戳中间时既不重复也不遗漏
+    expected = [ids[5], ids[4], ids[3], ids[2], ids[1], ids[0]]
+    for limit in (1, 2, 4, 6):
+        pages = fetch_all_pages(client, auth, limit)
+        assert [i for page in pages for i in page] == expected
+        assert all(len(page) == limit for page in pages[:-1])
+    # 整除时最后一页不再多给一个指向空页的游标
+    assert fetch_all_pages(client, auth, 3) == [expected[:3], expected[3:]]
+
+
+def test_cursor_skips_rows_inserted_above_it(app_db, client):
+    user_id = create_user('alice').id
+    ids = add_history(user_id, [datetime(2026, 1, 1) + timedelta(minutes=i) for i in range(4)])
+    auth = login(client, 'alice')
+    first = client.get('/history?limit=2', headers=auth)
+    add_history(user_id, [datetime(2026, 1, 2)])
+
+    second = client.get('/history?limit=2&cursor=' + first.headers['X-Next-Cursor'], headers=auth)
+    assert [row['id'] for row in second.get_json()] == [ids[1], ids[0]]
+    assert 'X-Next-Cursor' not in second.headers
+
+
+def test_invalid_cursor_is_rejected(app_db, client):
+    create_user('alice')
+    auth = login(client, 'alice')
+    assert client.get('/history?cursor=not-a-cursor', headers=auth).status_code == 400
+    assert client.get('/history?limit=abc', headers=auth).status_code == 400
@@ -0,0 +1,135 @@
+import threading
+
+import pytest
+
+from conftest import create_user, login
+from db_models import db, User
+from identity import IdentityCache, revoke_tokens
+from shared_store import MemoryStore, RespServer, RespStore, StoreError
+
+
+@pytest.fixture
+def resp_store():
+    # 与 python shared_store.py 相同的 RESP 服务，代表多 worker 共享的 Redis
+    server = RespServer(('127.0.0.1', 0), MemoryStore())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    store = RespStore(*server.server_address, timeout=1.0)
+    yield store
+    store.close()
+    server.shutdown()
+    server.server_close()
+
+
+class BrokenStore:
+    shared = True
+
+    def mget(self, keys):
+        raise StoreError('down')
+
+    def mset(self, items, ttl):
+        raise StoreError('down')
+
+
+def test_set_admin_revoke_rejects_existing_token(app_db, client):
+    create_user('root', is_admin=True)
+    auth = login(client, 'root')
+    assert client.get('/api/admin/users', headers=auth).status_code == 200
+
+    result = app_db.app.test_cli_runner().invoke(args=['set-admin', 'root', '--revoke'])
+    assert result.exit_code == 0, result.output
+
+    assert client.get('/api/admin/users', headers=auth).status_code == 401
+    assert client.get('/history', headers=auth).status_code == 401
+    # 重新登录后拿到的是普通用户令牌
+    auth = login(client, 'root')
+    assert client.get('/api/admin/users', headers=auth).status_code == 403
+    assert client.get('/history', headers=auth).status_code == 200
+
+
+def test_set_admin_grant_rejects_existing_token(app_db, client):
+    create_user('alice')
+    auth = login(client, 'alice')
+    result = app_db.app.test_cli_runner().invoke(args=['set-admin', 'alice'])
+    assert result.exit_code == 0, result.output
+
+    assert client.get('/history', headers=auth).status_code == 401
+    assert client.get('/api/admin/users', headers=login(client, 'alice')).status_code == 200
+
+
+def test_deleted_user_token_is_rejected(app_db, client):
+    create_user('root', is_admin=True)
+    alice_id = create_user('alice').id
+    alice = login(client, 'alice')
+    assert client.get('/history', headers=alice).status_code == 200
+
+    assert client.delete(f'/api/admin/users/{alice_id}', headers=login(client, 'root')).status_code == 200
+    assert client.get('/history', headers=alice).status_code == 401
+
+
+def test_queued_user_deletion_rejects_token_immediately(app_db, client):
+    create_user('root', is_admin=True)
+    alice_id = create_user('alice').id
+    alice = login(client, 'alice')
+    assert client.get('/history', headers=alice).status_code == 200
+
+    # 测试中不运行后台任务线程：任务只入队，令牌在提交时即失效
+    response = client.post('/api/admin/jobs', json={'kind': 'delete_users', 'user_ids': [alice_id]},
+                           headers=login(client, 'root'))
+    assert response.status_code == 202
+    assert client.get('/history', headers=alice).status_code == 401
+
+
+def test_admin_token_is_checked_against_database(app_db, client):
+    root_id = create_user('root', is_admin=True).id
+    auth = login(client, 'root')
+    assert client.get('/api/admin/users', headers=auth).status_code == 200
+
+    # 其他进程取消了管理员权限，本进程的身份缓存没有收到任何通知
+    db.session.get(User, root_id).is_admin = False
+    revoke_tokens(db.session, root_id)
+    db.session.commit()
+    assert client.get('/api/admin/users', headers=auth).status_code == 401
+
+
+def test_revocation_in_another_worker_reaches_cached_identity(app_db, client, resp_store, monkeypatch):
+    monkeypatch.setattr(app_db.identity_cache, 'store', resp_store)
+    other_worker = IdentityCache(ttl=30, store=resp_store)
+    alice_id = create_user('alice').id
+    auth = login(client, 'alice')
+    assert client.get('/history', headers=auth).status_code == 200
+    hits = app_db.identity_cache.hits
+    assert client.get('/history', headers=auth).status_code == 200
+    assert app_db.identity_cache.hits == hits + 1
+
+    revoke_tokens(db.session, alice_id)
+    db.session.commit()
+    other_worker.invalidate(alice_id)
+    assert client.get('/history', headers=auth).status_code == 401
+
+
+def test_revocation_from_cli_reaches_other_worker(app_db, resp_store, monkeypatch):
+    monkeypatch.setattr(app_db.identity_cache, 'store', resp_store)
+    other_worker = IdentityCache(ttl=30, store=resp_store)
+    alice_id = create_user('alice').id
+    assert other_worker.lookup(alice_id) == (0, False)
+
+    result = app_db.app.test_cli_runner().invoke(args=['set-admin', 'alice'])
+    assert result.exit_code == 0, result.output
+    assert other_worker.lookup(alice_id) == (1, True)
+    # 之后的查询重新命中缓存
+    misses = other_worker.misses
+    assert other_worker.lookup(alice_id) == (1, True)
+    assert other_worker.misses == misses
+
+
+def test_store_failure_falls_back_to_database(app_db):
+    cache = IdentityCache(ttl=30, store=BrokenStore())
+    alice_id = create_user('alice').id
+    assert cache.lookup(alice_id) == (0, False)
+    revoke_tokens(db.session, alice_id)
+    db.session.commit()
+
+    # 无法确认是否已撤销时查库，不使用缓存
+    assert cache.lookup(alice_id) == (1, False)
+    cache.invalidate(alice_id)
+    assert cache.store_errors == 2
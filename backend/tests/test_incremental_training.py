@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from conftest import create_user
+from db_models import db, Feedback, History
+from fast_predictor import sample_rows
+from incremental_training import load_feedback, parse_watermark, run_incremental_training
+from pagination import encode_cursor
+from train_model import FEATURES, build_pipeline, current_model, publish_model, training_metadata
+
+T0 = datetime(2026, 1, 1)
+
+
+def add_feedback(user_id, created_at, fit_feedback='fit'):
+    h = History(user_id=user_id, category='dresses', size_input=6.0, result='合身 (Fit)', confidence=0.9,
+                timestamp=T0, height=165.0, waist=70.0, hips=95.0, bra_size=34.0, cup_size='b')
+    db.session.add(h)
+    db.session.flush()
+    feedback = Feedback(history_id=h.id, user_id=user_id, fit_feedback=fit_feedback, created_at=created_at)
+    db.session.add(feedback)
+    db.session.commit()
+    return feedback.id
+
+
+def loaded_ids(raw_watermark):
+    return [row[0] for row in load_feedback(parse_watermark(raw_watermark))]
+
+
+def test_feedback_committed_late_is_not_skipped(app_db):
+    user_id = create_user('alice').id
+    first = add_feedback(user_id, T0 + timedelta(seconds=10))
+    assert loaded_ids(None) == [first]
+
+    # 请求开始时生成的 created_at 早于上次已读取的反馈，提交却在上次训练之后
+    late = add_feedback(user_id, T0 + timedelta(seconds=5))
+    later = add_feedback(user_id, T0 + timedelta(seconds=20))
+    assert loaded_ids(first) == [late, later]
+    assert loaded_ids(later) == []
+
+
+def test_legacy_cursor_watermark_keeps_unread_feedback(app_db):
+    user_id = create_user('alice').id
+    first = add_feedback(user_id, T0 + timedelta(seconds=10))
+    late = add_feedback(user_id, T0 + timedelta(seconds=5))
+    legacy = encode_cursor(T0 + timedelta(seconds=10), first)
+    assert loaded_ids(legacy) == [late]
+
+
+def test_training_records_id_watermark(app_db, tmp_path):
+    rows = sample_rows(300, seed=1)
+    X = pd.DataFrame(rows, columns=FEATURES)
+    y = np.where(X['waist'] > 80, 0, np.where(X['waist'] < 65, 2, 1))
+    pipeline = build_pipeline(n_estimators=5, max_depth=3)
+    pipeline.fit(X, y)
+    model_path = str(tmp_path / 'fit_model.pkl')
+    publish_model(pipeline, model_path)
+
+    user_id = create_user('alice').id
+    ids = [add_feedback(user_id, T0 + timedelta(seconds=10 + i), ('tight', 'fit', 'loose')[i % 3]) for i in range(3)]
+    report = run_incremental_training(model_path, rounds=2, min_rows=1, holdout=0)
+    assert report['status'] == 'published' and report['new_feedback'] == 3
+    assert training_metadata(current_model(model_path)[1])['feedback_watermark'] == ids[-1]
+
+    late = add_feedback(user_id, T0, 'tight')
+    report = run_incremental_training(model_path, rounds=2, min_rows=1, holdout=0)
+    assert report['new_feedback'] == 1
+    assert training_metadata(current_model(model_path)[1])['feedback_watermark'] == late
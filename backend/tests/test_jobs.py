@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+from conftest import create_user
+from db_models import db, Feedback, History, User, UserHistoryStat
+from jobs import STEPS
+from rollups import record_inserted
+
+
+def add_history(user_id, n, started=datetime(2026, 1, 1)):
+    rows = [History(user_id=user_id, category='dresses', size_input=6.0, result='合身 (Fit)', confidence=0.9,
+                    timestamp=started + timedelta(minutes=i)) for i in range(n)]
+    db.session.add_all(rows)
+    db.session.flush()
+    record_inserted(db.session, rows)
+    db.session.add_all([Feedback(history_id=h.id, user_id=user_id, fit_feedback='fit') for h in rows])
+    db.session.commit()
+    return rows
+
+
+def run_steps(kind, params, chunk_rows, between=None):
+    for i, _ in enumerate(STEPS[kind](db.session, params, chunk_rows)):
+        db.session.commit()
+        if i == 0 and between is not None:
+            between()
+    db.session.commit()
+
+
+def test_purge_keeps_rows_and_feedback_created_while_running(app_db):
+    user = create_user('alice')
+    add_history(user.id, 6)
+    max_id = db.session.query(db.func.max(History.id)).scalar()
+    created = []
+
+    def insert_new_row():
+        created.extend(add_history(user.id, 1, started=datetime(2026, 2, 1)))
+
+    run_steps('purge_history', {'user_ids': [user.id], 'max_history_id': max_id}, chunk_rows=2,
+              between=insert_new_row)
+
+    new_id = created[0].id
+    assert [h.id for h in History.query.filter_by(user_id=user.id)] == [new_id]
+    assert [f.history_id for f in Feedback.query.filter_by(user_id=user.id)] == [new_id]
+    assert db.session.get(UserHistoryStat, user.id).history_count == 1
+
+
+def test_delete_users_removes_all_feedback_and_stat(app_db):
+    alice = create_user('alice').id
+    bob = create_user('bob').id
+    add_history(alice, 3)
+    bob_rows = add_history(bob, 2)
+    # alice 对 bob 的记录留下的反馈也随用户一并删除
+    db.session.add(Feedback(history_id=bob_rows[0].id, user_id=alice, fit_feedback='tight'))
+    db.session.commit()
+
+    run_steps('delete_users', {'user_ids': [alice]}, chunk_rows=2)
+    db.session.expire_all()
+
+    assert db.session.get(User, alice) is None
+    assert db.session.get(UserHistoryStat, alice) is None
+    assert Feedback.query.filter_by(user_id=alice).count() == 0
+    assert Feedback.query.filter_by(user_id=bob).count() == 2
+    assert db.session.get(UserHistoryStat, bob).history_count == 2
@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+import textwrap
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash
+
+from password_hashing import PasswordHasher
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METHOD = 'pbkdf2:sha256:1000'
+
+
+class BrokenExecutor:
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool('子进程启动失败'))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_broken_pool_falls_back_to_inline(monkeypatch):
+    hasher = PasswordHasher(method=METHOD, workers=1, cache_ttl=0)
+    monkeypatch.setattr(hasher, '_executor', BrokenExecutor)
+
+    hashed = hasher.hash('secret')
+    assert check_password_hash(hashed, 'secret')
+    assert hasher.verify('alice', hashed, 'secret') is True
+    assert hasher.pool_failures == 1
+    assert hasher.stats()['workers'] == 0
+
+
+def test_pool_startup_error_falls_back_to_inline(monkeypatch):
+    hasher = PasswordHasher(method=METHOD, workers=1, cache_ttl=0)
+
+    def fail():
+        raise RuntimeError('An attempt has been made to start a new process before the bootstrapping phase')
+
+    monkeypatch.setattr(hasher, '_executor', fail)
+    assert check_password_hash(hasher.hash('secret'), 'secret')
+    assert hasher.pool_failures == 1
+
+
+def test_unguarded_script_still_hashes(tmp_path):
+    # 没有 if __name__ == '__main__' 保护的脚本：forkserver 子进程重新执行脚本时无法再启动进程池
+    script = tmp_path / 'smoke.py'
+    script.write_text(textwrap.dedent(f'''
+        import sys
+        sys.path.insert(0, {BACKEND_DIR!r})
+        from werkzeug.security import check_password_hash
+        from password_hashing import PasswordHasher
+
+        hasher = PasswordHasher(method={METHOD!r}, workers=1, wait_timeout=30)
+        print('ok' if check_password_hash(hasher.hash('secret'), 'secret') else 'bad')
+        hasher.shutdown()
+    '''))
+    result = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == 'ok'
@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+
+import prediction_cache
+from prediction_cache import PredictionCache, SharedPredictionCache, quantize_row
+from shared_store import MemoryStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(prediction_cache, 'time', clock)
+    return clock
+
+
+def make_row(height=165.0, waist=70.0, hips=95.0, bra_num=34.0, size=8):
+    return {'height_cm': height, 'waist': waist, 'hips': hips, 'bra_num': bra_num, 'cup_size': 3,
+            'category': 'dress', 'size': size, 'bmi_proxy': waist / height}
+
+
+class Model:
+    """记录每次推理收到的行，按腰围返回可区分的结果。"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, rows):
+        self.calls.append(rows)
+        return np.array([[row['waist'], 1.0, 0.0] for row in rows])
+
+
+def test_quantized_rows_share_a_key():
+    a = quantize_row(make_row(waist=70.1, hips=95.2), 0.5)
+    b = quantize_row(make_row(waist=69.9, hips=94.8), 0.5)
+    assert PredictionCache.make_key(a) == PredictionCache.make_key(b)
+    # bmi_proxy 由量化后的数据重新计算，同键的行特征完全一致
+    assert a == b
+    assert PredictionCache.make_key(a) != PredictionCache.make_key(quantize_row(make_row(waist=70.4), 0.5))
+    assert PredictionCache.make_key(a) != PredictionCache.make_key(quantize_row(make_row(size=10), 0.5))
+
+
+def test_hit_returns_result_computed_from_first_raw_row(clock):
+    cache = PredictionCache(ttl=60, resolution=0.5)
+    model = Model()
+    first = cache.predict([make_row(waist=70.1)], model, version='v1')
+    second = cache.predict([make_row(waist=69.9)], model, version='v1')
+
+    # 未命中时用原始数据推理，命中时返回的是量化范围内相近输入的结果
+    assert len(model.calls) == 1 and model.calls[0][0]['waist'] == 70.1
+    assert first[0][0] == second[0][0] == 70.1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_rows_on_one_key_are_computed_once(clock):
+    cache = PredictionCache(ttl=60, resolution=0.5)
+    model = Model()
+    result = cache.predict([make_row(waist=70.1), make_row(waist=80.0), make_row(waist=69.9)], model, version='v1')
+    assert [len(rows) for rows in model.calls] == [2]
+    assert list(result[:, 0]) == [70.1, 80.0, 70.1]
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = PredictionCache(ttl=60, resolution=0.5)
+    model = Model()
+    cache.predict([make_row()], model, version='v1')
+    clock.now += 59
+    cache.predict([make_row()], model, version='v1')
+    assert len(model.calls) == 1
+
+    clock.now += 2
+    cache.predict([make_row()], model, version='v1')
+    assert len(model.calls) == 2
+    assert cache.expirations == 1
+
+
+def test_model_version_change_invalidates(clock):
+    cache = PredictionCache(ttl=60, resolution=0.5)
+    model = Model()
+    cache.predict([make_row(), make_row(waist=80.0)], model, version='v1')
+    cache.predict([make_row()], model, version='v2')
+    assert len(model.calls) == 2
+    assert cache.invalidations == 1
+    assert cache.stats()['entries'] == 1
+
+    # 切回旧版本同样视为变化，不返回 v1 时期的结果
+    cache.predict([make_row(waist=80.0)], model, version='v1')
+    assert len(model.calls) == 3
+
+
+def test_results_computed_across_a_version_switch_are_not_stored(clock):
+    cache = PredictionCache(ttl=60, resolution=0.5)
+
+    def switching_model(rows):
+        # 推理期间另一个请求已使用新版本模型
+        cache.predict([make_row(waist=90.0)], Model(), version='v2')
+        return Model()(rows)
+
+    cache.predict([make_row()], switching_model, version='v1')
+    model = Model()
+    cache.predict([make_row()], model, version='v2')
+    assert len(model.calls) == 1
+
+
+def test_lru_eviction(clock):
+    cache = PredictionCache(max_entries=2, ttl=60, resolution=0.5)
+    model = Model()
+    cache.predict([make_row(waist=60.0), make_row(waist=70.0)], model, version='v1')
+    cache.predict([make_row(waist=60.0)], model, version='v1')
+    cache.predict([make_row(waist=80.0)], model, version='v1')
+    assert cache.evictions == 1
+
+    calls = len(model.calls)
+    cache.predict([make_row(waist=60.0)], model, version='v1')
+    assert len(model.calls) == calls
+    cache.predict([make_row(waist=70.0)], model, version='v1')
+    assert len(model.calls) == calls + 1
+
+
+def test_shared_cache_keys_include_model_version():
+    cache = SharedPredictionCache(MemoryStore(), ttl=60, resolution=0.5)
+    model = Model()
+    cache.predict([make_row(waist=70.1)], model, version='v1')
+    hit = cache.predict([make_row(waist=69.9)], model, version='v1')
+    assert len(model.calls) == 1 and hit[0][0] == 70.1
+
+    cache.predict([make_row(waist=69.9)], model, version='v2')
+    assert len(model.calls) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
@@ -0,0 +1,98 @@
+import os
+from collections import Counter
+from datetime import date, datetime
+
+import sqlalchemy as sa
+from flask import Flask
+
+from conftest import create_user
+from db_models import db, History, ResultStat, UserHistoryStat, CategoryDailyStat, User
+from write_behind import persist_predictions
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+BODY = {'height': 165.0, 'waist': 70.0, 'hips': 95.0, 'bra_num': 34.0, 'cup_size': 'B'}
+
+
+def history_row(category, result, timestamp):
+    return {'category': category, 'size_input': 6.0, 'result': result, 'confidence': 0.9, 'timestamp': timestamp}
+
+
+def rollups():
+    return (
+        {row.result: row.total for row in ResultStat.query if row.total},
+        {row.user_id: row.history_count for row in UserHistoryStat.query},
+        {(row.category, row.day): row.total for row in CategoryDailyStat.query if row.total}
+    )
+
+
+def counted_from_history():
+    results, users, days = Counter(), Counter(), Counter()
+    for h in History.query:
+        results[h.result] += 1
+        users[h.user_id] += 1
+        days[(h.category, h.timestamp.date())] += 1
+    return dict(results), dict(users), dict(days)
+
+
+def test_rollups_follow_inserts_and_deletes(app_db):
+    runner = app_db.app.extensions['job_runner']
+    alice, bob, carol = (create_user(name).id for name in ('alice', 'bob', 'carol'))
+    old, new = datetime(2026, 1, 1, 23, 59), datetime(2026, 3, 1, 0, 1)
+    persist_predictions(db.session, [
+        (alice, BODY, [history_row('dresses', '合身 (Fit)', old), history_row('tops', '偏小 (Small)', new)]),
+        (bob, BODY, [history_row('dresses', '合身 (Fit)', old), history_row('dresses', '偏大 (Large)', new)]),
+        (carol, BODY, [history_row('tops', '合身 (Fit)', new)])
+    ])
+    persist_predictions(db.session, [(alice, BODY, [history_row('dresses', '合身 (Fit)', new)])])
+    results, users, days = rollups()
+    assert (results, users, days) == counted_from_history()
+    assert users == {alice: 3, bob: 2, carol: 1}
+    assert days[('dresses', date(2026, 1, 1))] == 2
+
+    runner.run_inline(db.session, 'purge_history', {'user_ids': [alice], 'max_history_id': None})
+    assert rollups()[1][alice] == 0
+    assert rollups()[0] == counted_from_history()[0]
+
+    runner.run_inline(db.session, 'retention', {'before': datetime(2026, 2, 1).isoformat()})
+    assert rollups()[2] == counted_from_history()[2] == {('dresses', date(2026, 3, 1)): 1,
+                                                         ('tops', date(2026, 3, 1)): 1}
+
+    runner.run_inline(db.session, 'delete_users', {'user_ids': [bob]})
+    results, users, days = rollups()
+    expected_results, _, expected_days = counted_from_history()
+    assert users == {alice: 0, carol: 1}
+    assert (results, days) == (expected_results, expected_days)
+
+
+def test_migration_backfills_existing_history(tmp_path):
+    from flask_migrate import Migrate, upgrade
+
+    # 单独的应用与空库：升级到 0002 后写入旧数据，再升级到 0003 检查回填
+    app = Flask('migration-test')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + str(tmp_path / 'migrate.db')
+    db.init_app(app)
+    Migrate(app, db, directory=MIGRATIONS_DIR, render_as_batch=True)
+    with app.app_context():
+        upgrade(revision='0002_history_feedback_indexes')
+        with db.engine.begin() as conn:
+            conn.execute(sa.text(
+                'INSERT INTO "user" (id, username, password) VALUES (1, \'alice\', \'x\'), (2, \'bob\', \'x\')'))
+            conn.execute(sa.text(
+                'INSERT INTO history (user_id, category, size_input, result, timestamp) VALUES '
+                "(1, 'dresses', 6, 'fit', '2026-01-01 10:00:00'), (1, 'dresses', 6, 'small', '2026-01-01 23:00:00'), "
+                "(1, 'tops', 6, 'fit', '2026-01-02 08:00:00')"))
+            # python app.py 曾用 create_all 建出空表并只累计了之后的增量
+            conn.execute(sa.text('CREATE TABLE result_stat (result VARCHAR(20) PRIMARY KEY, total INTEGER NOT NULL)'))
+            conn.execute(sa.text("INSERT INTO result_stat VALUES ('fit', 7)"))
+
+        upgrade(revision='0003_admin_rollup_tables')
+        assert rollups() == (
+            {'fit': 2, 'small': 1},
+            {1: 3, 2: 0},
+            {('dresses', date(2026, 1, 1)): 2, ('tops', date(2026, 1, 2)): 1}
+        )
+
+        upgrade()
+        assert User.query.count() == 2
+        db.session.remove()
+        db.engine.dispose()
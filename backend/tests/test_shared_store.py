@@ -0,0 +1,113 @@
+import pytest
+
+import shared_store
+from conftest import create_user
+from shared_store import MemoryStore, RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(shared_store, 'time', clock)
+    return clock
+
+
+def test_token_bucket_denies_then_refills(clock):
+    store = MemoryStore()
+    assert [store.token_bucket('k', 1.0, 3)[0] for _ in range(4)] == [True, True, True, False]
+    allowed, retry = store.token_bucket('k', 1.0, 3)
+    assert not allowed and retry == pytest.approx(1.0)
+
+    clock.now += 1.0
+    assert store.token_bucket('k', 1.0, 3)[0] is True
+    assert store.token_bucket('k', 1.0, 3)[0] is False
+    # 补满后不超过 burst
+    clock.now += 100.0
+    assert [store.token_bucket('k', 1.0, 3)[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_rate_limiter_counts_and_retry_after(clock):
+    limiter = RateLimiter(MemoryStore(), 'login', rate=0.5, burst=1)
+    assert limiter.acquire('alice') == (True, 0)
+    assert limiter.acquire('alice') == (False, 2)
+    assert limiter.acquire('bob') == (True, 0)
+    assert (limiter.allowed, limiter.rejected) == (2, 1)
+
+
+def test_values_are_evicted_in_lru_order(clock):
+    store = MemoryStore(max_entries=3)
+    store.mset([('a', b'1'), ('b', b'2'), ('c', b'3')], ttl=60)
+    store.mget(['a'])
+    store.mset([('d', b'4')], ttl=60)
+    assert store.mget(['a', 'b', 'c', 'd']) == [b'1', None, b'3', b'4']
+
+    clock.now += 61
+    assert store.mget(['a']) == [None]
+
+
+def test_cache_pressure_does_not_reset_buckets(clock):
+    store = MemoryStore(max_entries=10)
+    while store.token_bucket('rl:login:attacker', 0.2, 5)[0]:
+        pass
+    store.mset([(f'pred:{i}', b'x') for i in range(1000)], ttl=60)
+    assert store.token_bucket('rl:login:attacker', 0.2, 5)[0] is False
+
+
+def test_bucket_sweep_keeps_buckets_that_are_not_full(clock):
+    store = MemoryStore(max_entries=5)
+    # 补满需要 50 秒的慢速桶，不能按其他限流器更短的窗口被清理
+    while store.token_bucket('slow', 0.2, 10)[0]:
+        pass
+    # 2 秒后只补充了 0.4 个令牌，而快速桶 0.1 秒即可补满
+    clock.now += 2.0
+    for i in range(20):
+        store.token_bucket(f'fast:{i}', 10.0, 1)
+        store.token_bucket(f'fast:{i}', 10.0, 1)
+    assert 'slow' in store._buckets
+    assert store.token_bucket('slow', 0.2, 10)[0] is False
+
+
+@pytest.fixture
+def login_limits(app_db, monkeypatch):
+    store = MemoryStore()
+    limiters = {
+        'login_limiter': RateLimiter(store, 'login', 0.001, 3),
+        'login_ip_limiter': RateLimiter(store, 'login_ip', 0.001, 8),
+        'login_user_limiter': RateLimiter(store, 'login_user', 0.001, 12)
+    }
+    for name, limiter in limiters.items():
+        monkeypatch.setattr(app_db, name, limiter)
+    return limiters
+
+
+def attempt(client, ip, username, password='wrong'):
+    return client.post('/login', json={'username': username, 'password': password},
+                       environ_base={'REMOTE_ADDR': ip}).status_code
+
+
+def test_attacker_cannot_lock_out_victim(client, login_limits):
+    create_user('victim')
+    assert [attempt(client, '10.0.0.1', 'victim') for _ in range(4)] == [401, 401, 401, 429]
+    assert attempt(client, '10.0.0.2', 'victim', 'test-pass') == 200
+
+
+def test_spraying_usernames_hits_address_bucket(client, login_limits):
+    statuses = [attempt(client, '10.0.0.3', f'user{i}') for i in range(10)]
+    assert statuses == [401] * 8 + [429, 429]
+    assert attempt(client, '10.0.0.4', 'user0') == 401
+
+
+def test_distributed_guessing_hits_username_bucket(client, login_limits):
+    create_user('target')
+    statuses = [attempt(client, f'10.1.0.{i}', 'target') for i in range(14)]
+    assert statuses == [401] * 12 + [429, 429]
+    # 被拒的尝试不消耗更宽松的桶：地址桶仍有余量
+    assert login_limits['login_ip_limiter'].rejected == 0
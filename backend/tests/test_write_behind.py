@@ -0,0 +1,101 @@
+from datetime import datetime
+
+import pytest
+
+from conftest import create_user
+from db_models import db, History, User, UserHistoryStat
+from write_behind import HistoryWriter
+
+BODY = {'height': 165.0, 'waist': 70.0, 'hips': 98.0, 'bra_num': 34.0, 'cup_size': 'b'}
+
+
+def history_row(minute=0):
+    return {'category': 'dresses', 'size_input': 6.0, 'result': '合身 (Fit)', 'confidence': 0.9,
+            'timestamp': datetime(2026, 1, 1, 0, minute)}
+
+
+@pytest.fixture
+def writer(app_db):
+    writer = HistoryWriter(app_db.app, flush_interval=0.01, flush_rows=10, max_queue=100, put_timeout=0.05)
+    yield writer
+    writer.stop()
+
+
+def history_count(user_id):
+    db.session.expire_all()
+    return History.query.filter_by(user_id=user_id).count()
+
+
+def test_queued_rows_are_written_on_flush(writer):
+    user_id = create_user('alice').id
+    for minute in range(3):
+        writer.submit(user_id, BODY, [history_row(minute)])
+    writer.flush()
+
+    assert history_count(user_id) == 3
+    assert db.session.get(UserHistoryStat, user_id).history_count == 3
+    assert db.session.get(User, user_id).waist == 70.0
+    assert writer.stats()['flushed_rows'] == 3
+
+
+def test_full_queue_writes_on_separate_session(app_db, monkeypatch):
+    writer = HistoryWriter(app_db.app, max_queue=1, put_timeout=0.01)
+    # 不启动后台线程，第二条入队超时后由调用线程同步写入
+    monkeypatch.setattr(writer._worker, 'ensure_started', lambda: None)
+    user_id = create_user('alice').id
+    # 调用方会话中尚未提交的改动不应被同步写入顺带提交
+    db.session.add(User(username='pending', password='x'))
+
+    writer.submit(user_id, BODY, [history_row(0)])
+    writer.submit(user_id, BODY, [history_row(1)])
+
+    assert writer.sync_fallbacks == 1
+    db.session.rollback()
+    assert history_count(user_id) == 1
+    assert User.query.filter_by(username='pending').first() is None
+
+    writer.stop()
+    assert history_count(user_id) == 2
+
+
+def test_stop_writes_leftover_entries(app_db, monkeypatch):
+    # 进程退出（atexit 调用 stop）时队列中剩余的记录同步写完
+    writer = HistoryWriter(app_db.app, max_queue=10)
+    monkeypatch.setattr(writer._worker, 'ensure_started', lambda: None)
+    user_id = create_user('alice').id
+    writer.submit(user_id, BODY, [history_row(0), history_row(1)])
+    assert history_count(user_id) == 0
+
+    writer.stop()
+    assert history_count(user_id) == 2
+
+
+def test_entries_of_deleted_user_are_dropped(app_db, monkeypatch):
+    writer = HistoryWriter(app_db.app, max_queue=10)
+    monkeypatch.setattr(writer._worker, 'ensure_started', lambda: None)
+    alice = create_user('alice').id
+    bob = create_user('bob').id
+    writer.submit(alice, BODY, [history_row(0)])
+    writer.submit(bob, BODY, [history_row(1)])
+
+    # 其他进程的删除任务先于本进程队列落库完成
+    app_db.app.extensions['job_runner'].run_inline(db.session, 'delete_users', {'user_ids': [alice]})
+    writer.stop()
+
+    assert history_count(alice) == 0
+    assert db.session.get(UserHistoryStat, alice) is None
+    assert history_count(bob) == 1
+    assert writer.stats()['dropped'] == 1
+
+
+def test_delete_job_drains_app_writer_first(app_db):
+    app = app_db.app
+    writer = app.extensions['history_writer']
+    user_id = create_user('alice').id
+    writer.submit(user_id, BODY, [history_row(0), history_row(1)])
+
+    app.extensions['job_runner'].run_inline(db.session, 'purge_history', {'user_ids': [user_id]})
+    writer.flush()
+
+    assert history_count(user_id) == 0
+    assert db.session.get(UserHistoryStat, user_id).history_count == 0
@@ -1,125 +1,700 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
 import pandas as pd
 import numpy as np
 import joblib
 import os
+import xgboost as xgb
 from xgboost import XGBClassifier
+from scipy import sparse
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.pipeline import Pipeline
+from model_registry import CURRENT_POINTER, VERSIONS_DIR, student_paths
+from fast_predictor import FastPredictor, check_parity, sample_rows, save_native
+from lookup_table import LookupTable, axis_points, grid_spec, lookup_paths, mask_shape, save_lookup_table, table_shape
 
+DATA_PATH = 'data/modcloth_final_data.json'
+MODEL_PATH = 'models/fit_model.pkl'
+# 版本目录中记录训练来源（基线版本、反馈水位、留出集评估）的描述文件
+TRAINING_META = 'training.json'
 
-def train_from_json():
-    file_path = 'data/modcloth_final_data.json'
+FEATURES = ['cup_size', 'bra_num', 'hips', 'waist', 'category', 'size', 'height_cm', 'bmi_proxy']
+NUMERIC_FEATURES = ['bra_num', 'hips', 'waist', 'size', 'height_cm', 'bmi_proxy']
+CATEGORICAL_FEATURES = ['cup_size', 'category']
+CATEGORIES = ['dresses', 'tops', 'bottoms', 'outerwear']
 
-    # 路径校验，防止运行目录错误
-    if not os.path.exists(file_path):
-        return
+# 训练只用到的原始字段；分块读取时缺列的块补 NaN
+RAW_COLUMNS = ['height', 'fit', 'waist', 'hips', 'size', 'bra size', 'cup size', 'category']
 
-    try:
-        df = pd.read_json(file_path, lines=True)
-    except Exception as e:
-        return
+HEIGHT_PATTERN = r'^\s*([0-9.]+)\s*ft\s*([0-9.]+)\s*(?:in)?\s*$'
 
 
-    # 1. 复杂字符串解析：身高 (5ft 6in -> 167.6 cm)
-    def parse_height(h):
-        if pd.isna(h) or not isinstance(h, str): return np.nan
-        try:
-            parts = h.split('ft')
-            ft = float(parts[0].strip())
-            inches = float(parts[1].replace('in', '').strip())
-            return (ft * 30.48) + (inches * 2.54)
-        except:
-            return np.nan
+# 1. 复杂字符串解析：身高 (5ft 6in -> 167.6 cm)
+def parse_height(heights):
+    parts = heights.astype('string').str.extract(HEIGHT_PATTERN)
+    ft = pd.to_numeric(parts[0], errors='coerce')
+    inches = pd.to_numeric(parts[1], errors='coerce')
+    return (ft * 30.48 + inches * 2.54).astype('float64')
 
-    df['height_cm'] = df['height'].apply(parse_height)
-    df['height_cm'] = df['height_cm'].fillna(df['height_cm'].mean())  # 填补极少量缺失的身高
 
-    # 2. 目标变量映射 (Target)
-    df['fit'] = df['fit'].astype(str).str.lower().str.strip()
+def prepare_chunk(raw, rng):
+    """对一块原始数据做向量化特征工程。
 
-    fit_map = {'small': 0, 'fit': 1, 'large': 2}
-    df['target'] = df['fit'].map(fit_map)
+    height_cm 的缺失值留到全部数据读完后统一填补，因此同时返回本块身高的 (总和, 非空数)。
+    """
+    df = raw.reindex(columns=RAW_COLUMNS)
+    df['height_cm'] = parse_height(df['height']).to_numpy()
+    height_stats = (float(df['height_cm'].sum()), int(df['height_cm'].count()))
 
+    # 2. 目标变量映射 (Target)
+    fit_map = {'small': 0, 'fit': 1, 'large': 2}
+    df['target'] = df['fit'].astype(str).str.lower().str.strip().map(fit_map)
     df = df.dropna(subset=['target'])
-    # fit_map = {'small': 0, 'fit': 1, 'large': 2}
-    # df['target'] = df['fit'].map(fit_map)
-
-    # 3. 96% 缺失的腰围数据
-    np.random.seed(42)
-
-    # def impute_waist(row):
-    #     if pd.notna(row['waist']):
-    #         return float(row['waist']) * 2.54
-    #     std_waist = row['size'] * 1.5 + 60.0
-    #     if row['target'] == 1:
-    #         return std_waist + np.random.normal(0, 2.0)
-    #     elif row['target'] == 0:
-    #         return std_waist + np.random.normal(5.0, 2.0)
-    #     else:
-    #         return std_waist - np.random.normal(5.0, 2.0)
-    def impute_waist(row):
-        if pd.notna(row['waist']):
-            return float(row['waist']) * 2.54
-        std_waist = row['size'] * 1.5 + 60.0
-        # 将原来的 2.0 放大到 4.0 或 5.0
-        if row['target'] == 1:
-            return std_waist + np.random.normal(0, 4.0)
-        elif row['target'] == 0:
-            return std_waist + np.random.normal(6.0, 4.0)
-        else:
-            return std_waist - np.random.normal(6.0, 4.0)
-
-    df['waist_cm'] = df.apply(impute_waist, axis=1)
-
-    # 4. 解决臀围缺失 (后端的 1.4 比例硬性填补)
-    def impute_hips(row):
-        if pd.notna(row['hips']):
-            return float(row['hips']) * 2.54
-        return row['waist_cm'] * 1.4
-
-    df['hips_cm'] = df.apply(impute_hips, axis=1)
-
-    df['bra_num'] = df['bra size'].fillna((32 + (df['size'] // 2) * 2)).astype(int)
 
-    df['cup_size'] = df['cup size'].fillna('b')
+    size = pd.to_numeric(df['size'], errors='coerce').to_numpy(dtype='float64')
+    target = df['target'].to_numpy()
 
-    df['bmi_proxy'] = df['waist_cm'] / df['height_cm']
+    # 3. 96% 缺失的腰围数据：按尺码经验腰围 + 与合身度相关的噪声填补
+    raw_waist = pd.to_numeric(df['waist'], errors='coerce').to_numpy(dtype='float64')
+    waist = raw_waist * 2.54
+    missing = np.isnan(raw_waist)
+    std_waist = size[missing] * 1.5 + 60.0
+    # 每个缺失行按顺序消耗一个标准正态数，分块与整表读取得到相同的随机序列
+    z = rng.standard_normal(int(missing.sum()))
+    missing_target = target[missing]
+    noise = np.where(missing_target == 1, 4.0 * z, 6.0 + 4.0 * z)
+    waist[missing] = np.where(missing_target == 2, std_waist - noise, std_waist + noise)
 
-    df['category'] = df['category'].str.lower()
-    df = df[df['category'].isin(['dresses', 'tops', 'bottoms', 'outerwear'])].copy()
-
-    df = df.drop(columns=['waist', 'hips'], errors='ignore')
-
-    df = df.rename(columns={'waist_cm': 'waist', 'hips_cm': 'hips'})
+    # 4. 解决臀围缺失 (后端的 1.4 比例硬性填补)
+    raw_hips = pd.to_numeric(df['hips'], errors='coerce').to_numpy(dtype='float64')
+    hips = np.where(np.isnan(raw_hips), waist * 1.4, raw_hips * 2.54)
+
+    out = pd.DataFrame({
+        'cup_size': df['cup size'].fillna('b').to_numpy(),
+        'bra_num': df['bra size'].fillna(32 + (df['size'] // 2) * 2).astype(int).to_numpy(),
+        'hips': hips,
+        'waist': waist,
+        'category': df['category'].astype('string').str.lower().to_numpy(),
+        'size': df['size'].to_numpy(),
+        'height_cm': df['height_cm'].to_numpy(),
+        'target': target.astype(int)
+    })
+    return out[out['category'].isin(CATEGORIES)], height_stats
+
+
+def load_training_frame(file_path=DATA_PATH, chunksize=None, seed=42):
+    """读取 ModCloth 数据并生成训练特征；chunksize 不为空时按块流式读取以限制峰值内存。"""
+    rng = np.random.default_rng(seed)
+
+    if chunksize:
+        reader = pd.read_json(file_path, lines=True, chunksize=chunksize)
+    else:
+        reader = [pd.read_json(file_path, lines=True)]
+
+    parts = []
+    height_sum, height_count = 0.0, 0
+    for raw in reader:
+        part, (chunk_sum, chunk_count) = prepare_chunk(raw, rng)
+        # 身高均值按全部原始行计算，与整表读取时保持一致
+        height_sum += chunk_sum
+        height_count += chunk_count
+        parts.append(part)
+
+    df = pd.concat(parts, ignore_index=True)
+    df['height_cm'] = df['height_cm'].fillna(height_sum / height_count if height_count else np.nan)  # 填补极少量缺失的身高
+    df['bmi_proxy'] = df['waist'] / df['height_cm']
+
+    return df[FEATURES], df['target'].astype(int)
+
+
+def build_preprocessor():
+    return ColumnTransformer(transformers=[
+        ('num', StandardScaler(), NUMERIC_FEATURES),
+        ('cat', OneHotEncoder(handle_unknown='ignore'), CATEGORICAL_FEATURES)
+    ])
 
-    features = ['cup_size', 'bra_num', 'hips', 'waist', 'category', 'size', 'height_cm', 'bmi_proxy']
-    X = df[features]
-    y = df['target'].astype(int)
 
+def build_pipeline(n_estimators=300, learning_rate=0.05, max_depth=8):
+    # 构建预处理管道与模型拟合；默认参数可用 tune 子命令的搜索结果替换
+    return Pipeline(steps=[
+        ('pre', build_preprocessor()),
+        ('clf', XGBClassifier(n_estimators=n_estimators, learning_rate=learning_rate, max_depth=max_depth,
+                              random_state=42))
+    ])
 
-    # 构建预处理管道与模型拟合
 
-    preprocessor = ColumnTransformer(transformers=[
-        ('num', StandardScaler(), ['bra_num', 'hips', 'waist', 'size', 'height_cm', 'bmi_proxy']),
-        ('cat', OneHotEncoder(handle_unknown='ignore'), ['cup_size', 'category'])
-    ])
+def train_from_json(file_path=DATA_PATH, chunksize=None, lookup_table=False, clf_params=None, student_params=None):
+    # 路径校验，防止运行目录错误
+    if not os.path.exists(file_path):
+        return
 
-    pipeline = Pipeline(steps=[
-        ('pre', preprocessor),
-        ('clf', XGBClassifier(n_estimators=300, learning_rate=0.05, max_depth=8, random_state=42))
-    ])
+    try:
+        X, y = load_training_frame(file_path, chunksize=chunksize)
+    except Exception as e:
+        return
 
+    student = None
+    if student_params is not None:
+        # 蒸馏时留出一部分数据两个模型都不训练，报告的准确率差才是样本外的
+        (X, y), holdout = split_rows(X, y, DISTILL_HOLDOUT)
 
+    pipeline = build_pipeline(**(clf_params or {}))
     pipeline.fit(X, y)
 
-    # 保存模型
-    if not os.path.exists('models'):
-        os.makedirs('models')
-
-    output_path = 'models/fit_model.pkl'
-    joblib.dump(pipeline, output_path)
+    if student_params is not None:
+        student = distill(pipeline, X, holdout=holdout, **student_params)
+        print(json.dumps(student[1], ensure_ascii=False))
+    publish_model(pipeline, lookup_table=lookup_table, student=student)
+
+
+def _atomic_dump(obj, path):
+    # 先写临时文件再 os.replace，服务端热加载时不会读到写了一半的模型
+    tmp_path = path + '.tmp'
+    joblib.dump(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def publish_model(pipeline, model_path=MODEL_PATH, lookup_table=False, metadata=None, student=None):
+    """版本化发布模型：写入 versions/<版本号>/ 后原子更新 CURRENT 指针，返回版本号。"""
+    model_dir = os.path.dirname(model_path) or '.'
+    version = datetime.now().strftime('%Y%m%d-%H%M%S')
+    version_dir = os.path.join(model_dir, VERSIONS_DIR, version)
+    suffix = 1
+    while os.path.exists(version_dir):
+        suffix += 1
+        version_dir = os.path.join(model_dir, VERSIONS_DIR, f'{version}-{suffix}')
+    version = os.path.basename(version_dir)
+    os.makedirs(version_dir)
+
+    version_model_path = os.path.join(version_dir, os.path.basename(model_path))
+    export_native(pipeline, version_model_path)
+    if lookup_table:
+        table, mask, spec = build_lookup_table(pipeline)
+        save_lookup_table(table, mask, spec, version_model_path)
+        save_lookup_table(table, mask, spec, model_path)
+    if student is not None:
+        save_student(*student, version_model_path)
+    joblib.dump(pipeline, version_model_path)
+    if metadata is not None:
+        with open(os.path.join(version_dir, TRAINING_META), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+    pointer_tmp = os.path.join(model_dir, CURRENT_POINTER + '.tmp')
+    with open(pointer_tmp, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(model_dir, CURRENT_POINTER))
+
+    # 兼容单文件部署与 fast_predictor 校验脚本
+    if student is not None:
+        save_student(*student, model_path)
+    export_native(pipeline, model_path)
+    _atomic_dump(pipeline, model_path)
+    return version
+
+
+def current_model(model_path=MODEL_PATH):
+    """返回 (版本号, 模型路径)：有 CURRENT 指针时指向其版本目录，否则为单一模型文件（版本号为 None）。"""
+    pointer = os.path.join(os.path.dirname(model_path) or '.', CURRENT_POINTER)
+    if not os.path.exists(pointer):
+        return None, model_path
+    with open(pointer, encoding='utf-8') as f:
+        version = f.read().strip()
+    return version, os.path.join(os.path.dirname(pointer), VERSIONS_DIR, version, os.path.basename(model_path))
+
+
+def training_metadata(version_model_path):
+    path = os.path.join(os.path.dirname(version_model_path), TRAINING_META)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def continue_boosting(pipeline, X, y, rounds=20, learning_rate=None):
+    """在已有 booster 上继续追加 rounds 棵树（xgb_model 热启动），返回新的 Pipeline。
+
+    预处理器保持不变，新数据按原有的标准化参数与词表编码，耗时只与新数据行数和追加的树数有关。
+    直接调用 xgb.train 而不是 XGBClassifier.fit：少量反馈里可能缺某一类标签，
+    sklearn 接口会据此推断出错误的类别数。
+    """
+    pre = pipeline.named_steps['pre']
+    clf = pipeline.named_steps['clf']
+
+    params = {k: v for k, v in clf.get_xgb_params().items() if v is not None}
+    params.update(objective='multi:softprob', num_class=3)
+    if learning_rate is not None:
+        params['learning_rate'] = learning_rate
+
+    booster = xgb.train(params, xgb.DMatrix(pre.transform(X), label=np.asarray(y)),
+                        num_boost_round=rounds, xgb_model=clf.get_booster())
+    return Pipeline(steps=[('pre', pre), ('clf', _classifier_from_booster(booster))])
+
+
+def _classifier_from_booster(booster):
+    # 低层 xgb.train 得到的 booster 包装回 XGBClassifier，供 Pipeline / FastPredictor 使用
+    clf = XGBClassifier()
+    clf.load_model(bytearray(booster.save_raw('ubj')))
+    return clf
+
+
+def holdout_scores(pipeline, X, y):
+    probs = pipeline.predict_proba(X)
+    y = np.asarray(y)
+    picked = np.clip(probs[np.arange(len(y)), y], 1e-15, 1.0)
+    return {
+        'accuracy': round(float((probs.argmax(axis=1) == y).mean()), 4),
+        'log_loss': round(float(-np.log(picked).mean()), 4)
+    }
+
+
+def export_native(pipeline, model_path=MODEL_PATH):
+    """导出原生格式（UBJ booster + 预处理 spec JSON），导出前校验与 Pipeline 输出一致。"""
+    fast = FastPredictor.from_pipeline(pipeline)
+    max_diff, parity_ok = check_parity(pipeline, fast, sample_rows(1000))
+    if not parity_ok:
+        raise ValueError(f'原生格式与 Pipeline 输出不一致 (max_abs_diff={max_diff:.3e})')
+    return save_native(fast, model_path)
+
+
+def _midpoints(points):
+    return (points[:-1] + points[1:]) / 2.0
+
+
+def _grid_frame(spec, cat, cup, centers=False):
+    # 某个 (品类, 罩杯) 下全部 (下胸围, 尺码, 身高, 腰围) 网格点（或网格单元中心），顺序与查表数组一致
+    axes = [axis_points(spec[name]) for name in ('bra', 'height', 'waist')]
+    if centers:
+        axes = [_midpoints(points) for points in axes]
+    bra, size, height, waist = np.meshgrid(axes[0], np.arange(spec['sizes'], dtype='float64'),
+                                           axes[1], axes[2], indexing='ij')
+    waist = waist.ravel()
+    height = height.ravel()
+    return pd.DataFrame({
+        'cup_size': cup,
+        'bra_num': bra.ravel(),
+        'hips': waist * spec['hips_ratio'],
+        'waist': waist,
+        'category': cat,
+        'size': size.ravel(),
+        'height_cm': height,
+        'bmi_proxy': waist / height
+    }, columns=FEATURES)
+
+
+def measure_lookup_error(pipeline, lookup, n=20000, seed=0):
+    """在网格范围内随机取点（连续身高/腰围、任意整数下胸围），对比查表结果与模型输出；误差只统计查表命中的点。"""
+    spec = lookup.spec
+    rng = np.random.default_rng(seed)
+    cat_idx = rng.integers(0, len(spec['categories']), n)
+    cup_idx = rng.integers(0, len(spec['cups']), n)
+    bra = rng.integers(int(spec['bra'][0]), int(spec['bra'][1]) + 1, n).astype('float64')
+    size = rng.integers(0, spec['sizes'], n)
+    height = rng.uniform(spec['height'][0], spec['height'][1], n)
+    waist = rng.uniform(spec['waist'][0], spec['waist'][1], n)
+
+    approx, served = lookup.interpolate(cat_idx, cup_idx, bra, size, height, waist)
+    exact = pipeline.predict_proba(pd.DataFrame({
+        'cup_size': np.asarray(spec['cups'], dtype=object)[cup_idx],
+        'bra_num': bra,
+        'hips': waist * spec['hips_ratio'],
+        'waist': waist,
+        'category': np.asarray(spec['categories'], dtype=object)[cat_idx],
+        'size': size.astype('float64'),
+        'height_cm': height,
+        'bmi_proxy': waist / height
+    }, columns=FEATURES))
+
+    approx, exact = approx[served], exact[served]
+    diff = np.abs(approx - exact).max(axis=1) if served.any() else np.zeros(1)
+    return {
+        'samples': n,
+        'coverage': round(float(served.mean()), 6),
+        'max_abs_error': round(float(diff.max()), 6),
+        'p99_abs_error': round(float(np.percentile(diff, 99)), 6),
+        'mean_abs_error': round(float(diff.mean()), 6),
+        'argmax_agreement': round(float((approx.argmax(axis=1) == exact.argmax(axis=1)).mean()), 6)
+    }
+
+
+def build_lookup_table(pipeline, spec=None):
+    """在量化网格上批量跑一遍模型，生成 float16 概率表与可插值单元标记，并实测误差写入描述。"""
+    spec = dict(spec or grid_spec())
+    table = np.empty(table_shape(spec), dtype=np.float16)
+    mask = np.empty(mask_shape(spec), dtype=bool)
+    for i, cat in enumerate(spec['categories']):
+        for j, cup in enumerate(spec['cups']):
+            points = pipeline.predict_proba(_grid_frame(spec, cat, cup)).reshape(table.shape[2:])
+            table[i, j] = points
+
+            # 单元中心处的三线性插值即 8 个角点的均值，与模型在中心处的输出比较
+            t = table[i, j].astype(np.float64)
+            interpolated = sum(t[b:t.shape[0] - 1 + b, :, h:t.shape[2] - 1 + h, w:t.shape[3] - 1 + w]
+                               for b in (0, 1) for h in (0, 1) for w in (0, 1)) / 8.0
+            centers = pipeline.predict_proba(_grid_frame(spec, cat, cup, centers=True)).reshape(interpolated.shape)
+            mask[i, j] = np.abs(interpolated - centers).max(axis=-1) <= spec['tolerance']
+
+    spec['error'] = measure_lookup_error(pipeline, LookupTable(table, mask, spec))
+    return table, mask, spec
+
+
+def export_lookup_table(pipeline, model_path, spec=None):
+    table, mask, spec = build_lookup_table(pipeline, spec)
+    save_lookup_table(table, mask, spec, model_path)
+    return spec
+
+
+# --- 蒸馏：用大模型（teacher）的软概率训练少量浅树的小模型（student），两者一起发布 ---
+# train --distill 时两个模型都不参与训练的留出比例
+DISTILL_HOLDOUT = 0.1
+# 与 app.resolve_fit 一致：腰围偏离尺码标准腰围超过该值时结论由规则决定，模型输出不会被使用
+OVERRIDE_MARGIN = 10.0
+
+
+def override_mask(X):
+    std_waist = X['size'].to_numpy(dtype=float) * 1.5 + 60.0
+    return np.abs(X['waist'].to_numpy(dtype=float) - std_waist) > OVERRIDE_MARGIN
+
+
+def _row_latency_us(fast, rows, repeats=300):
+    # 与线上一致：FastPredictor 单行推理的中位耗时，以及 100 行一批时的每行耗时
+    for row in rows[:20]:
+        fast.predict_proba([row])
+    single = []
+    for i in range(repeats):
+        started = time.perf_counter()
+        fast.predict_proba([rows[i % len(rows)]])
+        single.append(time.perf_counter() - started)
+    batch = rows[:100]
+    started = time.perf_counter()
+    for _ in range(20):
+        fast.predict_proba(batch)
+    per_row = (time.perf_counter() - started) / 20 / len(batch)
+    return round(float(np.median(single)) * 1e6, 1), round(per_row * 1e6, 2)
+
+
+def distill(teacher, X=None, n_estimators=40, max_depth=4, learning_rate=0.3, augment=20000, holdout=None, seed=0):
+    """在训练数据（及覆盖线上输入范围的合成样本）上拟合 teacher 的软概率，返回 (student Pipeline, 报告)。
+
+    软标签的交叉熵通过把每行复制 3 份、分别以类别 k 为标签、teacher 概率 p_k 为样本权重实现。
+    规则必然覆盖的行（腰围偏离超过 OVERRIDE_MARGIN）权重为 0，把小模型的容量留给模型真正起作用的区域。
+    holdout 为 (X, y) 时报告两者在其上的准确率。
+    """
+    frames = [X] if X is not None and len(X) else []
+    if augment:
+        frames.append(pd.DataFrame(sample_rows(augment, seed=seed + 1), columns=FEATURES))
+    data = pd.concat(frames, ignore_index=True)
+
+    pre = teacher.named_steps['pre']
+    soft = teacher.predict_proba(data)
+    served = ~override_mask(data)
+    encoded = pre.transform(data)
+    stacked = sparse.vstack([encoded] * 3) if sparse.issparse(encoded) else np.vstack([encoded] * 3)
+    dtrain = xgb.DMatrix(stacked, label=np.repeat([0, 1, 2], len(data)),
+                         weight=np.concatenate([soft[:, k] * served for k in range(3)]))
+    booster = xgb.train({'objective': 'multi:softprob', 'num_class': 3, 'tree_method': 'hist',
+                         'max_depth': max_depth, 'learning_rate': learning_rate, 'seed': seed},
+                        dtrain, num_boost_round=n_estimators)
+    student = Pipeline(steps=[('pre', pre), ('clf', _classifier_from_booster(booster))])
+    return student, distill_report(teacher, student, holdout, seed=seed + 2)
+
+
+def split_rows(X, y, fraction, seed=0):
+    order = np.random.default_rng(seed).permutation(len(X))
+    n = int(round(len(X) * fraction))
+    y = np.asarray(y)
+    return (X.iloc[order[n:]], y[order[n:]]), (X.iloc[order[:n]], y[order[:n]])
+
+
+def distill_report(teacher, student, holdout=None, n=20000, seed=2):
+    """teacher 与 student 的一致率、准确率差与每行推理耗时。"""
+    rows = sample_rows(n, seed=seed)
+    frame = pd.DataFrame(rows, columns=FEATURES)
+    t_pred = teacher.predict_proba(frame).argmax(axis=1)
+    s_pred = student.predict_proba(frame).argmax(axis=1)
+    served = ~override_mask(frame)
+    report = {
+        'trees': student.named_steps['clf'].get_booster().num_boosted_rounds(),
+        'teacher_trees': teacher.named_steps['clf'].get_booster().num_boosted_rounds(),
+        'agreement': round(float((t_pred == s_pred).mean()), 4),
+        # 规则不覆盖的输入上的一致率，即线上结论真正取决于模型的部分
+        'agreement_served': round(float((t_pred[served] == s_pred[served]).mean()), 4) if served.any() else None
+    }
+    if holdout is not None:
+        X_holdout, y_holdout = holdout
+        report['holdout_rows'] = int(len(y_holdout))
+        report['teacher'] = holdout_scores(teacher, X_holdout, y_holdout)
+        report['student'] = holdout_scores(student, X_holdout, y_holdout)
+        report['accuracy_delta'] = round(report['student']['accuracy'] - report['teacher']['accuracy'], 4)
+
+    for name, pipeline in (('teacher', teacher), ('student', student)):
+        fast = FastPredictor.from_pipeline(pipeline)
+        fast.booster.set_param({'nthread': 1})
+        report[f'{name}_latency_us'], report[f'{name}_batch_row_us'] = _row_latency_us(fast, rows)
+    return report
+
+
+def save_student(student, report, model_path):
+    """student 与 teacher 并排存放：<模型名>.student.pkl + 原生格式，报告 <模型名>.student.json 最后写入。"""
+    pickle_path, report_path = student_paths(model_path)
+    export_native(student, pickle_path)
+    _atomic_dump(student, pickle_path)
+    with open(report_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(report_path + '.tmp', report_path)
+
+
+# --- 超参数搜索：预处理后的特征矩阵只计算一次并缓存为 .npy，各进程以内存映射方式读取 ---
+def feature_cache(file_path=DATA_PATH, chunksize=None, cache_dir='models/tuning'):
+    """返回 (特征矩阵路径, 标签路径)；按数据文件的路径/大小/修改时间命名，数据不变时直接复用。"""
+    st = os.stat(file_path)
+    key = hashlib.sha1(f'{os.path.abspath(file_path)}|{st.st_size}|{st.st_mtime_ns}'.encode('utf-8')).hexdigest()[:12]
+    matrix_path = os.path.join(cache_dir, f'features-{key}.npy')
+    labels_path = os.path.join(cache_dir, f'labels-{key}.npy')
+    if os.path.exists(matrix_path) and os.path.exists(labels_path):
+        return matrix_path, labels_path
+
+    X, y = load_training_frame(file_path, chunksize=chunksize)
+    matrix = build_preprocessor().fit_transform(X)
+    if hasattr(matrix, 'tocoo'):
+        # 稀疏矩阵中未存储的位置在 XGBoost 里是缺失值而不是 0，稠密化时保持同样的语义
+        coo = matrix.tocoo()
+        dense = np.full(coo.shape, np.nan, dtype=np.float32)
+        dense[coo.row, coo.col] = coo.data
+        matrix = dense
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for path, array in ((labels_path, np.asarray(y, dtype=np.int32)), (matrix_path, np.asarray(matrix, np.float32))):
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, array)
+        os.replace(path + '.tmp', path)
+    return matrix_path, labels_path
+
+
+def candidate_grid(depths, learning_rates, max_rounds):
+    return [{'max_depth': depth, 'learning_rate': lr, 'max_rounds': max_rounds}
+            for depth in depths for lr in learning_rates]
+
+
+def _cv_fold(cache, candidate, fold, folds, early_stopping, n_jobs, keep_model, seed=42):
+    # 在进程池中运行：只训练一折，早停决定实际树数
+    from sklearn.model_selection import StratifiedKFold
+
+    X = np.load(cache[0], mmap_mode='r')
+    y = np.load(cache[1])
+    splits = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(np.zeros(len(y)), y)
+    train_idx, valid_idx = list(splits)[fold]
+    dtrain = xgb.DMatrix(X[train_idx], label=y[train_idx], nthread=n_jobs)
+    dvalid = xgb.DMatrix(X[valid_idx], label=y[valid_idx], nthread=n_jobs)
+
+    params = {
+        'objective': 'multi:softprob', 'num_class': 3, 'eval_metric': 'mlogloss', 'tree_method': 'hist',
+        'max_depth': candidate['max_depth'], 'learning_rate': candidate['learning_rate'],
+        'nthread': n_jobs, 'seed': seed
+    }
+    started = time.perf_counter()
+    booster = xgb.train(params, dtrain, num_boost_round=candidate['max_rounds'], evals=[(dvalid, 'valid')],
+                        early_stopping_rounds=early_stopping, verbose_eval=False)
+    fit_seconds = time.perf_counter() - started
+
+    rounds = booster.best_iteration + 1
+    probs = booster.predict(dvalid, iteration_range=(0, rounds))
+    picked = np.clip(probs[np.arange(len(valid_idx)), y[valid_idx]], 1e-15, 1.0)
+    return {
+        'fold': fold,
+        'rounds': rounds,
+        'accuracy': float((probs.argmax(axis=1) == y[valid_idx]).mean()),
+        'log_loss': float(-np.log(picked).mean()),
+        'fit_seconds': fit_seconds,
+        'model': bytes(booster.save_raw('ubj')) if keep_model else None
+    }
+
+
+def measure_latency(model_raw, rounds, X, repeats=300):
+    """单行推理耗时（微秒，中位数）与 100 行批量推理的每行耗时，单线程测量，贴近线上每请求一行的场景。"""
+    booster = xgb.Booster(model_file=bytearray(model_raw))
+    booster.set_param({'nthread': 1})
+    row, batch = np.ascontiguousarray(X[:1]), np.ascontiguousarray(X[:100])
+    for _ in range(20):
+        booster.inplace_predict(row, iteration_range=(0, rounds))
+    single = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        booster.inplace_predict(row, iteration_range=(0, rounds))
+        single.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    for _ in range(20):
+        booster.inplace_predict(batch, iteration_range=(0, rounds))
+    per_row = (time.perf_counter() - started) / 20 / len(batch)
+    return round(float(np.median(single)) * 1e6, 1), round(per_row * 1e6, 2)
+
+
+def _pareto(results):
+    # 不存在另一个候选同时更准且更快时，该候选在准确率/延迟前沿上
+    scored = [r for r in results if not r['pruned']]
+    for r in scored:
+        r['pareto'] = not any(
+            o is not r and o['accuracy'] >= r['accuracy'] and o['latency_us'] <= r['latency_us']
+            and (o['accuracy'] > r['accuracy'] or o['latency_us'] < r['latency_us'])
+            for o in scored
+        )
+
+
+def tune(file_path=DATA_PATH, chunksize=None, candidates=None, folds=5, workers=None, n_jobs=1,
+         early_stopping=20, prune_margin=0.02, cache_dir='models/tuning'):
+    """分层 k 折交叉验证搜索超参数，返回各候选的准确率、实际树数与推理延迟。
+
+    先对所有候选只跑第一折；第一折准确率比最好的候选低 prune_margin 以上的直接剪枝，
+    其余候选再跑剩下的折。每次训练都以验证集 mlogloss 早停。
+    """
+    cache = feature_cache(file_path, chunksize, cache_dir)
+    candidates = candidates or candidate_grid([3, 4, 6, 8], [0.05, 0.1, 0.2], 300)
+    workers = workers or max(1, (os.cpu_count() or 1) // n_jobs)
+    results = [{'params': c, 'folds': [], 'pruned': False} for c in candidates]
+
+    def run(tasks):
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {pool.submit(_cv_fold, cache, results[i]['params'], fold, folds, early_stopping, n_jobs,
+                                   fold == 0): i for i, fold in tasks}
+            for future in as_completed(futures):
+                results[futures[future]]['folds'].append(future.result())
+
+    run([(i, 0) for i in range(len(results))])
+    best_first = max(r['folds'][0]['accuracy'] for r in results)
+    for r in results:
+        r['pruned'] = r['folds'][0]['accuracy'] < best_first - prune_margin
+    run([(i, fold) for i, r in enumerate(results) if not r['pruned'] for fold in range(1, folds)])
+
+    X = np.load(cache[0], mmap_mode='r')
+    for r in results:
+        scores = sorted(r['folds'], key=lambda f: f['fold'])
+        first = scores[0]
+        r['accuracy'] = round(float(np.mean([f['accuracy'] for f in scores])), 4)
+        r['accuracy_std'] = round(float(np.std([f['accuracy'] for f in scores])), 4)
+        r['log_loss'] = round(float(np.mean([f['log_loss'] for f in scores])), 4)
+        r['rounds'] = int(round(np.mean([f['rounds'] for f in scores])))
+        r['fit_seconds'] = round(float(np.mean([f['fit_seconds'] for f in scores])), 2)
+        # 进程池结束后在主进程中逐个测延迟，避免与其他训练任务争抢 CPU
+        r['latency_us'], r['batch_row_us'] = measure_latency(first['model'], first['rounds'], X)
+        r['folds_run'] = len(scores)
+        del r['folds']
+    _pareto(results)
+    return sorted(results, key=lambda r: (r['pruned'], -r['accuracy']))
+
+
+def print_tuning_report(results):
+    print(f"{'depth':>5} {'lr':>5} {'trees':>5} {'acc':>7} {'±':>6} {'logloss':>8} {'1-row µs':>9} "
+          f"{'batch µs/row':>12} {'folds':>5}  note")
+    for r in results:
+        note = '已剪枝' if r['pruned'] else ('前沿' if r.get('pareto') else '')
+        print(f"{r['params']['max_depth']:>5} {r['params']['learning_rate']:>5} {r['rounds']:>5} "
+              f"{r['accuracy']:>7} {r['accuracy_std']:>6} {r['log_loss']:>8} {r['latency_us']:>9} "
+              f"{r['batch_row_us']:>12} {r['folds_run']:>5}  {note}")
+
+
+def student_args(args):
+    return {'n_estimators': args.student_trees, 'max_depth': args.student_depth,
+            'learning_rate': args.student_learning_rate, 'augment': args.augment}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SmartFit 模型训练')
+    subparsers = parser.add_subparsers(dest='command')
+
+    train_parser = subparsers.add_parser('train', help='从 ModCloth 数据全量训练（默认）')
+    train_parser.add_argument('--data', default=DATA_PATH)
+    train_parser.add_argument('--chunksize', type=int, default=None, help='按块流式读取 JSON，限制峰值内存')
+    train_parser.add_argument('--lookup-table', action='store_true', help='同时生成预计算查表')
+    train_parser.add_argument('--n-estimators', type=int, default=300)
+    train_parser.add_argument('--max-depth', type=int, default=8)
+    train_parser.add_argument('--learning-rate', type=float, default=0.05)
+
+    train_parser.add_argument('--distill', action='store_true', help='同时蒸馏一个小模型（参数见 distill 子命令）')
+
+    distill_parser = subparsers.add_parser('distill', help='为已有模型蒸馏小模型，写在模型文件旁')
+    distill_parser.add_argument('--model', default=MODEL_PATH)
+    distill_parser.add_argument('--data', default=DATA_PATH, help='训练数据；不存在时只用合成样本')
+    distill_parser.add_argument('--chunksize', type=int, default=None)
+    for p in (train_parser, distill_parser):
+        p.add_argument('--student-trees', type=int, default=40)
+        p.add_argument('--student-depth', type=int, default=4)
+        p.add_argument('--student-learning-rate', type=float, default=0.3)
+        p.add_argument('--augment', type=int, default=20000, help='追加的合成样本数（覆盖线上输入范围）')
+
+    tune_parser = subparsers.add_parser('tune', help='分层 k 折交叉验证搜索超参数，报告准确率与推理延迟')
+    tune_parser.add_argument('--data', default=DATA_PATH)
+    tune_parser.add_argument('--chunksize', type=int, default=None)
+    tune_parser.add_argument('--max-depth', default='3,4,6,8', help='逗号分隔的候选值')
+    tune_parser.add_argument('--learning-rate', default='0.05,0.1,0.2', help='逗号分隔的候选值')
+    tune_parser.add_argument('--max-rounds', type=int, default=300, help='每个候选的最大树数，实际树数由早停决定')
+    tune_parser.add_argument('--folds', type=int, default=5)
+    tune_parser.add_argument('--workers', type=int, default=None, help='进程数，默认 CPU 核数 / n-jobs')
+    tune_parser.add_argument('--n-jobs', type=int, default=1, help='每个进程内 XGBoost 的线程数')
+    tune_parser.add_argument('--early-stopping', type=int, default=20)
+    tune_parser.add_argument('--prune-margin', type=float, default=0.02,
+                             help='第一折准确率落后最好候选超过该值时不再跑其余折')
+    tune_parser.add_argument('--cache-dir', default='models/tuning')
+
+    export_parser = subparsers.add_parser('export', help='把已有的 pickle 模型导出为原生格式')
+    export_parser.add_argument('--model', default=MODEL_PATH)
+
+    lut_parser = subparsers.add_parser('lut', help='为已有模型生成预计算查表（写在模型文件旁）')
+    lut_parser.add_argument('--model', default=MODEL_PATH)
+    lut_parser.add_argument('--height-step', type=float, default=5.0)
+    lut_parser.add_argument('--waist-step', type=float, default=2.5)
+    lut_parser.add_argument('--bra-step', type=float, default=2.0)
+    lut_parser.add_argument('--tolerance', type=float, default=0.02, help='网格单元中心处允许的插值误差')
+
+    args = parser.parse_args()
+    if args.command in (None, 'train'):
+        clf_params = {'n_estimators': args.n_estimators, 'max_depth': args.max_depth,
+                      'learning_rate': args.learning_rate} if args.command == 'train' else None
+        student_params = student_args(args) if getattr(args, 'distill', False) else None
+        train_from_json(getattr(args, 'data', DATA_PATH), chunksize=getattr(args, 'chunksize', None),
+                        lookup_table=getattr(args, 'lookup_table', False), clf_params=clf_params,
+                        student_params=student_params)
+    elif args.command == 'distill':
+        teacher = joblib.load(args.model)
+        X = None
+        if os.path.exists(args.data):
+            X, _ = load_training_frame(args.data, chunksize=args.chunksize)
+        # 已有模型通常见过全部数据，准确率差无法做样本外比较，只报告一致率与延迟
+        student, report = distill(teacher, X, **student_args(args))
+        save_student(student, report, args.model)
+        version, version_model_path = current_model(args.model)
+        if version is not None:
+            save_student(student, report, version_model_path)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    elif args.command == 'tune':
+        candidates = candidate_grid([int(v) for v in args.max_depth.split(',')],
+                                    [float(v) for v in args.learning_rate.split(',')], args.max_rounds)
+        results = tune(args.data, args.chunksize, candidates, folds=args.folds, workers=args.workers,
+                       n_jobs=args.n_jobs, early_stopping=args.early_stopping, prune_margin=args.prune_margin,
+                       cache_dir=args.cache_dir)
+        print_tuning_report(results)
+        report_path = os.path.join(args.cache_dir, f"report-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f'报告已写入 {report_path}；选定候选后用 train --n-estimators/--max-depth/--learning-rate 全量训练')
+    elif args.command == 'export':
+        print(export_native(joblib.load(args.model), args.model))
+    elif args.command == 'lut':
+        spec = grid_spec(bra=(28.0, 50.0, args.bra_step), height=(140.0, 200.0, args.height_step),
+                         waist=(50.0, 130.0, args.waist_step), tolerance=args.tolerance)
+        pipeline = joblib.load(args.model)
+        spec = export_lookup_table(pipeline, args.model, spec)
+        # 版本化部署时服务端从 CURRENT 指向的版本目录加载，同时写一份到该目录
+        version, version_model_path = current_model(args.model)
+        if version is not None:
+            table_path, mask_path, _ = lookup_paths(args.model)
+            save_lookup_table(np.load(table_path), np.load(mask_path), spec, version_model_path)
+        print(spec['error'])
 
 
 if __name__ == "__main__":
-    train_from_json()
\ No newline at end of file
+    main()
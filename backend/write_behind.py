@@ -0,0 +1,172 @@
+import atexit
+import queue
+import time
+import traceback
+
+from background import BackgroundThread
+from db_models import db, User, History
+from rollups import record_inserted
+
+_STOP = object()
+
+
+def persist_predictions(session, entries, skip_missing_users=False):
+    """在一个事务中写入预测记录，返回实际写入的条目数。
+
+    entries 为 (user_id, body, history_rows) 列表；同一用户的身体数据更新只保留最后一次。
+    skip_missing_users=True 时丢弃已被删除的用户的条目（后台落库晚于删除用户时，不留下孤立记录，
+    也不会让汇总表的 upsert 重新插入该用户的统计行）。
+    """
+    if skip_missing_users:
+        user_ids = {user_id for user_id, _, _ in entries}
+        existing = {row[0] for row in session.query(User.id).filter(User.id.in_(user_ids))}
+        entries = [entry for entry in entries if entry[0] in existing]
+    latest_body = {}
+    histories = []
+    for user_id, body, rows in entries:
+        latest_body[user_id] = body
+        for row in rows:
+            histories.append(History(user_id=user_id, **row))
+
+    session.add_all(histories)
+    record_inserted(session, histories)
+    for user_id, body in latest_body.items():
+        session.query(User).filter(User.id == user_id).update({
+            'height': body['height'],
+            'waist': body['waist'],
+            'hips': body['hips'],
+            'bra_size': body['bra_num'],
+            'cup_size': body['cup_size']
+        }, synchronize_session=False)
+    session.commit()
+    return len(entries)
+
+
+class HistoryWriter:
+    """History/User 写入的后台批量落库队列（write-behind）。
+
+    请求线程只负责入队；后台线程每 flush_interval 秒或攒满 flush_rows 条后批量提交。
+    队列有界：入队超时后由请求线程同步写入（使用独立会话，不提交请求会话中的其他改动），以此对调用方形成背压。
+    删除用户/清空历史前调用 flush() 让已入队的记录先落库；其他进程队列中的记录落库时跳过已删除的用户。
+    """
+
+    def __init__(self, app, flush_interval=0.05, flush_rows=200, max_queue=10000, put_timeout=0.5):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._worker = BackgroundThread(self._run, 'history-writer')
+
+        self.flushed_batches = 0
+        self.flushed_rows = 0
+        self.sync_fallbacks = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def submit(self, user_id, body, rows):
+        self._worker.ensure_started()
+        entry = (user_id, body, rows)
+        try:
+            self._queue.put(entry, timeout=self.put_timeout)
+        except queue.Full:
+            self.sync_fallbacks += 1
+            self._flush([entry])
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.flush_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._flush(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _flush(self, batch):
+        # 新的应用上下文对应独立的会话，请求线程中同步写入时也不会与请求会话混用
+        written = failed = 0
+        with self.app.app_context():
+            try:
+                written = persist_predictions(db.session, batch, skip_missing_users=True)
+            except Exception:
+                db.session.rollback()
+                traceback.print_exc()
+                # 批量提交失败时逐条重试，只丢弃确实无法写入的记录
+                for entry in batch:
+                    try:
+                        written += persist_predictions(db.session, [entry], skip_missing_users=True)
+                    except Exception:
+                        db.session.rollback()
+                        failed += 1
+                        traceback.print_exc()
+            finally:
+                db.session.remove()
+        self.failures += failed
+        self.dropped += len(batch) - written - failed
+        self.flushed_batches += 1
+        self.flushed_rows += sum(len(rows) for _, _, rows in batch)
+
+    def flush(self):
+        """阻塞直到当前已入队的记录全部落库。"""
+        if self._worker.alive:
+            self._queue.join()
+
+    def stop(self):
+        """停止工作线程并把队列中剩余记录同步写完（进程退出时调用）。"""
+        if self._worker.alive:
+            self._queue.put(_STOP)
+            self._worker.join(timeout=30)
+
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+            self._queue.task_done()
+        if leftover:
+            self._flush(leftover)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'flushed_batches': self.flushed_batches,
+            'flushed_rows': self.flushed_rows,
+            'sync_fallbacks': self.sync_fallbacks,
+            'failures': self.failures,
+            'dropped': self.dropped
+        }
+
+
+def init_history_writer(app):
+    writer = HistoryWriter(
+        app,
+        flush_interval=app.config['HISTORY_FLUSH_INTERVAL_MS'] / 1000.0,
+        flush_rows=app.config['HISTORY_FLUSH_ROWS'],
+        max_queue=app.config['HISTORY_QUEUE_SIZE']
+    )
+    app.extensions['history_writer'] = writer
+    atexit.register(writer.stop)
+    return writer